@@ -16,8 +16,10 @@ from metrics.models import (
     Answer,
     Response,
     ResponseSet,
+    AnswerCount,
     UserProfile,
-    Node
+    Node,
+    UploadJob,
 )
 
 
@@ -45,6 +47,12 @@ class NodeAdmin(ModelAdmin):
     pass
 
 
+@admin.register(UploadJob)
+class UploadJobAdmin(ModelAdmin):
+    list_display = ["id", "file_name", "user", "status", "created", "finished"]
+    list_filter = ["status"]
+
+
 @admin.register(Event)
 class EventAdmin(ModelAdmin):
     exclude = COMMON_EXCLUDES
@@ -73,6 +81,22 @@ class ResponseSetAdmin(ModelAdmin):
         obj.user = request.user
         return super().save_model(request, obj, form, change)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        events = [form.instance.event_id]
+        if "event" in form.changed_data and form.initial.get("event"):
+            events.append(form.initial["event"])
+        AnswerCount.refresh(events)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        AnswerCount.refresh([obj.event_id])
+
+    def delete_queryset(self, request, queryset):
+        events = set(queryset.values_list("event", flat=True))
+        super().delete_queryset(request, queryset)
+        AnswerCount.refresh(events)
+
 
 @admin.register(QuestionSet)
 class QuestionSetAdmin(ModelAdmin):
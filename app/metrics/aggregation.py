@@ -0,0 +1,56 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db import connections
+
+
+def count_field_values(queryset, field_names):
+    """Count the occurrences of every value of the given fields in queryset.
+
+    All fields are counted in a single SQL statement, array fields are
+    unnested so that each element is counted separately. The result maps
+    each field name to a `{value: count}` dict.
+    """
+    model = queryset.model
+    fields = [model._meta.get_field(name) for name in field_names]
+    result = {field.name: {} for field in fields}
+    if not fields:
+        return result
+
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    (filtered_sql, filtered_params) = (
+        queryset
+        .order_by()
+        .values(*[field.name for field in fields])
+        .query
+        .sql_with_params()
+    )
+
+    selects = []
+    params = list(filtered_params)
+    for field in fields:
+        column = f"filtered.{quote_name(field.column)}"
+        if isinstance(field, ArrayField):
+            selects.append(
+                "SELECT %s, element::text, COUNT(*) "
+                f"FROM filtered CROSS JOIN LATERAL unnest({column}) AS element "
+                "GROUP BY 2"
+            )
+        else:
+            selects.append(
+                f"SELECT %s, {column}::text, COUNT(*) "
+                f"FROM filtered WHERE {column} IS NOT NULL "
+                "GROUP BY 2"
+            )
+        params.append(field.name)
+
+    sql = (
+        f"WITH filtered AS ({filtered_sql}) "
+        + " UNION ALL ".join(selects)
+        + " ORDER BY 1, 2"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for (field_name, value, count) in cursor.fetchall():
+            result[field_name][value] = count
+
+    return result
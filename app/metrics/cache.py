@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+import hashlib
+import json
+import uuid
+
+
+GENERATION_KEY = "metrics-generation"
+
+
+def get_metrics_cache():
+    return caches[getattr(settings, "METRICS_CACHE_ALIAS", "default")]
+
+
+def get_metrics_cache_key(
+    kind,
+    generation,
+    slug=None,
+    event_type=None,
+    event_funding=None,
+    event_target_audience=None,
+    event_additional_platforms=None,
+    event_node=None,
+    date_to=None,
+    date_from=None,
+):
+    params = {
+        "kind": kind,
+        "slug": slug,
+        "type": event_type or None,
+        "funding": sorted(event_funding or []),
+        "target_audience": sorted(event_target_audience or []),
+        "additional_platforms": sorted(event_additional_platforms or []),
+        "node": getattr(event_node, "pk", event_node) or None,
+        "date_to": str(date_to) if date_to else None,
+        "date_from": str(date_from) if date_from else None,
+    }
+    digest = hashlib.sha256(
+        json.dumps(params, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return f"metrics:{generation}:{digest}"
+
+
+def cached_metrics(kind, compute, slug=None, **filters):
+    cache = get_metrics_cache()
+    generation = cache.get_or_set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+    key = get_metrics_cache_key(kind, generation, slug=slug, **filters)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, timeout=getattr(settings, "METRICS_CACHE_TIMEOUT", 300))
+    return result
+
+
+def _new_generation():
+    get_metrics_cache().set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_metrics_cache(*args, **kwargs):
+    # Invalidate right away for readers inside the current transaction and
+    # once more on commit, so that results computed by concurrent requests
+    # from the pre-commit state are not served.
+    _new_generation()
+    transaction.on_commit(_new_generation)
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from metrics.models import DeletedObject, Event, OrganisingInstitution, ResponseSet
+import base64
+import json
+
+
+def get_event_values():
+    return Event.objects.annotate(
+        nodes=ArrayAgg("node", distinct=True, filter=Q(node__isnull=False), default=[]),
+        institutions=ArrayAgg(
+            "organising_institution",
+            distinct=True,
+            filter=Q(organising_institution__isnull=False),
+            default=[],
+        ),
+    ).values(
+        "id",
+        "code",
+        "title",
+        "node_main",
+        "nodes",
+        "date_start",
+        "date_end",
+        "duration",
+        "type",
+        "institutions",
+        "location_city",
+        "location_country",
+        "funding",
+        "target_audience",
+        "additional_platforms",
+        "communities",
+        "number_participants",
+        "number_trainers",
+        "url",
+        "status",
+        "locked",
+        "user",
+        "created",
+        "modified",
+        "change_xid",
+    )
+
+
+def _response_set_queryset():
+    return ResponseSet.objects.annotate(
+        answers=ArrayAgg("entries__answer", filter=Q(entries__isnull=False), default=[]),
+    ).values(
+        "id",
+        "event",
+        "question_set",
+        "answers",
+        "user",
+        "created",
+        "modified",
+        "change_xid",
+    )
+
+
+def _institution_queryset():
+    return OrganisingInstitution.objects.values(
+        "id",
+        "name",
+        "country",
+        "ror_id",
+        "modified",
+        "change_xid",
+    )
+
+
+def _deleted_queryset():
+    return DeletedObject.objects.values("id", "model", "object_id", "modified", "change_xid")
+
+
+# Each stream is paged separately by (change_xid, id)
+STREAMS = {
+    "events": get_event_values,
+    "response_sets": _response_set_queryset,
+    "institutions": _institution_queryset,
+    "deleted": _deleted_queryset,
+}
+
+
+def encode_cursor(positions):
+    data = json.dumps({
+        stream: [change_xid, object_id]
+        for stream, (change_xid, object_id) in positions.items()
+    })
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return {}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return {
+            stream: (int(change_xid), int(object_id))
+            for stream, (change_xid, object_id) in data.items()
+            if stream in STREAMS
+        }
+    except (ValueError, TypeError, UnicodeError):
+        raise ValidationError(f"Invalid cursor: {cursor}")
+
+
+def get_committed_xid():
+    """The transaction id below which every transaction has finished.
+
+    Rows are stamped with the id of the transaction that wrote them, which
+    is assigned before the transaction commits. Rows of transactions below
+    this id can no longer appear, so pages that stop below it skip nothing,
+    however long the transactions writing them ran.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        (xid,) = cursor.fetchone()
+    return xid
+
+
+def get_changes(cursor=None, limit=None):
+    """Get the objects changed after `cursor`, at most `limit` per stream.
+
+    Returns the changes, the cursor of the next page and whether there are
+    more changes. Objects are paged in the order of the transactions that
+    wrote them, changes of transactions still running are left for a later
+    page.
+    """
+    limit = limit or settings.CHANGES_PAGE_SIZE
+    positions = decode_cursor(cursor)
+    committed = get_committed_xid()
+    changes = {}
+    more = False
+    for stream, get_queryset in STREAMS.items():
+        queryset = get_queryset().filter(change_xid__lt=committed)
+        if stream in positions:
+            (change_xid, object_id) = positions[stream]
+            # Equal to (change_xid, id) > position, with the start of the
+            # index range spelled out for the planner
+            queryset = queryset.filter(change_xid__gte=change_xid).exclude(
+                change_xid=change_xid,
+                id__lte=object_id,
+            )
+        rows = list(queryset.order_by("change_xid", "id")[:limit + 1])
+        more = more or len(rows) > limit
+        rows = rows[:limit]
+        if rows:
+            positions[stream] = (rows[-1]["change_xid"], rows[-1]["id"])
+        changes[stream] = rows
+    return (changes, encode_cursor(positions), more)
@@ -0,0 +1,319 @@
+from django.core.exceptions import ValidationError
+from django.db import connection
+from metrics import import_utils
+from metrics.cache import invalidate_metrics_cache
+from metrics.models import (
+    Event,
+    Demographic,
+    Quality,
+    Impact,
+    Node,
+    OrganisingInstitution,
+    User,
+)
+import csv
+import io
+import itertools
+
+
+# Written for SQL NULL, an empty field is an empty string
+NULL = "\\N"
+
+RESPONSE_TYPES = {
+    "demographic": (Demographic, import_utils.demographic_values_from_dict),
+    "quality": (Quality, import_utils.quality_values_from_dict),
+    "impact": (Impact, import_utils.impact_values_from_dict),
+}
+
+
+def quote_name(name):
+    return connection.ops.quote_name(name)
+
+
+def to_array_literal(values):
+    return "{" + ",".join(
+        '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+        for value in values
+    ) + "}"
+
+
+def to_copy_value(value):
+    if value is None:
+        return NULL
+    if isinstance(value, list):
+        return to_array_literal(value)
+    return value
+
+
+def copy_rows(cursor, table, columns, rows, batch_size):
+    """Write rows to table with COPY FROM STDIN, batch_size rows per COPY."""
+    statement = (
+        f"COPY {quote_name(table)} ({', '.join(quote_name(column) for column in columns)}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')"
+    )
+    rows = iter(rows)
+    count = 0
+    while batch := list(itertools.islice(rows, batch_size)):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            [to_copy_value(value) for value in row]
+            for row in batch
+        )
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        count += len(batch)
+    return count
+
+
+def create_stage(cursor, table, model, value_fields, key_columns):
+    """Create a temporary staging table for rows of model.
+
+    The staging table has the row number, the natural keys used to look up
+    the foreign keys and the value fields with the column types of model.
+    """
+    columns = [
+        ("row_number", "integer"),
+        *key_columns,
+        *[
+            (field.column, field.db_type(connection))
+            for field in (model._meta.get_field(name) for name in value_fields)
+        ],
+    ]
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE {quote_name(table)} ("
+        + ", ".join(f"{quote_name(name)} {column_type}" for (name, column_type) in columns)
+        + ") ON COMMIT DROP"
+    )
+    return [name for (name, _column_type) in columns]
+
+
+def raise_for_rows(cursor, message, query):
+    cursor.execute(query)
+    found = cursor.fetchall()
+    if found:
+        raise ValidationError(
+            f"{message}: "
+            + ", ".join(f"row {row_number} ({value})" for (row_number, value) in found[:20])
+        )
+
+
+def insert_from_stage(cursor, model, stage, expressions, joins=""):
+    """INSERT ... SELECT all rows of stage into the table of model.
+
+    Columns without an expression are copied from the staging column with
+    the same name, columns with None as expression and non editable columns
+    without one use their default.
+    """
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if expressions.get(field.name, "" if field.editable else None) is not None
+    ]
+    cursor.execute(
+        f"INSERT INTO {quote_name(model._meta.db_table)} "
+        f"({', '.join(quote_name(field.column) for field in fields)}) "
+        f"SELECT {', '.join(expressions.get(field.name, f's.{quote_name(field.column)}') for field in fields)} "
+        f"FROM {quote_name(stage)} s {joins} "
+        "ORDER BY s.row_number"
+    )
+    return cursor.rowcount
+
+
+def prepare_rows(rows, model, values_from_dict, exclude):
+    for (row_number, data) in enumerate(rows, start=1):
+        try:
+            values = values_from_dict(data)
+            model(**values).clean_fields(exclude=exclude)
+        except (ValidationError, ValueError, KeyError) as e:
+            raise ValidationError(f"Row {row_number}: {e}")
+        yield (row_number, data, values)
+
+
+def copy_events(rows, batch_size):
+    """Load event rows through a staging table.
+
+    Rows are converted and validated like `ImportContext.prepare_event`.
+    The users, nodes and institutions are then resolved by name in SQL.
+    Institutions that are not in the database are resolved from ROR
+    first, like in the ORM import.
+    """
+    context = import_utils.ImportContext()
+    value_fields = None
+    stage = "tmd_stage_event"
+    event_table = quote_name(Event._meta.db_table)
+    node_table = quote_name(Node._meta.db_table)
+
+    def stage_rows():
+        batches = iter(lambda: list(itertools.islice(prepared, batch_size)), [])
+        for batch in batches:
+            context.resolve_institutions([
+                ror_id
+                for (_row_number, data, _values) in batch
+                for ror_id in import_utils.csv_to_array(data.get("organising_institution"))
+            ])
+            for (row_number, data, values) in batch:
+                yield [
+                    row_number,
+                    None,
+                    data["user"],
+                    data["node_main"].strip(),
+                    [name.strip() for name in data["node"].split(",") if name.strip()],
+                    import_utils.csv_to_array(data["organising_institution"]),
+                    *[values[name] for name in value_fields],
+                ]
+
+    prepared = prepare_rows(
+        rows,
+        Event,
+        import_utils.event_values_from_dict,
+        ["user", "node_main", "created", "modified"],
+    )
+    first = next(prepared, None)
+    if first is None:
+        return 0
+    value_fields = list(first[2])
+    prepared = itertools.chain([first], prepared)
+
+    with connection.cursor() as cursor:
+        columns = create_stage(
+            cursor,
+            stage,
+            Event,
+            value_fields,
+            [
+                ("event_id", "bigint"),
+                ("username", "text"),
+                ("node_main", "text"),
+                ("nodes", "text[]"),
+                ("institutions", "text[]"),
+            ],
+        )
+        copy_rows(cursor, stage, columns, stage_rows(), batch_size)
+
+        raise_for_rows(cursor, "Users do not exist", f"""
+            SELECT s.row_number, s.username FROM {stage} s
+            WHERE NOT EXISTS (
+                SELECT FROM {quote_name(User._meta.db_table)} u WHERE u.username = s.username
+            )
+        """)
+        raise_for_rows(cursor, "Nodes do not exist", f"""
+            SELECT s.row_number, node.name FROM {stage} s,
+            unnest(array_append(s.nodes, s.node_main)) AS node(name)
+            WHERE NOT EXISTS (SELECT FROM {node_table} n WHERE n.name = node.name)
+        """)
+        raise_for_rows(cursor, "Events with these codes already exist", f"""
+            SELECT s.row_number, s.code FROM {stage} s
+            WHERE s.code IS NOT NULL AND (
+                EXISTS (SELECT FROM {event_table} e WHERE e.code = s.code)
+                OR EXISTS (
+                    SELECT FROM {stage} other
+                    WHERE other.code = s.code AND other.row_number <> s.row_number
+                )
+            )
+        """)
+
+        # Ids are taken from the sequence up front, so the many-to-many rows
+        # can be inserted from the staging table as well.
+        cursor.execute(
+            f"UPDATE {stage} SET event_id = "
+            f"nextval(pg_get_serial_sequence('{Event._meta.db_table}', 'id'))"
+        )
+        count = insert_from_stage(
+            cursor,
+            Event,
+            stage,
+            {
+                "id": "s.event_id",
+                "user": "u.id",
+                "node_main": f"(SELECT min(n.id) FROM {node_table} n WHERE n.name = s.node_main)",
+                "created": "now()",
+                "modified": "now()",
+                "locked": "false",
+            },
+            f"JOIN {quote_name(User._meta.db_table)} u ON u.username = s.username",
+        )
+        node_through = Event.node.through
+        cursor.execute(f"""
+            INSERT INTO {quote_name(node_through._meta.db_table)} (event_id, node_id)
+            SELECT DISTINCT s.event_id, (SELECT min(n.id) FROM {node_table} n WHERE n.name = node.name)
+            FROM {stage} s, unnest(s.nodes) AS node(name)
+        """)
+        institution_through = Event.organising_institution.through
+        cursor.execute(f"""
+            INSERT INTO {quote_name(institution_through._meta.db_table)}
+                (event_id, organisinginstitution_id)
+            SELECT DISTINCT s.event_id, i.id
+            FROM {stage} s, unnest(s.institutions) AS institution(ror_id)
+            JOIN {quote_name(OrganisingInstitution._meta.db_table)} i ON i.ror_id = institution.ror_id
+        """)
+        cursor.execute(f"DROP TABLE {stage}")
+    invalidate_metrics_cache()
+    return count
+
+
+def copy_responses(question_set_id, rows, batch_size):
+    """Load legacy metrics rows of one question set through a staging table.
+
+    Rows are converted and validated like `ImportContext.responses_from_dicts`,
+    the users and events are resolved in SQL.
+    """
+    (model, values_from_dict) = RESPONSE_TYPES[question_set_id]
+    stage = f"tmd_stage_{question_set_id}"
+    event_table = quote_name(Event._meta.db_table)
+    user_table = quote_name(User._meta.db_table)
+    value_fields = [
+        field.name
+        for field in model._meta.concrete_fields
+        if field.name not in {"id", "user", "event", "created", "modified"}
+    ]
+    prepared = prepare_rows(
+        rows,
+        model,
+        values_from_dict,
+        ["user", "event", "created", "modified"],
+    )
+
+    with connection.cursor() as cursor:
+        columns = create_stage(
+            cursor,
+            stage,
+            model,
+            value_fields,
+            [("username", "text"), ("event_code", "text")],
+        )
+        copy_rows(
+            cursor,
+            stage,
+            columns,
+            (
+                [row_number, data["user"], data["event"], *[values[name] for name in value_fields]]
+                for (row_number, data, values) in prepared
+            ),
+            batch_size,
+        )
+        raise_for_rows(cursor, "Users do not exist", f"""
+            SELECT s.row_number, s.username FROM {stage} s
+            WHERE NOT EXISTS (SELECT FROM {user_table} u WHERE u.username = s.username)
+        """)
+        raise_for_rows(cursor, "Events do not exist", f"""
+            SELECT s.row_number, s.event_code FROM {stage} s
+            WHERE NOT EXISTS (SELECT FROM {event_table} e WHERE e.code = s.event_code)
+        """)
+        count = insert_from_stage(
+            cursor,
+            model,
+            stage,
+            {
+                "id": None,
+                "user": "u.id",
+                "event": "e.id",
+                "created": "now()",
+                "modified": "now()",
+            },
+            f"JOIN {user_table} u ON u.username = s.username "
+            f"JOIN {event_table} e ON e.code = s.event_code",
+        )
+        cursor.execute(f"DROP TABLE {stage}")
+    invalidate_metrics_cache()
+    return count
@@ -129,9 +129,10 @@ class QuestionSetForm(forms.Form):
         for key, field in fields.items():
             self.fields[key] = field
 
-    def _parse_list(self, field_id, value):
+    @classmethod
+    def _parse_list(cls, field_id, value):
         return [
-            self._parse_item(field_id, v)
+            cls._parse_item(field_id, v)
             for v in (
                 value
                 if isinstance(value, list)
@@ -139,23 +140,56 @@ class QuestionSetForm(forms.Form):
             )
         ]
 
-    def _parse_item(self, field_id, value):
+    @classmethod
+    def _parse_item(cls, field_id, value):
         default_value = slugify(value.strip())
-        return self.label_value_map.get(field_id, {}).get(default_value, default_value)
+        return cls.label_value_map.get(field_id, {}).get(default_value, default_value)
 
     @staticmethod
-    def _clean_value(question, value):
+    def _clean_value(answers, value):
         return (
-            list(question.answers.filter(slug__in=value).all())
+            [answer for slug, answer in answers.items() if slug in value]
             if isinstance(value, list)
-            else question.answers.get(slug=value)
+            else answers[value]
         )
 
+    @classmethod
+    def resolve_answers(cls, values):
+        """Get the answers for values without building a form.
+
+        Values are parsed like in the form and every question needs a valid
+        response, otherwise a ValidationError is raised.
+        """
+        answers = []
+        for question in cls.question_set_questions:
+            value = values.get(question.slug)
+            parsed = (
+                cls._parse_list(question.slug, value)
+                if question.is_multichoice
+                else cls._parse_item(question.slug, value)
+            ) if value else None
+            index = cls.answer_index[question.slug]
+            invalid = [
+                slug
+                for slug in (parsed if isinstance(parsed, list) else [parsed])
+                if slug not in index
+            ]
+            if not parsed or invalid:
+                raise ValidationError(
+                    f"Select a valid choice for {question.slug}: {value}"
+                )
+            cleaned = QuestionSetForm._clean_value(index, parsed)
+            answers.extend(cleaned if isinstance(cleaned, list) else [cleaned])
+        return answers
+
     def clean(self):
         cleaned_data = super().clean()
-        questions = list(self.question_set.questions.all())
+        questions = self.question_set_questions
         responses = {
-            question.slug: QuestionSetForm._clean_value(question, cleaned_data[question.slug])
+            question.slug: QuestionSetForm._clean_value(
+                self.answer_index[question.slug],
+                cleaned_data[question.slug]
+            )
             for question in questions
             if question.slug in cleaned_data and cleaned_data[question.slug]
         }
@@ -195,14 +229,23 @@ class QuestionSetForm(forms.Form):
 
     @staticmethod
     def from_question_set(qs):
+        questions = list(qs.questions.prefetch_related("answers"))
         fields = {
             question.slug: QuestionSetForm._parse_field(question)
-            for question in qs.questions.all()
+            for question in questions
         }
 
         class _Form(QuestionSetForm):
             question_set = qs
+            question_set_questions = questions
             question_set_fields = fields
+            answer_index = {
+                question.slug: {
+                    answer.slug: answer
+                    for answer in question.answers.all()
+                }
+                for question in questions
+            }
             label_value_map = {
                 field_id: {
                     slugify(label): value
@@ -0,0 +1,76 @@
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import json
+import os
+import requests
+import tempfile
+import time
+
+
+def create_session(pool_size, retries):
+    """A keep-alive session that retries failed and throttled GET requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class JsonFileCache:
+    """JSON documents cached on disk, one file per key.
+
+    Entries older than `ttl` seconds are stale. An empty directory disables
+    the cache.
+    """
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, allow_stale=False):
+        if not self.directory:
+            return None
+        path = self.path(key)
+        try:
+            if not allow_stale and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, data):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first, concurrent readers never see
+            # a partially written entry.
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.directory, suffix=".tmp", delete=False
+            ) as f:
+                json.dump(data, f)
+            os.replace(f.name, self.path(key))
+        except OSError:
+            pass
+
+    def touch(self, key):
+        """Mark an entry as fresh again."""
+        if not self.directory:
+            return
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
@@ -9,16 +9,20 @@ from metrics.models import (
     User,
     Node,
     OrganisingInstitution,
+    RorOrganisation,
     ChoiceArrayField,
     country_mapping,
     EditTracking,
     UserProfile,
 )
+from metrics.cache import invalidate_metrics_cache
+from metrics.ror import RorClient
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError, PermissionDenied
 import random
 from typing import Callable
 import functools
+import itertools
 import csv
 import logging
 
@@ -29,76 +33,185 @@ logger = logging.getLogger(__name__)
 class ImportContext:
     def __init__(self):
         self._institutions = {}
+        self._institution_errors = {}
+        self._users = {}
+        self._nodes = {}
+        self._events = {}
+        self._ror_client = None
 
     def event_from_dict(self, data: dict):
+        return self.events_from_dicts([data])[0]
+
+    def events_from_dicts(self, rows, batch_size=None):
+        rows = list(rows)
+        self.preload_event_data(rows)
+        importer = EventImporter(self, batch_size=batch_size)
+        events = [importer(data) for data in rows]
+        importer.flush()
+        return events
+
+    def preload_event_data(self, rows):
+        """Load the users, nodes and institutions referenced by rows.
+
+        Each model is loaded with a single query, the following lookups for
+        these rows are served from memory.
+        """
+        usernames = {
+            data['user']
+            for data in rows
+            if data.get('user')
+        }
+        self._users.update({
+            user.username: user
+            for user in User.objects.filter(
+                username__in=usernames - self._users.keys()
+            )
+        })
+        node_names = {
+            name.strip()
+            for data in rows
+            for name in [data.get('node_main') or '', *(data.get('node') or '').split(",")]
+            if name.strip()
+        }
+        self._nodes.update({
+            node.name: node
+            for node in Node.objects.filter(
+                name__in=node_names - self._nodes.keys()
+            )
+        })
+        self.resolve_institutions([
+            ror_id
+            for data in rows
+            for ror_id in csv_to_array(data.get('organising_institution'))
+        ])
+
+    def prepare_event(self, data: dict):
+        """Build and validate an unsaved event and its related objects.
+
+        Returns a `(Event, [Node], [OrganisingInstitution])` triple that can
+        be written with `Event.bulk_create_with_relations`.
+        """
         (created, modified) = self.timestamps_from_data(data)
-        start_date = convert_to_date(data['date_start'])
-        end_date = convert_to_date(data['date_end'])
-        event = Event.objects.create(
+        event = Event(
             user=self.user_from_data(data),
             created=created,
             modified=modified,
-            code=(
-                slugify(data['code'])
-                if 'code' in data
-                else None
-            ),
-            title=data['title'],
             node_main=self.node_from_data(data),
-            date_start=start_date,
-            date_end=end_date,
-            duration=float(data['duration']) if data['duration'] else (end_date - start_date).days + 1,
-            type=use_alias(data['type']),
-            funding=csv_to_array(data['funding']) or ["ELIXIR Node"],
-            location_city=data['location_city'] or "NA",
-            location_country=data['location_country'],
-            target_audience=csv_to_array(data['target_audience']) or ["Academia/ Research Institution"],
-            additional_platforms=csv_to_array(data['additional_platforms']) or ["NA"],
-            communities=csv_to_array(data['communities']) or ["NA"],
-            number_participants=int(data['number_participants'] or 0),
-            number_trainers=int(data['number_trainers'] or 0),
-            url=data['url'],
-            status=use_alias(data['status']),
+            **event_values_from_dict(data),
         )
         institution_ids = csv_to_array(data['organising_institution'])
-        event.organising_institution.set(self.get_institutions(institution_ids))
+        institutions = self.get_institutions(institution_ids)
         node_names = data['node'].split(",")
         stripped_names = [name.strip() for name in node_names]
         nodes = [
-            Node.objects.get(name=node)
+            self.get_node(node)
             for node in stripped_names
         ]
-        event.node.add(*nodes)
 
-        event.full_clean()
-        return event
+        # The user and main node are loaded from the database, so they are
+        # not validated again here. The timestamps are set on insert and the
+        # code is checked per batch on insert.
+        if event.node_main is None:
+            raise ValidationError({"node_main": "This field cannot be null."})
+        event.full_clean(
+            exclude=["user", "node_main", "created", "modified"],
+            validate_unique=False
+        )
+        return (event, nodes, institutions)
 
     def get_institutions(self, ror_ids):
-        result = []
-        for ror_id in ror_ids:
-            try:
-                result.append(self.get_institution(ror_id))
-            except ValidationError:
-                pass
-        return result
+        self.resolve_institutions(ror_ids)
+        return [
+            self._institutions[ror_id]
+            for ror_id in ror_ids
+            if ror_id in self._institutions
+        ]
 
     def get_institution(self, ror_id):
-        institution = self._institutions.get(ror_id)
-        if institution is not None:
-            return institution
-
-        existing_inst = OrganisingInstitution.objects.filter(ror_id=ror_id).first()
-        if existing_inst is not None:
-            self._institutions[ror_id] = existing_inst
-            return existing_inst
+        self.resolve_institutions([ror_id])
+        error = self._institution_errors.get(ror_id)
+        if error is not None:
+            raise error
+        return self._institutions[ror_id]
+
+    def resolve_institutions(self, ror_ids):
+        """Load the institutions for ror_ids, creating the missing ones.
+
+        Ids that are not in the database are looked up in the local ROR
+        index and then fetched from ROR concurrently, ids that fail to
+        resolve are remembered with their error.
+        """
+        missing = [
+            ror_id
+            for ror_id in dict.fromkeys(ror_ids)
+            if ror_id not in self._institutions
+            and ror_id not in self._institution_errors
+        ]
+        if not missing:
+            return
 
-        new_inst = OrganisingInstitution(ror_id=ror_id)
-        new_inst.update_ror_data()
-        new_inst.save()
-        self._institutions[ror_id] = new_inst
-        return new_inst
+        self._institutions.update({
+            institution.ror_id: institution
+            for institution in OrganisingInstitution.objects.filter(
+                ror_id__in=missing
+            )
+        })
+        unknown = [
+            ror_id
+            for ror_id in missing
+            if ror_id not in self._institutions
+        ]
+        if not unknown:
+            return
+        if self._ror_client is None and not settings.ROR_OFFLINE:
+            self._ror_client = RorClient()
+        new_institutions = []
+        resolved = RorOrganisation.resolve(unknown, self._ror_client)
+        for ror_id, result in resolved.items():
+            if isinstance(result, ValidationError):
+                self._institution_errors[ror_id] = result
+            else:
+                (name, country) = result
+                new_institutions.append(OrganisingInstitution(
+                    ror_id=ror_id,
+                    name=name,
+                    country=country,
+                ))
+        self._institutions.update({
+            institution.ror_id: institution
+            for institution in OrganisingInstitution.objects.bulk_create(
+                new_institutions
+            )
+        })
 
     def responses_from_dict(self, question_set_id, data: dict):
+        response = self.build_response(question_set_id, data)
+        response.save()
+        response.full_clean()
+        return response
+
+    def responses_from_dicts(self, question_set_id, rows, batch_size=None):
+        """Import rows of one question set with batched INSERTs.
+
+        The users and events of each batch are loaded up front and the
+        responses are validated before they are written.
+        """
+        batch_size = batch_size or settings.IMPORT_CHUNK_SIZE
+        rows = iter(rows)
+        count = 0
+        while batch := list(itertools.islice(rows, batch_size)):
+            self.preload_response_data(batch)
+            responses = []
+            for data in batch:
+                response = self.build_response(question_set_id, data)
+                response.full_clean(exclude=["user", "event", "created", "modified"])
+                responses.append(response)
+            type(responses[0]).objects.bulk_create(responses)
+            count += len(responses)
+        invalidate_metrics_cache()
+        return count
+
+    def build_response(self, question_set_id, data: dict):
         if question_set_id == "demographic":
             return self._demographic_from_dict(data)
         elif question_set_id == "impact":
@@ -108,61 +221,65 @@ class ImportContext:
         else:
             raise ValidationError(f"Missing question set '{question_set_id}'")
 
+    def preload_response_data(self, rows):
+        """Load the users and events referenced by rows, one query each."""
+        usernames = {
+            data['user']
+            for data in rows
+            if data.get('user')
+        }
+        self._users.update({
+            user.username: user
+            for user in User.objects.filter(
+                username__in=usernames - self._users.keys()
+            )
+        })
+        codes = {
+            data['event']
+            for data in rows
+            if data.get('event')
+        }
+        self._events.update({
+            event.code: event
+            for event in Event.objects.filter(
+                code__in=codes - self._events.keys()
+            )
+        })
+
     def _demographic_from_dict(self, data: dict):
         (created, modified) = self.timestamps_from_data(data)
         (user, event) = self.get_user_and_event(data)
-        demographic = Demographic.objects.create(
+        demographic = Demographic(
             user=user,
             created=created,
             modified=modified,
             event=event,
-            heard_from=csv_to_array(data['heard_from']) or ["Other"],
-            employment_sector=use_alias(data['employment_sector']) or "Other",
-            employment_country=data['employment_country'],
-            gender=use_alias(data['gender']) or "Other",
-            career_stage=use_alias(data['career_stage']) or "Other",
+            **demographic_values_from_dict(data),
         )
-        demographic.full_clean()
         return demographic
 
     def _quality_from_dict(self, data: dict):
         (created, modified) = self.timestamps_from_data(data)
         (user, event) = self.get_user_and_event(data)
-        quality = Quality.objects.create(
+        quality = Quality(
             user=user,
             created=created,
             modified=modified,
             event=event,
-            used_resources_before=use_alias(data['used_resources_before']),
-            used_resources_future=use_alias(data['used_resources_future']),
-            recommend_course=use_alias(data['recommend_course']),
-            course_rating=use_alias(data['course_rating']),
-            balance=use_alias(data['balance']),
-            email_contact=use_alias(data['email_contact']) or "No",
+            **quality_values_from_dict(data),
         )
-        quality.full_clean()
         return quality
 
     def _impact_from_dict(self, data: dict):
         (created, modified) = self.timestamps_from_data(data)
         (user, event) = self.get_user_and_event(data)
-        impact = Impact.objects.create(
+        impact = Impact(
             user=user,
             created=created,
             modified=modified,
             event=event,
-            when_attend_training=use_alias(data['when_attend_training']),
-            main_attend_reason=use_alias(data['main_attend_reason']),
-            how_often_use_before=use_alias(data['how_often_use_before']),
-            how_often_use_after=use_alias(data['how_often_use_after']),
-            able_to_explain=use_alias(data['able_to_explain']) or "Other",
-            able_use_now=use_alias(data['able_use_now']) or "Other",
-            help_work=csv_to_array(data['help_work']) or ["Other"],
-            attending_led_to=csv_to_array(data['attending_led_to']) or ["Other"],
-            people_share_knowledge=use_alias(data['people_share_knowledge']),
-            recommend_others=use_alias(data['recommend_others']),
+            **impact_values_from_dict(data),
         )
-        impact.full_clean()
         return impact
 
     def get_user_and_event(self, data: dict):
@@ -173,20 +290,37 @@ class ImportContext:
 
     def get_event(self, data):
         identifier = data['event']
-        return Event.objects.get(code=identifier)
+        event = self._events.get(identifier)
+        if event is None:
+            event = Event.objects.get(code=identifier)
+            self._events[identifier] = event
+        return event
 
     def user_from_data(self, data: dict):
-        return User.objects.get(username=data['user'])
+        username = data['user']
+        user = self._users.get(username)
+        if user is None:
+            user = User.objects.get(username=username)
+            self._users[username] = user
+        return user
 
     def node_from_data(self, data: dict):
         node_main = data['node_main'] if data['node_main'] else ''
         return (
-            Node.objects.get(
-                name=node_main
-            ) if node_main
+            self.get_node(node_main)
+            if node_main
             else None
         )
 
+    def get_node(self, name):
+        node = self._nodes.get(name)
+        if node is None:
+            node = Node.objects.filter(name=name).first()
+            if node is None:
+                raise ValidationError(f"Node '{name}' does not exist")
+            self._nodes[name] = node
+        return node
+
     def timestamps_from_data(self, data: dict):
         return timestamps_from_dict(data)
 
@@ -194,6 +328,50 @@ class ImportContext:
         pass
 
 
+class BatchFailed(ValidationError):
+    """Writing a batch of buffered rows failed with `error`.
+
+    `rows` is the number of rows in the batch, the last of them is the row
+    imported before the batch was written.
+    """
+    def __init__(self, error, rows):
+        super().__init__(error)
+        self.rows = rows
+
+
+class EventImporter:
+    """Buffer events prepared from rows and write them with batched INSERTs.
+
+    Each call returns the unsaved event, which gets its id once the buffer
+    is written. Call `flush` after the last row to write the remainder.
+    """
+    def __init__(self, import_context, batch_size=None):
+        self.import_context = import_context
+        self.batch_size = batch_size or settings.IMPORT_CHUNK_SIZE
+        self.pending = []
+
+    def prepare(self, rows):
+        self.import_context.preload_event_data(rows)
+
+    def __call__(self, data: dict):
+        entry = self.import_context.prepare_event(data)
+        self.pending.append(entry)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return entry[0]
+
+    def flush(self):
+        if self.pending:
+            try:
+                Event.bulk_create_with_relations(
+                    self.pending,
+                    batch_size=self.batch_size
+                )
+            except ValidationError as e:
+                raise BatchFailed(e, len(self.pending))
+        self.pending = []
+
+
 class LegacyImportContext(ImportContext):
     def __init__(self, user=None, node_main=None, timestamps=None, fixed_event=None):
         super().__init__()
@@ -212,6 +390,7 @@ class LegacyImportContext(ImportContext):
         return self.responses_from_dict("impact", data)
 
     def get_institutions(self, ror_ids):
+        self.resolve_institutions(ror_ids)
         return [
             self.get_institution(ror_id)
             for ror_id in ror_ids
@@ -312,6 +491,70 @@ def csv_to_array(csv_string):
     ] if csv_string else []
 
 
+def event_values_from_dict(data: dict):
+    """Get the Event field values of a row, without the user and nodes."""
+    start_date = convert_to_date(data['date_start'])
+    end_date = convert_to_date(data['date_end'])
+    return dict(
+        code=(
+            slugify(data['code'])
+            if 'code' in data
+            else None
+        ),
+        title=data['title'],
+        date_start=start_date,
+        date_end=end_date,
+        duration=float(data['duration']) if data['duration'] else (end_date - start_date).days + 1,
+        type=use_alias(data['type']),
+        funding=csv_to_array(data['funding']) or ["ELIXIR Node"],
+        location_city=data['location_city'] or "NA",
+        location_country=data['location_country'],
+        target_audience=csv_to_array(data['target_audience']) or ["Academia/ Research Institution"],
+        additional_platforms=csv_to_array(data['additional_platforms']) or ["NA"],
+        communities=csv_to_array(data['communities']) or ["NA"],
+        number_participants=int(data['number_participants'] or 0),
+        number_trainers=int(data['number_trainers'] or 0),
+        url=data['url'],
+        status=use_alias(data['status']),
+    )
+
+
+def demographic_values_from_dict(data: dict):
+    return dict(
+        heard_from=csv_to_array(data['heard_from']) or ["Other"],
+        employment_sector=use_alias(data['employment_sector']) or "Other",
+        employment_country=data['employment_country'],
+        gender=use_alias(data['gender']) or "Other",
+        career_stage=use_alias(data['career_stage']) or "Other",
+    )
+
+
+def quality_values_from_dict(data: dict):
+    return dict(
+        used_resources_before=use_alias(data['used_resources_before']),
+        used_resources_future=use_alias(data['used_resources_future']),
+        recommend_course=use_alias(data['recommend_course']),
+        course_rating=use_alias(data['course_rating']),
+        balance=use_alias(data['balance']),
+        email_contact=use_alias(data['email_contact']) or "No",
+    )
+
+
+def impact_values_from_dict(data: dict):
+    return dict(
+        when_attend_training=use_alias(data['when_attend_training']),
+        main_attend_reason=use_alias(data['main_attend_reason']),
+        how_often_use_before=use_alias(data['how_often_use_before']),
+        how_often_use_after=use_alias(data['how_often_use_after']),
+        able_to_explain=use_alias(data['able_to_explain']) or "Other",
+        able_use_now=use_alias(data['able_use_now']) or "Other",
+        help_work=csv_to_array(data['help_work']) or ["Other"],
+        attending_led_to=csv_to_array(data['attending_led_to']) or ["Other"],
+        people_share_knowledge=use_alias(data['people_share_knowledge']),
+        recommend_others=use_alias(data['recommend_others']),
+    )
+
+
 def convert_to_timestamp(date_string):
     try:
         return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S').timestamp()
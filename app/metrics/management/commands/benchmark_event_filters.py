@@ -0,0 +1,248 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from metrics.models import (
+    Answer,
+    AnswerCount,
+    Event,
+    Node,
+    Question,
+    QuestionSet,
+    ResponseSet,
+)
+from metrics.views.common import get_event_filter_query
+from metrics.views.metrics import get_event_info
+import datetime
+import json
+import random
+import time
+
+
+FILTERS = [
+    ("type", {"event_type": "Hackathon"}),
+    ("funding", {"event_funding": ["ELIXIR Hub"]}),
+    ("target audience", {"event_target_audience": ["Healthcare"]}),
+    ("platforms", {"event_additional_platforms": ["Compute", "Data"]}),
+    ("date period", {"date_from": "2023-03-01", "date_to": "2023-03-31"}),
+    (
+        "combined",
+        {
+            "event_type": "Training - blended",
+            "event_funding": ["ELIXIR Node"],
+            "date_from": "2023-01-01",
+            "date_to": "2023-06-30",
+        }
+    ),
+]
+
+
+def get_choices(field_name):
+    field = Event._meta.get_field(field_name)
+    return [value for (value, _label) in getattr(field, "base_field", field).choices]
+
+
+def create_question_set(user, prefix, questions=4, answers=3):
+    """A question set with single choice questions, for the answer counts
+    of the generated events."""
+    question_set = QuestionSet.objects.create(
+        name="Benchmark set",
+        slug=prefix,
+        user=user,
+    )
+    question_answers = []
+    for index in range(questions):
+        question = Question.objects.create(
+            text=f"Benchmark question {index}",
+            slug=f"{prefix}-{index}",
+            user=user,
+        )
+        question_set.questions.add(question)
+        question_answers.append(Answer.objects.bulk_create([
+            Answer(
+                text=f"Answer {answer}",
+                slug=f"answer-{answer}",
+                question=question,
+                user=user,
+            )
+            for answer in range(answers)
+        ]))
+    return (question_set, question_answers)
+
+
+def generate_events(count, response_sets=3, batch_size=5000, seed=0):
+    """Create `count` events with up to `response_sets` response sets each,
+    which are also counted in `AnswerCount`."""
+    rng = random.Random(seed)
+    prefix = f"benchmark-{time.time_ns()}"
+    user = User.objects.create(username=prefix)
+    (question_set, question_answers) = create_question_set(user, prefix)
+    nodes = [
+        Node.objects.create(name=f"Benchmark node {index}", country="Sweden")
+        for index in range(10)
+    ]
+    choices = {
+        field_name: get_choices(field_name)
+        for field_name in [
+            "type",
+            "funding",
+            "target_audience",
+            "additional_platforms",
+            "communities",
+        ]
+    }
+    first_day = datetime.date(2015, 1, 1)
+    for offset in range(0, count, batch_size):
+        events = []
+        for index in range(offset, min(offset + batch_size, count)):
+            date_start = first_day + datetime.timedelta(days=rng.randrange(3650))
+            duration = rng.randint(1, 5)
+            events.append(Event(
+                user=user,
+                title=f"Benchmark event {index}",
+                node_main=rng.choice(nodes),
+                date_start=date_start,
+                date_end=date_start + datetime.timedelta(days=duration - 1),
+                duration=duration,
+                type=rng.choice(choices["type"]),
+                location_city="City",
+                location_country="Sweden",
+                funding=rng.sample(choices["funding"], rng.randint(1, 2)),
+                target_audience=rng.sample(choices["target_audience"], 1),
+                additional_platforms=rng.sample(choices["additional_platforms"], 1),
+                communities=rng.sample(choices["communities"], 1),
+                number_participants=rng.randint(5, 50),
+                number_trainers=rng.randint(1, 5),
+                url=f"https://example.org/events/{index}",
+                status="Complete",
+            ))
+        events = Event.objects.bulk_create(events)
+        Event.node.through.objects.bulk_create([
+            Event.node.through(event_id=event.id, node_id=event.node_main_id)
+            for event in events
+        ])
+        ResponseSet.bulk_create_with_responses(
+            [
+                (
+                    ResponseSet(user=user, event=event, question_set=question_set),
+                    [rng.choice(answers) for answers in question_answers],
+                )
+                for event in events
+                for _index in range(rng.randint(0, response_sets))
+            ],
+            batch_size=batch_size,
+        )
+    with connection.cursor() as cursor:
+        for model in [Event, Event.node.through, ResponseSet, AnswerCount]:
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+
+def get_endpoints(page_size):
+    """The queries run by the list and metrics endpoints for a filter."""
+    def event_list(filters):
+        return list(
+            Event.objects
+            .filter(get_event_filter_query(**filters))
+            .order_by("-id")[:page_size]
+        )
+
+    def event_metrics(filters):
+        return get_event_info(**filters)
+
+    def set_metrics(filters):
+        return list(
+            AnswerCount.objects
+            .filter(get_event_filter_query(**filters, prefix="event_", copied=True))
+            .order_by()
+            .values("answer")
+            .annotate(count=Sum("count"))
+        )
+
+    return [
+        ("event list", event_list),
+        ("event metrics", event_metrics),
+        ("set metrics", set_metrics),
+    ]
+
+
+def iter_plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from iter_plan_nodes(child)
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+        (result,) = cursor.fetchone()
+    return result[0] if isinstance(result, list) else json.loads(result)[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates events with response sets and prints the EXPLAIN ANALYZE "
+        "plans of the event list and metrics queries for the event filters. "
+        "The generated data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=100000)
+        parser.add_argument(
+            "--response-sets",
+            type=int,
+            default=3,
+            help="Most response sets generated per event",
+        )
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument(
+            "--no-seqscan",
+            action="store_true",
+            help="Disable sequential scans, to check which indexes can serve a filter",
+        )
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="Print the full plans",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            generate_events(options["events"], options["response_sets"])
+            print(
+                f"Generated {options['events']} events in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+            if options["no_seqscan"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for (endpoint, run) in get_endpoints(options["page_size"]):
+                for (label, filters) in FILTERS:
+                    self.report(f"{endpoint}, {label}", run, filters, options["plans"])
+            transaction.set_rollback(True)
+
+    def report(self, label, run, filters, print_plans):
+        with CaptureQueriesContext(connection) as queries:
+            run(filters)
+        for query in queries.captured_queries:
+            plan = explain(query["sql"])
+            nodes = list(iter_plan_nodes(plan["Plan"]))
+            indexes = sorted({
+                node["Index Name"]
+                for node in nodes
+                if "Index Name" in node
+            })
+            scans = sorted({
+                f"{node['Node Type']} on {node['Relation Name']}"
+                for node in nodes
+                if "Relation Name" in node
+            })
+            print(
+                f"{label}: {plan['Execution Time']:.2f} ms, "
+                f"indexes: {', '.join(indexes) or '-'}, "
+                f"scans: {', '.join(scans)}"
+            )
+            if print_plans:
+                print(json.dumps(plan, indent=2))
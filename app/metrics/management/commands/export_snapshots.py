@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from metrics.snapshots import export_snapshots, get_datasets
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes Parquet snapshots of the events, responses and legacy metrics, "
+        "partitioned by event year and node. Only rows modified since the last "
+        "export are appended."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "datasets",
+            nargs="*",
+            help=f"Datasets to export, all by default: {', '.join(get_datasets())}",
+        )
+        parser.add_argument(
+            "--output",
+            default=settings.SNAPSHOT_DIR,
+            help="Snapshot directory",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rewrite the datasets instead of appending the changes",
+        )
+        parser.add_argument(
+            "--row-group-size",
+            type=int,
+            default=settings.SNAPSHOT_ROW_GROUP_SIZE,
+            help="Number of rows per Parquet row group",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.SNAPSHOT_INTERVAL,
+            help="Keep running and export every interval seconds, 0 exports once",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["datasets"]) - set(get_datasets())
+        if unknown:
+            raise CommandError(f"Unknown datasets: {', '.join(sorted(unknown))}")
+        full = options["full"]
+        while True:
+            export_snapshots(
+                options["datasets"],
+                options["output"],
+                full,
+                options["row_group_size"],
+            )
+            if not options["interval"]:
+                return
+            # Later runs only append the changes
+            full = False
+            time.sleep(options["interval"])
@@ -0,0 +1,97 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from metrics.models import Node, UserProfile
+from metrics.tess import create_tess_events, get_tess_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports events from TeSS, either by id or from a search, as "
+        "incomplete events. Events with an already imported url are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tess_ids",
+            type=str,
+            nargs="*",
+            help="Ids or slugs of the TeSS events to import",
+        )
+        parser.add_argument(
+            "--query",
+            type=str,
+            default=None,
+            help="Import all events that match this TeSS search",
+        )
+        parser.add_argument(
+            "--filter",
+            type=str,
+            action="append",
+            default=[],
+            help="TeSS search filter as key=value, e.g. node=Sweden",
+        )
+        parser.add_argument(
+            "--user",
+            type=str,
+            required=True,
+            help="Username of the user the events are created for",
+        )
+        parser.add_argument(
+            "--node",
+            type=str,
+            default=None,
+            help="Name of the main node of the events, defaults to the node of the user",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Number of events inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        if not options["tess_ids"] and options["query"] is None:
+            raise CommandError("Give TeSS event ids or a --query")
+
+        user = User.objects.filter(username=options["user"]).first()
+        if user is None:
+            raise CommandError(f"No user named {options['user']}")
+        node_main = (
+            Node.objects.filter(name=options["node"]).first()
+            if options["node"]
+            else UserProfile.get_node(user)
+        )
+        if node_main is None:
+            raise CommandError("No node for the events, use --node")
+
+        client = get_tess_client()
+        documents = []
+        if options["tess_ids"]:
+            for (tess_id, document) in client.get_events(options["tess_ids"]).items():
+                if document is None:
+                    print(f"Could not fetch TeSS event {tess_id}")
+                else:
+                    documents.append(document)
+        if options["query"] is not None:
+            filters = {}
+            for entry in options["filter"]:
+                (key, _, value) = entry.partition("=")
+                filters.setdefault(key, []).append(value)
+            try:
+                documents.extend(client.search_events(options["query"], filters))
+            except ValidationError as e:
+                raise CommandError(e.messages[0])
+
+        with transaction.atomic():
+            (events, skipped) = create_tess_events(
+                documents,
+                user,
+                node_main,
+                options["batch_size"],
+            )
+        for (document, reason) in skipped:
+            print(f"Skipped TeSS event {document['data'].get('id')}: {reason}")
+        print(f"Imported {len(events)} events, skipped {len(skipped)}")
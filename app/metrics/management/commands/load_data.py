@@ -1,4 +1,7 @@
 import csv
+import itertools
+import os
+import time
 from metrics.models import (
     Event,
     Demographic,
@@ -7,44 +10,55 @@ from metrics.models import (
     Node,
     OrganisingInstitution,
     User,
+    UserProfile,
     Question,
     QuestionSet,
     QuestionSuperSet,
     ResponseSet,
     Answer
 )
-from metrics import import_utils
+from metrics import copy_import, import_utils
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.db import connections, transaction
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from django.template.defaultfilters import slugify
 
 
 def get_data_sources(targetdir="example-data"):
+    directory = os.path.join("raw-tmd-data", targetdir)
     return {
-        Event: f'raw-tmd-data/{targetdir}/tango_events.csv',
-        Demographic: f'raw-tmd-data/{targetdir}/tango_demographics.csv',
-        Quality: f'raw-tmd-data/{targetdir}/tango_qualities.csv',
-        Impact: f'raw-tmd-data/{targetdir}/tango_impacts.csv',
-        User: f'raw-tmd-data/{targetdir}/users.csv',
-        OrganisingInstitution: f'raw-tmd-data/{targetdir}/institutions.csv',
-        Node: f'raw-tmd-data/{targetdir}/nodes.csv',
-        Question: f'raw-tmd-data/{targetdir}/base_questions.csv',
-        Answer: f'raw-tmd-data/{targetdir}/base_answers.csv',
+        Event: os.path.join(directory, "tango_events.csv"),
+        Demographic: os.path.join(directory, "tango_demographics.csv"),
+        Quality: os.path.join(directory, "tango_qualities.csv"),
+        Impact: os.path.join(directory, "tango_impacts.csv"),
+        User: os.path.join(directory, "users.csv"),
+        OrganisingInstitution: os.path.join(directory, "institutions.csv"),
+        Node: os.path.join(directory, "nodes.csv"),
+        Question: os.path.join(directory, "base_questions.csv"),
+        Answer: os.path.join(directory, "base_answers.csv"),
     }
 
 
 DATA_SOURCES = get_data_sources()
-import_context = import_utils.ImportContext()
+BATCH_SIZE = settings.IMPORT_CHUNK_SIZE
+WORKERS = 4
 
 
 def are_headers_in_model(csv_file_path, model):
     with open(csv_file_path, newline='') as csvfile:
         reader = csv.DictReader(csvfile, delimiter=',')
+        # Fields set on save may be left out of the file
         model_attributes = sorted(
             [
                 field.name
                 for field in model._meta.fields + model._meta.many_to_many
                 if field.name not in {"locked"}
+                and not (
+                    (getattr(field, "auto_now", False) or not field.editable)
+                    and field.name not in reader.fieldnames
+                )
             ]
         )
         headers = sorted([
@@ -59,64 +73,141 @@ def are_headers_in_model(csv_file_path, model):
         return len(uncommon_headers) == 1
 
 
+def read_batches(csv_file_path):
+    with open(csv_file_path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        while batch := list(itertools.islice(reader, BATCH_SIZE)):
+            yield batch
+
+
+def get_users(usernames):
+    users = {
+        user.username: user
+        for user in User.objects.filter(username__in=set(usernames))
+    }
+    missing = set(usernames) - users.keys()
+    if missing:
+        raise User.DoesNotExist(f"Users do not exist: {', '.join(sorted(missing))}")
+    return users
+
+
 def load_events():
     with open(DATA_SOURCES[Event], newline='') as csvfile:
         reader = csv.DictReader(csvfile, delimiter=',')
-        for row in reader:
-            import_context.event_from_dict(row)
+        events = import_utils.ImportContext().events_from_dicts(
+            reader,
+            batch_size=BATCH_SIZE
+        )
+    return len(events)
 
 
-def load_demographics():
-    with open(DATA_SOURCES[Demographic], newline='') as csvfile:
+def load_responses(question_set_id, model):
+    with open(DATA_SOURCES[model], newline='') as csvfile:
         reader = csv.DictReader(csvfile)
-        for row in reader:
-            if not is_empty(row):
-                import_context.responses_from_dict("demographic", row)
+        return import_utils.ImportContext().responses_from_dicts(
+            question_set_id,
+            (row for row in reader if not is_empty(row)),
+            batch_size=BATCH_SIZE,
+        )
 
 
-def load_qualities():
-    with open(DATA_SOURCES[Quality], newline='') as csvfile:
+def copy_events():
+    with open(DATA_SOURCES[Event], newline='') as csvfile:
         reader = csv.DictReader(csvfile)
-        for row in reader:
-            if not is_empty(row):
-                import_context.responses_from_dict("quality", row)
+        return copy_import.copy_events(reader, BATCH_SIZE)
 
 
-def load_impacts():
-    with open(DATA_SOURCES[Impact], newline='') as csvfile:
+def copy_responses(question_set_id, model):
+    with open(DATA_SOURCES[model], newline='') as csvfile:
         reader = csv.DictReader(csvfile)
-        for row in reader:
-            if not is_empty(row):
-                import_context.responses_from_dict("impact", row)
+        return copy_import.copy_responses(
+            question_set_id,
+            (row for row in reader if not is_empty(row)),
+            BATCH_SIZE,
+        )
+
+
+def copy_demographics():
+    return copy_responses("demographic", Demographic)
+
+
+def copy_qualities():
+    return copy_responses("quality", Quality)
+
+
+def copy_impacts():
+    return copy_responses("impact", Impact)
+
+
+def load_demographics():
+    return load_responses("demographic", Demographic)
+
+
+def load_qualities():
+    return load_responses("quality", Quality)
+
+
+def load_impacts():
+    return load_responses("impact", Impact)
 
 
 def load_user():
-    with open(DATA_SOURCES[User]) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            User.objects.create_user(
-                username=row['NodeAccount'],
-                password=row['Password']
+    count = 0
+    for batch in read_batches(DATA_SOURCES[User]):
+        # Password hashing dominates, hashlib releases the GIL while hashing.
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            passwords = list(executor.map(
+                make_password,
+                [row['Password'] for row in batch]
+            ))
+        users = User.objects.bulk_create([
+            User(username=row['NodeAccount'], password=password)
+            for (row, password) in zip(batch, passwords)
+        ])
+        # bulk_create does not send post_save, create the profiles here.
+        nodes = {
+            node.name: node
+            for node in Node.objects.filter(name__in=[
+                UserProfile.get_default_node_name(user.username)
+                for user in users
+            ])
+        }
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                user=user,
+                node=nodes.get(UserProfile.get_default_node_name(user.username))
             )
+            for user in users
+        ])
+        count += len(users)
+    return count
 
 
 def load_nodes():
-    with open(DATA_SOURCES[Node]) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            Node.objects.create(
+    count = 0
+    for batch in read_batches(DATA_SOURCES[Node]):
+        Node.objects.bulk_create([
+            Node(
                 name=row['name'],
                 country=row['country']
             )
+            for row in batch
+        ])
+        count += len(batch)
+    return count
 
 
 def load_institutions():
-    with open(DATA_SOURCES[OrganisingInstitution]) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            OrganisingInstitution.objects.create(
+    count = 0
+    for batch in read_batches(DATA_SOURCES[OrganisingInstitution]):
+        OrganisingInstitution.objects.bulk_create([
+            OrganisingInstitution(
                 name=row['name'],
             )
+            for row in batch
+        ])
+        count += len(batch)
+    return count
 
 
 def _parse_question_id(value):
@@ -133,76 +224,158 @@ def load_questions():
             }
             for row in reader
         ]
-        core_set_name = "TMD Core Questions"
-        core_set = QuestionSuperSet.objects.create(
-            name=core_set_name,
-            slug=slugify(core_set_name),
-            user=User.objects.get(username=rows[0]["user"])
+    users = get_users([row["user"] for row in rows])
+    core_user = users[rows[0]["user"]]
+    core_set_name = "TMD Core Questions"
+    core_set = QuestionSuperSet.objects.create(
+        name=core_set_name,
+        slug=slugify(core_set_name),
+        user=core_user
+    )
+    question_sets = {
+        set_id: QuestionSet.objects.create(name=set_id, slug=slugify(set_id), user=users[username])
+        for set_id, username in set([(row["question_set"], row["user"]) for row in rows])
+    }
+    core_set.question_sets.add(*question_sets.values())
+    for qs in question_sets.values():
+        qs_ss = QuestionSuperSet.objects.create(
+            name=qs.name,
+            slug=qs.slug,
+            user=core_user
         )
-        question_sets = {
-            set_id: QuestionSet.objects.create(name=set_id, slug=slugify(set_id), user=User.objects.get(username=username))
-            for set_id, username in set([(row["question_set"], row["user"]) for row in rows])
-        }
-        for qs in question_sets.values():
-            core_set.question_sets.add(qs)
-            qs_ss = QuestionSuperSet.objects.create(
-                name=qs.name,
-                slug=qs.slug,
-                user=User.objects.get(username=rows[0]["user"])
-            )
-            qs_ss.question_sets.add(qs)
-            qs_ss.save()
-
-        for row in rows:
-            question_slug = _parse_question_id(row["slug"])
-            question_set = question_sets[row["question_set"]]
-            question = Question.objects.create(
-                slug=question_slug,
-                text=row["text"],
-                is_multichoice=bool(int(row["is_multichoice"])),
-                user=User.objects.get(username=row["user"])
-            )
-            question_set.questions.add(question)
-            if bool(int(row["is_optional"])):
-                Answer.objects.create(
-                    slug="no-response",
-                    text="-",
-                    user=User.objects.get(username=row["user"]),
-                    question=question
-                )
+        qs_ss.question_sets.add(qs)
+
+    questions = Question.objects.bulk_create([
+        Question(
+            slug=_parse_question_id(row["slug"]),
+            text=row["text"],
+            is_multichoice=bool(int(row["is_multichoice"])),
+            user=users[row["user"]]
+        )
+        for row in rows
+    ])
+    QuestionSet.questions.through.objects.bulk_create([
+        QuestionSet.questions.through(
+            questionset_id=question_sets[row["question_set"]].id,
+            question_id=question.id,
+        )
+        for (row, question) in zip(rows, questions)
+    ])
+    Answer.objects.bulk_create([
+        Answer(
+            slug="no-response",
+            text="-",
+            user=users[row["user"]],
+            question=question
+        )
+        for (row, question) in zip(rows, questions)
+        if bool(int(row["is_optional"]))
+    ])
+    return len(rows)
 
 
 def load_answers():
-    with open(DATA_SOURCES[Answer]) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for i, row in enumerate(reader):
-            slug = slugify(row["slug"] if row["slug"] else row["text"])
-            question_slug = _parse_question_id(row["question"])
-            question = Question.objects.get(slug=question_slug)
-            Answer.objects.create(
-                slug=slug,
+    count = 0
+    for batch in read_batches(DATA_SOURCES[Answer]):
+        users = get_users([row["user"] for row in batch])
+        question_slugs = [_parse_question_id(row["question"]) for row in batch]
+        questions = {
+            question.slug: question
+            for question in Question.objects.filter(slug__in=question_slugs)
+        }
+        missing = set(question_slugs) - questions.keys()
+        if missing:
+            raise Question.DoesNotExist(
+                f"Questions do not exist: {', '.join(sorted(missing))}"
+            )
+        Answer.objects.bulk_create([
+            Answer(
+                slug=slugify(row["slug"] if row["slug"] else row["text"]),
                 text=row["text"],
-                user=User.objects.get(username=row["user"]),
-                question=question
+                user=users[row["user"]],
+                question=questions[question_slug]
             )
+            for (row, question_slug) in zip(batch, question_slugs)
+        ])
+        count += len(batch)
+    return count
+
+
+# Loaders of a stage run in order, a stage starts once the stages it
+# depends on are done. Stages that are not selected count as loaded.
+STAGES = {
+    "nodes": ([load_nodes], []),
+    "institutions": ([load_institutions], []),
+    "user": ([load_user], ["nodes"]),
+    "events": ([load_events], ["nodes", "institutions", "user"]),
+    "questions": ([load_questions, load_answers], ["user"]),
+    "demographics": ([load_demographics], ["events"]),
+    "qualities": ([load_qualities], ["events"]),
+    "impacts": ([load_impacts], ["events"]),
+}
+
+# Used by --copy, these stages write through staging tables with COPY.
+COPY_LOADERS = {
+    "events": [copy_events],
+    "demographics": [copy_demographics],
+    "qualities": [copy_qualities],
+    "impacts": [copy_impacts],
+}
+
+STAGE_GROUPS = {
+    "metrics": ["demographics", "qualities", "impacts"],
+}
+
+
+def run_stage(stage_id, loaders):
+    start = time.perf_counter()
+    rows = sum(loader() for loader in loaders)
+    elapsed = time.perf_counter() - start
+    print(
+        f"LOADED {stage_id.upper()}: {rows} rows in {elapsed:.2f}s "
+        f"({rows / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+
+
+def run_stage_in_worker(stage_id, loaders):
+    try:
+        run_stage(stage_id, loaders)
+    finally:
+        # Connections are per thread, close the one opened by this worker.
+        connections.close_all()
+
+
+def run_stages(stage_ids, workers, loaders=None):
+    loaders = loaders or {}
+    stages = {
+        stage_id: (loaders.get(stage_id, stage_loaders), dependencies)
+        for stage_id, (stage_loaders, dependencies) in STAGES.items()
+        if stage_id in stage_ids
+    }
 
-
-def load_metrics():
-    num_workers = 3
-    with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        functions_to_execute = [
-            load_demographics,
-            load_qualities,
-            load_impacts,
-        ]
-
-        futures = [executor.submit(func) for func in functions_to_execute]
-
-        for future in as_completed(futures):
-            try:
+    if workers <= 1:
+        # STAGES is ordered by its dependencies
+        for stage_id, (loaders, _dependencies) in stages.items():
+            run_stage(stage_id, loaders)
+        return
+
+    pending = dict(stages)
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for stage_id, (loaders, dependencies) in list(pending.items()):
+                if all(
+                    dependency in done or dependency not in stages
+                    for dependency in dependencies
+                ):
+                    del pending[stage_id]
+                    future = executor.submit(run_stage_in_worker, stage_id, loaders)
+                    running[future] = stage_id
+            (finished, _running) = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done.add(running.pop(future))
                 future.result()
-            except Exception as e:
-                print(f"An error occurred: {e}")
 
 
 def is_empty(items):
@@ -238,6 +411,29 @@ class Command(BaseCommand):
             required=False,
         )
 
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=WORKERS,
+            help="Number of stages loaded in parallel, 1 loads them in order",
+        )
+
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help=(
+                "Load events and metrics with COPY into staging tables and "
+                "INSERT ... SELECT, all stages in one transaction"
+            ),
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.IMPORT_CHUNK_SIZE,
+            help="Number of rows inserted per query",
+        )
+
     def handle(self, *args, **options):
         if options["resetdata"]:
             all_models = [
@@ -257,9 +453,11 @@ class Command(BaseCommand):
             for model in all_models:
                 model.objects.all().delete()
 
-        global DATA_SOURCES
+        global DATA_SOURCES, BATCH_SIZE, WORKERS
         if options["targetdir"]:
             DATA_SOURCES = get_data_sources(options["targetdir"])
+        BATCH_SIZE = options["batch_size"]
+        WORKERS = max(options["workers"], 1)
 
         for model, csv_file_path in DATA_SOURCES.items():
             if model == User:
@@ -268,20 +466,18 @@ class Command(BaseCommand):
                 raise Exception(
                     f'Some headers are not present for model {model.__name__} in {csv_file_path}')
 
-        loader_ids = set(options["loaders"]) if options["loaders"] else None
-
-        items_to_load = [
-            ("nodes", [load_nodes]),
-            ("institutions", [load_institutions]),
-            ("user", [load_user]),
-            ("events", [load_events]),
-            ("questions", [load_questions, load_answers]),
-            ("metrics", [load_metrics])
+        stage_ids = [
+            stage_id
+            for loader_id in (options["loaders"] or STAGES)
+            for stage_id in STAGE_GROUPS.get(loader_id, [loader_id])
         ]
-
-        for loader_id, loaders in items_to_load:
-            if not loader_ids or loader_id in loader_ids:
-                print(f"LOADING {loader_id.upper()}")
-                print("------------------------")
-                for loader in loaders:
-                    loader()
+        unknown = set(stage_ids) - STAGES.keys()
+        if unknown:
+            raise Exception(f"Unknown loaders: {', '.join(sorted(unknown))}")
+
+        if options["copy"]:
+            # Staging tables and the transaction belong to one connection.
+            with transaction.atomic():
+                run_stages(stage_ids, 1, COPY_LOADERS)
+        else:
+            run_stages(stage_ids, WORKERS)
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+import itertools
+
+from metrics.models import RorOrganisation, RorOrganisationName
+from metrics.ror import iter_dump_records, parse_aliases, parse_organisation
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads a ROR data dump (the .zip release or its .json file) into the "
+        "local index used to resolve and search institutions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            type=str,
+            help="Path to the ROR data dump",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Number of organisations written per query",
+        )
+
+    def handle(self, *args, **options):
+        records = iter_dump_records(options["path"])
+        total = 0
+        # ROR ids are never removed from the registry, so organisations are
+        # upserted and entries from earlier dumps are kept.
+        with transaction.atomic():
+            while batch := list(itertools.islice(records, options["batch_size"])):
+                self.load_batch(batch)
+                total += len(batch)
+        print(f"ROR organisations loaded: {total}")
+
+    def load_batch(self, records):
+        organisations = {}
+        for data in records:
+            (name, country) = parse_organisation(data)
+            organisations[data["id"]] = RorOrganisation(
+                ror_id=data["id"],
+                name=name,
+                country=country,
+                aliases=parse_aliases(data),
+            )
+        RorOrganisation.objects.bulk_create(
+            organisations.values(),
+            update_conflicts=True,
+            unique_fields=["ror_id"],
+            update_fields=["name", "country", "aliases"],
+        )
+        RorOrganisationName.objects.filter(
+            organisation_id__in=organisations.keys()
+        ).delete()
+        RorOrganisationName.objects.bulk_create([
+            RorOrganisationName(organisation_id=ror_id, name=name)
+            for (ror_id, organisation) in organisations.items()
+            for name in dict.fromkeys(
+                value.casefold()
+                for value in [organisation.name, *organisation.aliases]
+            )
+        ])
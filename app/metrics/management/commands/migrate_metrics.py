@@ -1,5 +1,8 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, QuerySet
 from django.core.exceptions import ValidationError
 
 from metrics.models import (
@@ -7,9 +10,10 @@ from metrics.models import (
     Quality,
     Impact,
     Demographic,
-    Response,
     ResponseSet,
     QuestionSet,
+    AnswerCount,
+    LegacyResponseSet,
 )
 from metrics.forms import QuestionSetForm
 from metrics.import_utils import (
@@ -20,6 +24,8 @@ from metrics.import_utils import (
 )
 from typing import Type
 from django.contrib.auth.models import User
+import itertools
+import time
 
 
 def quality_to_responseset(
@@ -43,42 +49,88 @@ def demographic_to_responseset(
     return migrate_entries(entries, Demographic, questionset)
 
 
-def migrate_entries(entries: list, model, questionset: QuestionSet):
+def migrate_entries(
+    entries,
+    model,
+    questionset: QuestionSet,
+    batch_size=None,
+    progress=None
+):
+    """Convert legacy entries to response sets with batched INSERTs.
+
+    Querysets are streamed in chunks of `batch_size`. Every batch is written
+    in its own transaction, `progress(batch, response_sets, count)` is called
+    within that transaction once the batch is written.
+    """
     validate_compatibility(model, questionset)
 
     fields = get_metrics_fields(model)
+    batch_size = batch_size or settings.IMPORT_CHUNK_SIZE
 
     QSForm = QuestionSetForm.from_question_set(questionset)
 
-    for entry in entries:
-        try:
-            entry_data = parse_legacy_entry_data(
-                {
-                    field.name: getattr(entry, field.name)
-                    for field in fields
-                },
-                model
+    if isinstance(entries, QuerySet):
+        entries = entries.iterator(chunk_size=batch_size)
+    entries = iter(entries)
+    count = 0
+    while batch := list(itertools.islice(entries, batch_size)):
+        pending = [
+            (
+                ResponseSet(
+                    user_id=entry.user_id,
+                    event_id=entry.event_id,
+                    question_set=questionset,
+                ),
+                entry_to_answers(entry, model, fields, QSForm),
             )
-            dict_to_responseset(entry_data, entry.user, entry.event, QSForm)
-        except ValidationError as e:
-            print(entry_data)
-            raise e
+            for entry in batch
+        ]
+        with transaction.atomic():
+            response_sets = ResponseSet.bulk_create_with_responses(
+                pending,
+                batch_size=batch_size
+            )
+            count += len(batch)
+            if progress is not None:
+                progress(batch, response_sets, count)
+    return count
+
+
+def entry_to_answers(entry, model, fields, QSForm: Type[QuestionSetForm]):
+    entry_data = parse_legacy_entry_data(
+        {
+            field.name: getattr(entry, field.name)
+            for field in fields
+        },
+        model
+    )
+    try:
+        return QSForm.resolve_answers(entry_data)
+    except ValidationError as e:
+        raise ValidationError(
+            f"Failed to migrate {model.__name__} {entry.id} {entry_data}: {e.messages[0]}"
+        )
 
 
 def validate_compatibility(model, questionset: QuestionSet):
     fields = get_metrics_fields(model)
+    questions = {
+        question.slug: question
+        for question in questionset.questions.prefetch_related("answers")
+    }
     for field in fields:
         field_id = get_field_id(model, field.name)
-        question = questionset.questions.filter(slug=field_id).first()
+        question = questions.get(field_id)
 
         if question is None:
             raise ValidationError(
                 f"Field {field_id} has no representation in set {questionset.slug}"  # noqa: E501
             )
 
+        answer_slugs = {answer.slug for answer in question.answers.all()}
         for option in get_field_options(field):
             mapped_option = map_response(option)
-            if not question.answers.filter(slug=mapped_option).exists():
+            if mapped_option not in answer_slugs:
                 raise ValidationError(
                     f"Choice {field_id}.{option}({mapped_option}) has no representation in set {question.slug}"  # noqa: E501
                 )
@@ -107,45 +159,210 @@ def dict_to_responseset(
     event: Event,
     QSForm: Type[QuestionSetForm]
 ):
-    form = QSForm(entry)
+    (response_set,) = ResponseSet.bulk_create_with_responses([(
+        ResponseSet(
+            user=user,
+            event=event,
+            question_set=QSForm.question_set
+        ),
+        QSForm.resolve_answers(entry),
+    )])
+    return response_set
+
 
-    if not form.is_valid():
-        raise ValidationError(f"Failed to validate form: {form.errors}")
+def remove_stale(model, batch_size=None, report=print):
+    """Delete the response sets of legacy rows that were changed or deleted.
 
-    data = form.cleaned_data
-    rs = ResponseSet.objects.create(
-        user=user,
-        event=event,
-        question_set=form.question_set
+    Returns the number of response sets deleted, the changed rows are
+    migrated again by the next `migrate_model`.
+    """
+    batch_size = batch_size or settings.IMPORT_CHUNK_SIZE
+    current = model.objects.filter(
+        id=OuterRef("source_id"),
+        modified__lte=OuterRef("source_modified"),
     )
-    for answer in data.values():
-        all_answers = answer if isinstance(answer, list) else [answer]
-        for a in all_answers:
-            Response.objects.create(response_set=rs, answer=a)
-    return rs
-
-
-def migrate_all():
-    (
-        quality,
-        impact,
-        demographic
-    ) = (
-        QuestionSet.objects.filter(slug=slug).get()
-        for slug in ["quality", "impact", "demographic"]
+    stale = list(
+        LegacyResponseSet.objects
+        .filter(source=model._meta.label)
+        .filter(~Exists(current))
+        .values_list("response_set_id", "response_set__event_id")
     )
+    for index in range(0, len(stale), batch_size):
+        batch = stale[index:index + batch_size]
+        with transaction.atomic():
+            ResponseSet.objects.filter(
+                id__in=[response_set_id for (response_set_id, _event_id) in batch]
+            ).delete()
+            AnswerCount.refresh({event_id for (_response_set_id, event_id) in batch})
+    if stale:
+        report(f"{model.__name__}: {len(stale)} changed or deleted rows removed")
+    return len(stale)
 
-    with transaction.atomic():
-        quality_to_responseset(list(Quality.objects.all()), quality)
-        impact_to_responseset(list(Impact.objects.all()), impact)
-        demographic_to_responseset(
-            list(Demographic.objects.all()),
-            demographic
+
+def link_converted(model, questionset, batch_size=None, report=print):
+    """Record the response sets that legacy rows were converted to before
+    the conversions were recorded.
+
+    Such conversions are only known by the user, event and answers of the
+    response set. Within each user and event, a row is linked to the first
+    unlinked response set of `questionset` with the answers the row
+    converts to. Response sets that match no row, like uploaded ones, are
+    left alone. Returns the number of rows linked.
+    """
+    source = model._meta.label
+    batch_size = batch_size or settings.IMPORT_CHUNK_SIZE
+    fields = get_metrics_fields(model)
+    QSForm = QuestionSetForm.from_question_set(questionset)
+    migrated = LegacyResponseSet.objects.filter(
+        source=source,
+        source_id=OuterRef("id"),
+    )
+    entries = itertools.groupby(
+        model.objects.filter(~Exists(migrated))
+        .order_by("user_id", "event_id", "id")
+        .iterator(chunk_size=batch_size),
+        key=lambda entry: (entry.user_id, entry.event_id),
+    )
+    response_sets = itertools.groupby(
+        ResponseSet.objects
+        .filter(question_set=questionset, legacy_source__isnull=True)
+        .annotate(answers=ArrayAgg(
+            "entries__answer",
+            ordering="entries__answer",
+            filter=Q(entries__isnull=False),
+            default=[],
+        ))
+        .order_by("user_id", "event_id", "id")
+        .values_list("user_id", "event_id", "id", "answers")
+        .iterator(chunk_size=batch_size),
+        key=lambda row: row[:2],
+    )
+    current = next(response_sets, None)
+    pending = []
+    count = 0
+    for (key, group) in entries:
+        while current is not None and current[0] < key:
+            current = next(response_sets, None)
+        if current is None:
+            break
+        if current[0] != key:
+            continue
+        candidates = [
+            (response_set_id, answers)
+            for (_user, _event, response_set_id, answers) in current[1]
+        ]
+        for entry in group:
+            try:
+                answers = sorted(
+                    answer.id
+                    for answer in entry_to_answers(entry, model, fields, QSForm)
+                )
+            except ValidationError:
+                # A row that can not be converted was never converted
+                continue
+            match = next(
+                (candidate for candidate in candidates if candidate[1] == answers),
+                None
+            )
+            if match is None:
+                continue
+            candidates.remove(match)
+            pending.append(LegacyResponseSet(
+                source=source,
+                source_id=entry.id,
+                source_modified=entry.modified,
+                response_set_id=match[0],
+            ))
+        current = next(response_sets, None)
+        if len(pending) >= batch_size:
+            LegacyResponseSet.objects.bulk_create(pending)
+            count += len(pending)
+            pending = []
+    LegacyResponseSet.objects.bulk_create(pending)
+    count += len(pending)
+    report(f"{model.__name__}: {count} converted rows linked")
+    return count
+
+
+def migrate_model(model, questionset, batch_size=None, report=print):
+    """Migrate the rows of model that have not been migrated yet.
+
+    Every migrated row is recorded in `LegacyResponseSet` together with its
+    response set, in the same transaction as the batch. Re-runs only convert
+    new and changed rows.
+    """
+    source = model._meta.label
+    remove_stale(model, batch_size, report)
+    migrated = LegacyResponseSet.objects.filter(
+        source=source,
+        source_id=OuterRef("id"),
+    )
+    entries = model.objects.filter(~Exists(migrated)).order_by("id")
+    total = entries.count()
+    start = time.perf_counter()
+
+    def progress(batch, response_sets, count):
+        LegacyResponseSet.objects.bulk_create([
+            LegacyResponseSet(
+                source=source,
+                source_id=entry.id,
+                source_modified=entry.modified,
+                response_set=response_set,
+            )
+            for (entry, response_set) in zip(batch, response_sets)
+        ])
+        elapsed = time.perf_counter() - start
+        report(
+            f"{model.__name__}: {count}/{total} rows "
+            f"({count * 100 // total}%, {count / elapsed:.0f} rows/s)"
         )
 
+    if total == 0:
+        report(f"{model.__name__}: up to date")
+        return 0
+    return migrate_entries(entries, model, questionset, batch_size, progress)
+
+
+def migrate_all(batch_size=None, report=print, link=False):
+    question_sets = {
+        model: QuestionSet.objects.filter(slug=slug).get()
+        for (model, slug) in [
+            (Quality, "quality"),
+            (Impact, "impact"),
+            (Demographic, "demographic"),
+        ]
+    }
+    # Check all sets before anything is written
+    for model, questionset in question_sets.items():
+        validate_compatibility(model, questionset)
+    for model, questionset in question_sets.items():
+        if link:
+            link_converted(model, questionset, batch_size, report)
+        migrate_model(model, questionset, batch_size, report)
+
 
 class Command(BaseCommand):
-    help = "Migrates metrics from old structure to the new"
+    help = (
+        "Migrates metrics from old structure to the new. Only rows that are "
+        "new or changed since the last run are migrated, in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.IMPORT_CHUNK_SIZE,
+            help="Number of legacy rows converted per transaction",
+        )
+        parser.add_argument(
+            "--link-converted",
+            action="store_true",
+            help=(
+                "Link the rows converted by versions of this command that "
+                "did not record them to their response sets first, instead "
+                "of converting them again"
+            ),
+        )
 
     def handle(self, *args, **options):
-        migrate_all()
+        migrate_all(options["batch_size"], link=options["link_converted"])
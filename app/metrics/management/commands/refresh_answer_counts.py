@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from metrics.models import AnswerCount
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the precomputed answer counts used for the metrics pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events",
+            type=int,
+            required=False,
+            nargs='+',
+            help="Only rebuild the counts of the events with these ids",
+        )
+
+    def handle(self, *args, **options):
+        AnswerCount.refresh(options["events"])
+        print(f"Answer counts refreshed: {AnswerCount.objects.count()} rows")
@@ -0,0 +1,95 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+import django
+import multiprocessing
+import time
+
+from metrics.models import UploadJob
+from metrics.upload_jobs import run_upload_job
+
+
+class Command(BaseCommand):
+    help = "Runs queued upload jobs in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.UPLOAD_JOB_WORKERS,
+            help="Number of worker processes, 0 runs the jobs in this process",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.UPLOAD_JOB_POLL_INTERVAL,
+            help="Seconds to wait between checks for new jobs",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once there are no more queued jobs",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] == 0:
+            self.run_inline(options["poll_interval"], options["once"])
+        else:
+            self.run_pool(
+                options["workers"],
+                options["poll_interval"],
+                options["once"]
+            )
+
+    def report(self, job_id, status):
+        print(f"Upload job {job_id}: {status}")
+
+    def run_inline(self, poll_interval, once):
+        while True:
+            job = UploadJob.claim()
+            if job is not None:
+                self.report(job.id, run_upload_job(job.id))
+            elif once:
+                return
+            else:
+                time.sleep(poll_interval)
+
+    def run_pool(self, workers, poll_interval, once):
+        # Spawned workers set up Django themselves instead of sharing the
+        # database connections of this process.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            running = {}
+            while True:
+                while len(running) < workers:
+                    job = UploadJob.claim()
+                    if job is None:
+                        break
+                    running[executor.submit(run_upload_job, job.id)] = job.id
+
+                if not running:
+                    if once:
+                        return
+                    connections.close_all()
+                    time.sleep(poll_interval)
+                    continue
+
+                (done, _pending) = wait(
+                    running,
+                    timeout=poll_interval,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.report(job_id, future.result())
+                    except Exception as e:
+                        UploadJob.objects.filter(id=job_id).update(
+                            status=UploadJob.FAILED,
+                            errors=[f"Upload job failed: {e}"],
+                        )
+                        self.report(job_id, UploadJob.FAILED)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from metrics.change_feed import get_changes
+import json
+import os
+import sys
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the events, response sets and institutions changed since a "
+        "cursor, and the deletions, as JSON lines"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Cursor to start after")
+        parser.add_argument(
+            "--cursor-file",
+            help="File the cursor is read from and the next cursor written to",
+        )
+        parser.add_argument("--limit", type=int, help="Objects per stream and page")
+        parser.add_argument("--output", help="Output file, stdout by default")
+
+    def handle(self, *args, **options):
+        cursor_file = options["cursor_file"]
+        cursor = options["since"]
+        if cursor is None and cursor_file and os.path.exists(cursor_file):
+            with open(cursor_file) as f:
+                cursor = f.read().strip()
+
+        output = open(options["output"], "a") if options["output"] else sys.stdout
+        try:
+            count = 0
+            more = True
+            while more:
+                try:
+                    (changes, cursor, more) = get_changes(cursor, options["limit"])
+                except ValidationError as e:
+                    raise CommandError(e.messages[0])
+                for stream, objects in changes.items():
+                    for obj in objects:
+                        output.write(
+                            json.dumps({"stream": stream, "object": obj}, cls=DjangoJSONEncoder)
+                            + "\n"
+                        )
+                    count += len(objects)
+                output.flush()
+                if cursor_file:
+                    with open(f"{cursor_file}.tmp", "w") as f:
+                        f.write(cursor)
+                    os.replace(f"{cursor_file}.tmp", cursor_file)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        print(f"Synced {count} changes, cursor: {cursor}", file=sys.stderr)
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0005_answer_question_questionset_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counts', to='metrics.answer')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_counts', to='metrics.event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='answercount',
+            constraint=models.UniqueConstraint(fields=('answer', 'event'), name='answer count is unique per event'),
+        ),
+        migrations.RunSQL(
+            sql=(
+                "INSERT INTO metrics_answercount (event_id, answer_id, count) "
+                "SELECT rs.event_id, r.answer_id, COUNT(*) "
+                "FROM metrics_response r "
+                "JOIN metrics_responseset rs ON rs.id = r.response_set_id "
+                "GROUP BY rs.event_id, r.answer_id"
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:08
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0007_uploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RorOrganisation',
+            fields=[
+                ('ror_id', models.URLField(max_length=512, primary_key=True, serialize=False)),
+                ('name', models.TextField()),
+                ('country', models.TextField(blank=True)),
+                ('aliases', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, size=None)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RorOrganisationName',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='names', to='metrics.rororganisation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name'], name='metrics_ror_name_prefix_idx', opclasses=['text_pattern_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:11
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0008_rororganisation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.HashIndex(fields=['url'], name='metrics_event_url_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0009_event_url_hash_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LegacyResponseSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.TextField()),
+                ('source_id', models.BigIntegerField()),
+                ('source_modified', models.DateTimeField()),
+                ('response_set', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='legacy_source', to='metrics.responseset')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='legacyresponseset',
+            constraint=models.UniqueConstraint(fields=('source', 'source_id'), name='legacy row is migrated once'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:26
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0011_event_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answercount',
+            name='event_additional_platforms',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='answercount',
+            name='event_date_end',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='answercount',
+            name='event_date_start',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='answercount',
+            name='event_funding',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='answercount',
+            name='event_node',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='answercount',
+            name='event_target_audience',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='answercount',
+            name='event_type',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                "UPDATE metrics_answercount SET "
+                "event_type = e.type, "
+                "event_funding = e.funding, "
+                "event_target_audience = e.target_audience, "
+                "event_additional_platforms = e.additional_platforms, "
+                "event_date_start = e.date_start, "
+                "event_date_end = e.date_end, "
+                "event_node = ARRAY("
+                "SELECT n.node_id FROM metrics_event_node n "
+                "WHERE n.event_id = e.id ORDER BY n.node_id"
+                ") "
+                "FROM metrics_event e WHERE e.id = metrics_answercount.event_id"
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
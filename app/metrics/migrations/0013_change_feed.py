@@ -0,0 +1,97 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+CHANGE_FEED_TABLES = [
+    "metrics_event",
+    "metrics_responseset",
+    "metrics_organisinginstitution",
+    "metrics_deletedobject",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0012_answercount_event_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.TextField()),
+                ('object_id', models.BigIntegerField()),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+                ('change_xid', models.BigIntegerField(default=0, editable=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='organisinginstitution',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='organisinginstitution',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='responseset',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['change_xid', 'id'], name='metrics_event_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organisinginstitution',
+            index=models.Index(fields=['change_xid', 'id'], name='metrics_institution_sync_idx'),
+        ),
+        # Keyset pages of the institution list
+        migrations.AddIndex(
+            model_name='organisinginstitution',
+            index=models.Index(fields=['name', 'id'], name='metrics_institution_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='responseset',
+            index=models.Index(fields=['change_xid', 'id'], name='metrics_responseset_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deletedobject',
+            index=models.Index(fields=['change_xid', 'id'], name='metrics_deleted_sync_idx'),
+        ),
+        # Rows written before this migration keep 0, the first page of the
+        # feed starts with them
+        migrations.RunSQL(
+            sql=(
+                "CREATE FUNCTION metrics_set_change_xid() RETURNS trigger AS $$ "
+                "BEGIN "
+                "NEW.change_xid := pg_current_xact_id()::text::bigint; "
+                "RETURN NEW; "
+                "END; "
+                "$$ LANGUAGE plpgsql"
+            ),
+            reverse_sql="DROP FUNCTION metrics_set_change_xid()",
+        ),
+        *[
+            migrations.RunSQL(
+                sql=(
+                    f"CREATE TRIGGER {table}_change_xid "
+                    f"BEFORE INSERT OR UPDATE ON {table} "
+                    "FOR EACH ROW EXECUTE FUNCTION metrics_set_change_xid()"
+                ),
+                reverse_sql=f"DROP TRIGGER {table}_change_xid ON {table}",
+            )
+            for table in CHANGE_FEED_TABLES
+        ],
+    ]
@@ -2,3 +2,5 @@ from .common import *  # noqa: F401,F403
 from .questions import *  # noqa: F401,F403
 from .legacy import *  # noqa: F401,F403
 from .system import *  # noqa: F401,F403
+from .jobs import *  # noqa: F401,F403
+from .changes import *  # noqa: F401,F403
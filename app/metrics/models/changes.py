@@ -0,0 +1,63 @@
+from django.db import models
+from django.db.models.signals import m2m_changed, post_delete
+from django.utils import timezone
+from .common import Event, OrganisingInstitution
+from .questions import ResponseSet
+
+
+class DeletedObject(models.Model):
+    """A tombstone for the change feed, written when a synced object is
+    deleted."""
+    model = models.TextField()
+    object_id = models.BigIntegerField()
+    modified = models.DateTimeField(default=timezone.now)
+    # Id of the last transaction that wrote the row, set by a trigger
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_xid", "id"], name="metrics_deleted_sync_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id}"
+
+
+def record_deletion(sender, instance, **kwargs):
+    DeletedObject.objects.create(
+        model=sender._meta.label_lower,
+        object_id=instance.pk,
+    )
+
+
+def touch_events(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mark events as changed when their nodes or institutions change.
+
+    Changing a many-to-many relation does not save the event, the feed
+    returns the relations with the event.
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            events = Event.objects.filter(pk=instance.pk)
+        else:
+            return
+    elif action in ("post_add", "post_remove") and pk_set:
+        events = Event.objects.filter(pk__in=pk_set)
+    elif action == "pre_clear":
+        # The events of a cleared node or institution are not known after
+        events = Event.objects.filter(**{TOUCHED_RELATIONS[sender]: instance})
+    else:
+        return
+    events.update(modified=timezone.now())
+
+
+post_delete.connect(record_deletion, sender=Event)
+post_delete.connect(record_deletion, sender=ResponseSet)
+post_delete.connect(record_deletion, sender=OrganisingInstitution)
+
+TOUCHED_RELATIONS = {
+    Event.node.through: "node",
+    Event.organising_institution.through: "organising_institution",
+}
+for through in TOUCHED_RELATIONS:
+    m2m_changed.connect(touch_events, sender=through)
@@ -1,12 +1,16 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, HashIndex
 from django.urls import reverse
 from django import forms
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 import re
-import requests
+from collections import Counter
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from metrics.cache import invalidate_metrics_cache
+from metrics.ror import get_ror_client, parse_organisation
 
 
 def string_choices(choices):
@@ -319,6 +323,35 @@ class Event(EditTracking):
         ])
     )
     locked = models.BooleanField(default=False)
+    # Id of the last transaction that wrote the row, set by a trigger
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Urls can be longer than a B-tree entry allows, a hash index
+            # serves the equality lookups used to find imported events.
+            HashIndex(fields=["url"], name="metrics_event_url_hash_idx"),
+            # The array filters are translated to @> lookups, which GIN
+            # indexes serve.
+            GinIndex(fields=["funding"], name="metrics_event_funding_gin_idx"),
+            GinIndex(
+                fields=["target_audience"],
+                name="metrics_event_audience_gin_idx"
+            ),
+            GinIndex(
+                fields=["additional_platforms"],
+                name="metrics_event_platform_gin_idx"
+            ),
+            # Date periods filter on date_end >= from and date_start <= to
+            models.Index(
+                fields=["date_start", "date_end"],
+                name="metrics_event_dates_idx"
+            ),
+            models.Index(fields=["date_end"], name="metrics_event_date_end_idx"),
+            models.Index(fields=["type"], name="metrics_event_type_idx"),
+            # Keyset pages of the change feed
+            models.Index(fields=["change_xid", "id"], name="metrics_event_sync_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.id}) ({self.code})"
@@ -347,6 +380,56 @@ class Event(EditTracking):
             or self.locked
         )
 
+    @staticmethod
+    def bulk_create_with_relations(entries, batch_size=None):
+        """Insert `(Event, [Node], [OrganisingInstitution])` triples using
+        batched INSERTs for the events and their many-to-many rows.
+
+        `bulk_create` does not send `post_save` or `m2m_changed`, so the
+        metrics cache is invalidated here instead.
+        """
+        entries = list(entries)
+        codes = [event.code for (event, _nodes, _institutions) in entries if event.code]
+        duplicates = {
+            code
+            for code, count in Counter(codes).items()
+            if count > 1
+        } | set(
+            Event.objects.filter(code__in=codes).values_list("code", flat=True)
+        )
+        if duplicates:
+            raise ValidationError(
+                f"Events with these codes already exist: {', '.join(sorted(duplicates))}"
+            )
+
+        events = Event.objects.bulk_create(
+            [event for (event, _nodes, _institutions) in entries],
+            batch_size=batch_size,
+        )
+        Event.node.through.objects.bulk_create(
+            [
+                Event.node.through(event_id=event.id, node_id=node_id)
+                for (event, nodes, _institutions) in entries
+                for node_id in dict.fromkeys(node.id for node in nodes)
+            ],
+            batch_size=batch_size,
+        )
+        Event.organising_institution.through.objects.bulk_create(
+            [
+                Event.organising_institution.through(
+                    event_id=event.id,
+                    organisinginstitution_id=institution_id
+                )
+                for (event, _nodes, institutions) in entries
+                for institution_id in dict.fromkeys(
+                    institution.id for institution in institutions
+                )
+            ],
+            batch_size=batch_size,
+        )
+        invalidate_metrics_cache()
+        return events
+
 
 class Node(models.Model):
     name = models.TextField()
@@ -370,6 +453,16 @@ class OrganisingInstitution(models.Model):
     name = models.TextField()
     country = models.TextField()
     ror_id = models.URLField(max_length=512, unique=True, null=True, validators=[is_ror_id])
+    modified = models.DateTimeField(auto_now=True)
+    # Id of the last transaction that wrote the row, set by a trigger
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pages of the institution list
+            models.Index(fields=["name", "id"], name="metrics_institution_name_idx"),
+            models.Index(fields=["change_xid", "id"], name="metrics_institution_sync_idx"),
+        ]
 
     def __str__(self):
         return (
@@ -382,18 +475,88 @@ class OrganisingInstitution(models.Model):
         return reverse("institution-edit", kwargs={"pk": self.id})
 
     def update_ror_data(self):
-        try:
-            ror_id_base = re.match("^https://ror.org/(.+)$", self.ror_id)[0]
-            ror_url = f"https://api.ror.org/organizations/{ror_id_base}"
-            response = requests.get(ror_url, allow_redirects=True)
-            if response.status_code == 200:
-                data = response.json()
-                self.name = data["name"]
-                self.country = data.get("country", {}).get("country_name", "")
-            else:
-                raise ValidationError(f"Could not fetch ROR data for: {self.ror_id}, {ror_url}, {response.status_code}")
-        except TypeError:
-            raise ValidationError(f"Not a valid ror id: {self.ror_id}")
+        result = RorOrganisation.resolve([self.ror_id])[self.ror_id]
+        if isinstance(result, ValidationError):
+            raise result
+        (self.name, self.country) = result
+
+
+class RorOrganisation(models.Model):
+    """An organisation from the local ROR index, see load_ror_dump."""
+    ror_id = models.URLField(max_length=512, primary_key=True)
+    name = models.TextField()
+    country = models.TextField(blank=True)
+    aliases = ArrayField(models.TextField(), default=list, blank=True)
+
+    def __str__(self):
+        return (
+            f"{self.name} ({self.country})"
+            if self.country
+            else str(self.name)
+        )
+
+    @staticmethod
+    def resolve(ror_ids, client=None):
+        """Get the name and country for every ror id.
+
+        The local index is used first, the remaining ids are fetched from
+        the ROR API unless ROR_OFFLINE is set. Ids that can not be resolved
+        map to a ValidationError.
+        """
+        ror_ids = list(dict.fromkeys(ror_ids))
+        result = {
+            organisation.ror_id: (organisation.name, organisation.country)
+            for organisation in RorOrganisation.objects.filter(ror_id__in=ror_ids)
+        }
+        missing = [ror_id for ror_id in ror_ids if ror_id not in result]
+        if not missing:
+            return result
+        if settings.ROR_OFFLINE:
+            result.update({
+                ror_id: ValidationError(f"Not found in the local ROR index: {ror_id}")
+                for ror_id in missing
+            })
+            return result
+
+        client = client or get_ror_client()
+        for (ror_id, data) in client.get_organisations(missing).items():
+            result[ror_id] = (
+                data
+                if isinstance(data, ValidationError)
+                else parse_organisation(data)
+            )
+        return result
+
+    @staticmethod
+    def search(query, limit=10):
+        """Find organisations where the name or an alias starts with query."""
+        query = query.strip().casefold()
+        if not query:
+            return RorOrganisation.objects.none()
+        return RorOrganisation.objects.filter(
+            ror_id__in=RorOrganisationName.objects.filter(
+                name__startswith=query
+            ).values("organisation_id")
+        ).order_by("name")[:limit]
+
+
+class RorOrganisationName(models.Model):
+    """A case folded name or alias of an organisation, for prefix search."""
+    organisation = models.ForeignKey(
+        RorOrganisation,
+        on_delete=models.CASCADE,
+        related_name="names",
+    )
+    name = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name"],
+                name="metrics_ror_name_prefix_idx",
+                opclasses=["text_pattern_ops"],
+            ),
+        ]
 
 
 class UserProfile(models.Model):
@@ -416,15 +579,22 @@ class UserProfile(models.Model):
         except (ObjectDoesNotExist, AttributeError):
             return None
 
+    @staticmethod
+    def get_default_node_name(username):
+        return f"ELIXIR-{username.upper()}"
+
     def __str__(self):
         return "Profile for {0}".format(self.user)
 
 
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        node_name = f"ELIXIR-{instance.username.upper()}"
+        node_name = UserProfile.get_default_node_name(instance.username)
         node = Node.objects.filter(name=node_name).first()
         UserProfile.objects.create(user=instance, node=node)
 
 
 post_save.connect(create_user_profile, sender=User)
+post_save.connect(invalidate_metrics_cache, sender=Event)
+post_delete.connect(invalidate_metrics_cache, sender=Event)
+m2m_changed.connect(invalidate_metrics_cache, sender=Event.node.through)
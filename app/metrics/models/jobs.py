@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.urls import reverse
+from django.utils import timezone
+from metrics.models.common import EditTracking, Event, Node, string_choices
+from metrics.models.questions import QuestionSuperSet
+import datetime
+import os
+
+
+class UploadJobStorage(FileSystemStorage):
+    # Resolved on access rather than on creation, so that the directory
+    # follows the current settings.
+    @property
+    def base_location(self):
+        return settings.UPLOAD_JOB_DIR
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def get_upload_job_storage():
+    return UploadJobStorage()
+
+
+class UploadJob(EditTracking):
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    SUCCEEDED = "Succeeded"
+    FAILED = "Failed"
+
+    status = models.TextField(
+        choices=string_choices([QUEUED, RUNNING, SUCCEEDED, FAILED]),
+        default=QUEUED,
+    )
+    node_main = models.ForeignKey(Node, on_delete=models.CASCADE)
+    event = models.ForeignKey(
+        Event, on_delete=models.CASCADE, null=True, blank=True
+    )
+    data_type = models.TextField(blank=True)
+    super_set = models.ForeignKey(
+        QuestionSuperSet, on_delete=models.CASCADE, null=True, blank=True
+    )
+    file = models.FileField(
+        storage=get_upload_job_storage,
+        upload_to="%Y/%m/%d",
+        blank=True,
+    )
+    file_name = models.TextField()
+    rows_validated = models.PositiveIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    errors = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    outputs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    @property
+    def upload_type(self):
+        return self.super_set if self.super_set_id else self.data_type
+
+    @property
+    def is_done(self):
+        return self.status in (UploadJob.SUCCEEDED, UploadJob.FAILED)
+
+    @staticmethod
+    def fail_stale(timeout=None):
+        """Fail the running jobs whose worker stopped sending heartbeats.
+
+        The import of a job runs in a single transaction, so nothing of a
+        job whose worker died was written. The jobs are failed rather than
+        queued again, so that a file that brings down the worker is not
+        retried forever.
+        """
+        timeout = settings.UPLOAD_JOB_STALE_TIMEOUT if timeout is None else timeout
+        cutoff = timezone.now() - datetime.timedelta(seconds=timeout)
+        with transaction.atomic():
+            jobs = list(
+                UploadJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=UploadJob.RUNNING)
+                .filter(
+                    models.Q(heartbeat__lt=cutoff)
+                    | models.Q(heartbeat__isnull=True, started__lt=cutoff)
+                )
+            )
+            for job in jobs:
+                job.status = UploadJob.FAILED
+                job.errors = [
+                    *job.errors,
+                    "The upload job stopped unexpectedly, please upload the file again",
+                ]
+                job.finished = timezone.now()
+                job.file.delete(save=False)
+                job.save()
+        return jobs
+
+    @staticmethod
+    def claim():
+        """Mark the oldest queued job as running and return it.
+
+        Locked rows are skipped so that several workers can claim jobs
+        concurrently without picking the same one. Jobs of workers that
+        died are failed first.
+        """
+        UploadJob.fail_stale()
+        with transaction.atomic():
+            job = (
+                UploadJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=UploadJob.QUEUED)
+                .order_by("id")
+                .first()
+            )
+            if job is not None:
+                job.status = UploadJob.RUNNING
+                job.started = job.heartbeat = timezone.now()
+                job.save(update_fields=["status", "started", "heartbeat", "modified"])
+        return job
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "file_name": self.file_name,
+            "rows_validated": self.rows_validated,
+            "rows_imported": self.rows_imported,
+            "rows_total": self.rows_total,
+            "errors": self.errors,
+            "outputs": self.outputs,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+    def get_absolute_url(self):
+        return reverse("upload-job", kwargs={"pk": self.id})
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
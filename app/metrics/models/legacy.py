@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 from .common import ChoiceArrayField, string_choices, country_list, EditTracking
+from metrics.cache import invalidate_metrics_cache
 
 
 class Demographic(EditTracking):
@@ -270,3 +272,32 @@ class Impact(EditTracking):
 
     def __str__(self):
         return f"Attendance: {self.get_how_long_ago_display()}, Reason: {self.get_main_attend_reason_display()}, Use Before: {self.how_often_use_before}, Use After: {self.how_often_use_after}, Able to Explain: {self.able_to_explain}"
+
+
+class LegacyResponseSet(models.Model):
+    """The response set a legacy metrics row has been migrated to."""
+    source = models.TextField()
+    source_id = models.BigIntegerField()
+    source_modified = models.DateTimeField()
+    response_set = models.OneToOneField(
+        "ResponseSet", on_delete=models.CASCADE, related_name="legacy_source"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "source_id"],
+                name="legacy row is migrated once",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.source_id}"
+
+
+post_save.connect(invalidate_metrics_cache, sender=Demographic)
+post_delete.connect(invalidate_metrics_cache, sender=Demographic)
+post_save.connect(invalidate_metrics_cache, sender=Quality)
+post_delete.connect(invalidate_metrics_cache, sender=Quality)
+post_save.connect(invalidate_metrics_cache, sender=Impact)
+post_delete.connect(invalidate_metrics_cache, sender=Impact)
@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, connection, transaction
+from django.contrib.postgres.fields import ArrayField
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from .common import EditTracking, Event, Node
+from metrics.cache import invalidate_metrics_cache
+from collections import Counter
 
 
 class Question(EditTracking):
@@ -68,6 +72,37 @@ class ResponseSet(EditTracking):
     question_set = models.ForeignKey(
         QuestionSet, on_delete=models.PROTECT
     )
+    # Id of the last transaction that wrote the row, set by a trigger
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_xid", "id"], name="metrics_responseset_sync_idx"),
+        ]
+
+    @staticmethod
+    def bulk_create_with_responses(entries, batch_size=None):
+        """Insert `(ResponseSet, [Answer])` pairs using batched INSERTs.
+
+        `bulk_create` does not send `post_save`, so the answer counts and the
+        metrics cache are updated here instead.
+        """
+        entries = list(entries)
+        response_sets = ResponseSet.objects.bulk_create(
+            [response_set for (response_set, _answers) in entries],
+            batch_size=batch_size,
+        )
+        responses = Response.objects.bulk_create(
+            [
+                Response(response_set=response_set, answer=answer)
+                for (response_set, answers) in entries
+                for answer in answers
+            ],
+            batch_size=batch_size,
+        )
+        AnswerCount.add_responses(responses)
+        invalidate_metrics_cache()
+        return response_sets
 
 
 class Response(models.Model):
@@ -75,3 +110,164 @@ class Response(models.Model):
         ResponseSet, on_delete=models.CASCADE, related_name="entries"
     )
     answer = models.ForeignKey(Answer, on_delete=models.PROTECT)
+
+
+class AnswerCount(models.Model):
+    event = models.ForeignKey(
+        Event, on_delete=models.CASCADE, related_name="answer_counts"
+    )
+    answer = models.ForeignKey(
+        Answer, on_delete=models.CASCADE, related_name="counts"
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    # Copies of the filterable event columns, so that the metrics can be
+    # filtered without joining the events. Written together with the counts
+    # and kept in sync with the events by `update_event_columns`.
+    event_type = models.TextField(blank=True)
+    event_funding = ArrayField(models.TextField(), default=list)
+    event_target_audience = ArrayField(models.TextField(), default=list)
+    event_additional_platforms = ArrayField(models.TextField(), default=list)
+    event_date_start = models.DateField(null=True)
+    event_date_end = models.DateField(null=True)
+    event_node = ArrayField(models.BigIntegerField(), default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["answer", "event"],
+                name="answer count is unique per event",
+            )
+        ]
+
+    @staticmethod
+    def _event_columns():
+        """The copied columns and their values, for an event aliased `e`."""
+        node_table = Event.node.through._meta.db_table
+        return {
+            "event_type": "e.type",
+            "event_funding": "e.funding",
+            "event_target_audience": "e.target_audience",
+            "event_additional_platforms": "e.additional_platforms",
+            "event_date_start": "e.date_start",
+            "event_date_end": "e.date_end",
+            "event_node": (
+                f"ARRAY(SELECT n.node_id FROM {node_table} n "
+                "WHERE n.event_id = e.id ORDER BY n.node_id)"
+            ),
+        }
+
+    @staticmethod
+    def _insert_sql(counts_sql, conflict):
+        """Insert the `(event_id, answer_id, count)` rows of `counts_sql`
+        together with the copied event columns."""
+        table = AnswerCount._meta.db_table
+        event_table = Event._meta.db_table
+        columns = AnswerCount._event_columns()
+        return (
+            f"INSERT INTO {table} "
+            f"(event_id, answer_id, count, {', '.join(columns)}) "
+            f"SELECT c.event_id, c.answer_id, c.count, {', '.join(columns.values())} "
+            f"FROM ({counts_sql}) AS c(event_id, answer_id, count), {event_table} e "
+            "WHERE e.id = c.event_id "
+            + conflict
+        )
+
+    @staticmethod
+    def add_responses(responses):
+        counts = Counter(
+            (response.response_set.event_id, response.answer_id)
+            for response in responses
+        )
+        if not counts:
+            return
+
+        table = AnswerCount._meta.db_table
+        values = ", ".join(["(%s, %s, %s)"] * len(counts))
+        params = [
+            value
+            for (event_id, answer_id), count in counts.items()
+            for value in (event_id, answer_id, count)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                AnswerCount._insert_sql(
+                    f"VALUES {values}",
+                    "ON CONFLICT (answer_id, event_id) "
+                    f"DO UPDATE SET count = {table}.count + EXCLUDED.count"
+                ),
+                params
+            )
+
+    @staticmethod
+    def refresh(events=None):
+        event_ids = (
+            None
+            if events is None
+            else [getattr(event, "pk", event) for event in events]
+        )
+        table = AnswerCount._meta.db_table
+        response_table = Response._meta.db_table
+        response_set_table = ResponseSet._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            if event_ids is None:
+                cursor.execute(f"DELETE FROM {table}")
+            else:
+                AnswerCount.objects.filter(event__in=event_ids).delete()
+            cursor.execute(
+                AnswerCount._insert_sql(
+                    "SELECT rs.event_id, r.answer_id, COUNT(*) "
+                    f"FROM {response_table} r "
+                    f"JOIN {response_set_table} rs ON rs.id = r.response_set_id "
+                    + ("" if event_ids is None else "WHERE rs.event_id = ANY(%s) ")
+                    + "GROUP BY rs.event_id, r.answer_id",
+                    ""
+                ),
+                [] if event_ids is None else [event_ids]
+            )
+        invalidate_metrics_cache()
+
+    @staticmethod
+    def update_event_columns(events=None):
+        """Copy the current event columns to the counts of `events`."""
+        event_ids = (
+            None
+            if events is None
+            else [getattr(event, "pk", event) for event in events]
+        )
+        table = AnswerCount._meta.db_table
+        event_table = Event._meta.db_table
+        assignments = ", ".join(
+            f"{column} = {value}"
+            for column, value in AnswerCount._event_columns().items()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} "
+                f"FROM {event_table} e WHERE e.id = {table}.event_id"
+                + ("" if event_ids is None else " AND e.id = ANY(%s)"),
+                [] if event_ids is None else [event_ids]
+            )
+
+
+def update_event_columns_on_save(sender, instance, created, **kwargs):
+    if not created:
+        AnswerCount.update_event_columns([instance.pk])
+
+
+def update_event_columns_on_nodes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        AnswerCount.update_event_columns([instance.pk])
+    elif action == "post_clear":
+        # The events of a cleared node are not known any more
+        AnswerCount.update_event_columns()
+    elif pk_set:
+        AnswerCount.update_event_columns(pk_set)
+
+
+post_save.connect(invalidate_metrics_cache, sender=ResponseSet)
+post_delete.connect(invalidate_metrics_cache, sender=ResponseSet)
+post_save.connect(update_event_columns_on_save, sender=Event)
+m2m_changed.connect(update_event_columns_on_nodes_changed, sender=Event.node.through)
@@ -0,0 +1,115 @@
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+import base64
+import json
+
+
+def encode_cursor(values):
+    data = json.dumps(values, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != length:
+        raise ValidationError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def get_keyset_query(ordering, values, reverse=False):
+    """Rows after `values` in `ordering`, or before them when `reverse`.
+
+    Equal to `(a, b) > (x, y)` for any mix of ascending and descending
+    columns: `a > x OR (a = x AND b > y)`.
+    """
+    query = None
+    for field, value in reversed(list(zip(ordering, values))):
+        descending = field.startswith("-")
+        name = field.lstrip("-")
+        after = Q(**{f"{name}__{'lt' if descending != reverse else 'gt'}": value})
+        query = after if query is None else after | (Q(**{name: value}) & query)
+    return query
+
+
+def estimate_count(model):
+    """The row count of the table from the planner statistics, or None if
+    the table has not been analyzed yet."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] > 0 else None
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Page a queryset by the values of its ordering instead of an offset.
+
+    Deep pages cost the same as the first one, as long as an index matches
+    `ordering`. The ordering columns must not be null and must end with a
+    unique column. Pages are found by the cursors of the page before or
+    after them instead of a page number, so there is no page count.
+    """
+    def __init__(self, queryset, per_page, ordering):
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+
+    def get_key(self, entry):
+        names = [field.lstrip("-") for field in self.ordering]
+        if isinstance(entry, dict):
+            return [entry[name] for name in names]
+        return [getattr(entry, name) for name in names]
+
+    def get_page(self, after=None, before=None):
+        """Get the page after the `after` cursor, or before the `before`
+        cursor. Raises `ValidationError` for an invalid cursor."""
+        queryset = self.queryset
+        if before:
+            values = decode_cursor(before, len(self.ordering))
+            queryset = queryset.filter(get_keyset_query(self.ordering, values, reverse=True))
+            queryset = queryset.reverse()
+        elif after:
+            values = decode_cursor(after, len(self.ordering))
+            queryset = queryset.filter(get_keyset_query(self.ordering, values))
+        entries = list(queryset[:self.per_page + 1])
+        more = len(entries) > self.per_page
+        entries = entries[:self.per_page]
+        if before:
+            entries.reverse()
+            (has_next, has_previous) = (True, more)
+        else:
+            (has_next, has_previous) = (more, bool(after))
+        return KeysetPage(
+            entries,
+            encode_cursor(self.get_key(entries[-1])) if entries and has_next else None,
+            encode_cursor(self.get_key(entries[0])) if entries and has_previous else None,
+        )
@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from metrics.http import JsonFileCache, create_session
+import functools
+import io
+import json
+import re
+import requests
+import zipfile
+
+
+ROR_ID_PATTERN = re.compile("^https://ror.org/([a-zA-Z0-9]+)$")
+
+
+def get_ror_suffix(ror_id):
+    match = ROR_ID_PATTERN.match(ror_id or "")
+    if match is None:
+        raise ValidationError(f"Not a valid ror id: {ror_id}")
+    return match[1]
+
+
+def parse_organisation(data):
+    """Get the name and country from a ROR record, schema v1 or v2."""
+    if "names" in data:
+        names = data["names"]
+        name = next(
+            (entry["value"] for entry in names if "ror_display" in entry.get("types", [])),
+            names[0]["value"] if names else "",
+        )
+        locations = data.get("locations") or [{}]
+        country = locations[0].get("geonames_details", {}).get("country_name", "")
+        return (name, country)
+    return (
+        data["name"],
+        (data.get("country") or {}).get("country_name", "")
+    )
+
+
+def parse_aliases(data):
+    """Get the other names of a ROR record, schema v1 or v2."""
+    if "names" in data:
+        (name, _country) = parse_organisation(data)
+        names = [entry["value"] for entry in data["names"]]
+    else:
+        name = data["name"]
+        names = [
+            *data.get("aliases", []),
+            *data.get("acronyms", []),
+            *[label["label"] for label in data.get("labels", [])],
+        ]
+    return [alias for alias in dict.fromkeys(names) if alias and alias != name]
+
+
+def iter_json_array(file, chunk_size=1024 * 1024):
+    """Yield the items of a top level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                (item, end) = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            if end == len(buffer) and chunk:
+                # A number may continue in the next chunk
+                break
+            position = end
+            yield item
+        if not chunk:
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+
+
+def iter_dump_records(path):
+    """Yield the records of a ROR data dump, a .json file or the .zip release.
+
+    Zip releases contain the dump in both schema versions, the v2 file is
+    preferred.
+    """
+    if not zipfile.is_zipfile(path):
+        with open(path, encoding="utf-8") as f:
+            yield from iter_json_array(f)
+        return
+
+    with zipfile.ZipFile(path) as archive:
+        members = sorted(
+            (name for name in archive.namelist() if name.endswith(".json")),
+            key=lambda name: "schema_v2" not in name,
+        )
+        if not members:
+            raise ValueError(f"No JSON file in {path}")
+        with archive.open(members[0]) as f:
+            yield from iter_json_array(io.TextIOWrapper(f, encoding="utf-8"))
+
+
+class RorClient:
+    """Fetch organisations from the ROR API.
+
+    Requests share a pooled session with timeouts and retries, batches are
+    fetched concurrently and responses are cached on disk for `cache_ttl`
+    seconds.
+    """
+    def __init__(
+        self,
+        api_url=None,
+        cache_dir=None,
+        cache_ttl=None,
+        timeout=None,
+        max_workers=None,
+        retries=None,
+    ):
+        self.api_url = (api_url or settings.ROR_API_URL).rstrip("/")
+        self.cache_dir = cache_dir if cache_dir is not None else settings.ROR_CACHE_DIR
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.ROR_CACHE_TTL
+        self.timeout = timeout or settings.ROR_TIMEOUT
+        self.max_workers = max_workers or settings.ROR_MAX_WORKERS
+        retries = retries if retries is not None else settings.ROR_RETRIES
+
+        self.session = create_session(self.max_workers, retries)
+        self.cache = JsonFileCache(self.cache_dir, self.cache_ttl)
+
+    def get_organisation(self, ror_id):
+        suffix = get_ror_suffix(ror_id)
+        data = self.cache.get(suffix)
+        if data is not None:
+            return data
+
+        url = f"{self.api_url}/{suffix}"
+        try:
+            response = self.session.get(url, timeout=self.timeout, allow_redirects=True)
+        except requests.RequestException as e:
+            raise ValidationError(f"Could not fetch ROR data for: {ror_id}, {url}, {e}")
+        if response.status_code != 200:
+            raise ValidationError(
+                f"Could not fetch ROR data for: {ror_id}, {url}, {response.status_code}"
+            )
+        data = response.json()
+        self.cache.set(suffix, data)
+        return data
+
+    def get_organisations(self, ror_ids):
+        """Fetch several organisations concurrently.
+
+        Returns a dict with the ROR record, or the `ValidationError` raised
+        while fetching it, for every id.
+        """
+        def _get(ror_id):
+            try:
+                return self.get_organisation(ror_id)
+            except ValidationError as e:
+                return e
+
+        ror_ids = list(dict.fromkeys(ror_ids))
+        if len(ror_ids) <= 1:
+            return {ror_id: _get(ror_id) for ror_id in ror_ids}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(ror_ids))) as executor:
+            return dict(zip(ror_ids, executor.map(_get, ror_ids)))
+
+
+@functools.cache
+def get_ror_client():
+    return RorClient()
@@ -0,0 +1,405 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+from metrics.import_utils import get_metrics_fields
+from metrics.models import Demographic, Event, Impact, Quality, Response
+from decimal import Decimal
+from urllib.parse import quote
+import datetime
+import json
+import os
+
+
+PARTITIONS = ["year", "node"]
+STATE_FILE = "_state.json"
+
+INTEGER_FIELDS = {
+    "AutoField",
+    "BigAutoField",
+    "BigIntegerField",
+    "ForeignKey",
+    "IntegerField",
+    "OneToOneField",
+    "PositiveIntegerField",
+    "PositiveSmallIntegerField",
+    "SmallIntegerField",
+}
+
+
+def get_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "Snapshots are written with pyarrow, install it with `pip install pyarrow`"
+        ) from e
+    return pyarrow
+
+
+def get_arrow_type(pa, field):
+    if isinstance(field, ArrayField):
+        return pa.list_(get_arrow_type(pa, field.base_field))
+    internal_type = field.get_internal_type()
+    if internal_type in INTEGER_FIELDS:
+        return pa.int64()
+    return {
+        "BooleanField": pa.bool_(),
+        "DateField": pa.date32(),
+        "DateTimeField": pa.timestamp("us", tz="UTC"),
+        "DecimalField": pa.float64(),
+    }.get(internal_type, pa.string())
+
+
+def resolve_field(model, lookup):
+    *relations, name = lookup.split("__")
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+class Dataset:
+    """A denormalised table written as Parquet files partitioned by the
+    year and main node of the event.
+
+    `columns` are `(column, lookup)` pairs, lookups that are not fields are
+    annotations of the queryset, typed by `annotation_types`. Rows with a
+    `modified` lookup newer than the last export are appended on each run,
+    and rows that copy columns of their event when `event_modified` is.
+    """
+    def __init__(
+        self,
+        name,
+        get_queryset,
+        columns,
+        annotation_types,
+        modified="modified",
+        event_modified=None,
+    ):
+        self.name = name
+        self.get_queryset = get_queryset
+        self.columns = columns
+        self.annotation_types = annotation_types
+        self.modified = modified
+        self.event_modified = event_modified
+
+    def get_schema(self, pa):
+        model = self.get_queryset().model
+        return pa.schema([
+            (
+                column,
+                self.annotation_types[lookup](pa)
+                if lookup in self.annotation_types
+                else get_arrow_type(pa, resolve_field(model, lookup))
+            )
+            for (column, lookup) in self.columns
+            if column not in PARTITIONS
+        ] + [("exported", pa.timestamp("us", tz="UTC"))])
+
+    def iter_rows(self, since, chunk_size):
+        """Yield the rows ordered by partition, as `(partition, changed,
+        row)`, where `changed` is the newest of the modified times that
+        selected the row."""
+        queryset = self.get_queryset()
+        changed_lookups = [self.modified]
+        if self.event_modified is not None:
+            changed_lookups.append(self.event_modified)
+        if since is not None:
+            changed = Q()
+            for lookup in changed_lookups:
+                changed |= Q(**{f"{lookup}__gt": since})
+            queryset = queryset.filter(changed)
+        lookups = [lookup for (_column, lookup) in self.columns]
+        columns = [column for (column, _lookup) in self.columns]
+        partition_indexes = [columns.index(column) for column in PARTITIONS]
+        for values in (
+            queryset
+            .order_by(*[lookups[index] for index in partition_indexes], "pk")
+            .values_list(*lookups, *changed_lookups)
+            .iterator(chunk_size=chunk_size)
+        ):
+            yield (
+                tuple(values[index] for index in partition_indexes),
+                max(values[len(lookups):]),
+                dict(zip(columns, values)),
+            )
+
+
+def _event_queryset():
+    return Event.objects.annotate(
+        year=ExtractYear("date_start"),
+        nodes=ArrayAgg(
+            "node__name",
+            distinct=True,
+            filter=Q(node__isnull=False),
+            default=[],
+        ),
+        institutions=ArrayAgg(
+            "organising_institution__name",
+            distinct=True,
+            filter=Q(organising_institution__isnull=False),
+            default=[],
+        ),
+    )
+
+
+def _event_columns():
+    return [
+        ("year", "year"),
+        ("node", "node_main__name"),
+        ("id", "id"),
+        ("code", "code"),
+        ("title", "title"),
+        ("nodes", "nodes"),
+        ("date_start", "date_start"),
+        ("date_end", "date_end"),
+        ("duration", "duration"),
+        ("type", "type"),
+        ("institutions", "institutions"),
+        ("location_city", "location_city"),
+        ("location_country", "location_country"),
+        *[
+            (name, name)
+            for name in [
+                "funding",
+                "target_audience",
+                "additional_platforms",
+                "communities",
+                "number_participants",
+                "number_trainers",
+                "url",
+                "status",
+                "locked",
+                "user",
+                "created",
+                "modified",
+            ]
+        ],
+    ]
+
+
+def _response_queryset():
+    return Response.objects.annotate(
+        year=ExtractYear("response_set__event__date_start"),
+    )
+
+
+def _response_columns():
+    return [
+        ("year", "year"),
+        ("node", "response_set__event__node_main__name"),
+        ("id", "id"),
+        ("response_set", "response_set"),
+        ("event", "response_set__event"),
+        ("event_type", "response_set__event__type"),
+        ("question_set", "response_set__question_set__slug"),
+        ("question", "answer__question__slug"),
+        ("question_text", "answer__question__text"),
+        ("answer", "answer__slug"),
+        ("answer_text", "answer__text"),
+        ("user", "response_set__user"),
+        ("created", "response_set__created"),
+        ("modified", "response_set__modified"),
+    ]
+
+
+def _legacy_dataset(name, model):
+    return Dataset(
+        name,
+        lambda: model.objects.annotate(year=ExtractYear("event__date_start")),
+        [
+            ("year", "year"),
+            ("node", "event__node_main__name"),
+            ("id", "id"),
+            ("event", "event"),
+            ("event_type", "event__type"),
+            ("user", "user"),
+            ("created", "created"),
+            ("modified", "modified"),
+            *[(field.name, field.name) for field in get_metrics_fields(model)],
+        ],
+        {"year": lambda pa: pa.int64()},
+        event_modified="event__modified",
+    )
+
+
+def get_datasets():
+    return {
+        dataset.name: dataset
+        for dataset in [
+            Dataset(
+                "events",
+                _event_queryset,
+                _event_columns(),
+                {
+                    "year": lambda pa: pa.int64(),
+                    "nodes": lambda pa: pa.list_(pa.string()),
+                    "institutions": lambda pa: pa.list_(pa.string()),
+                },
+            ),
+            Dataset(
+                "responses",
+                _response_queryset,
+                _response_columns(),
+                {"year": lambda pa: pa.int64()},
+                modified="response_set__modified",
+                event_modified="response_set__event__modified",
+            ),
+            _legacy_dataset("quality", Quality),
+            _legacy_dataset("impact", Impact),
+            _legacy_dataset("demographic", Demographic),
+        ]
+    }
+
+
+def read_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def get_partition_path(directory, dataset, partition):
+    return os.path.join(
+        directory,
+        dataset.name,
+        *[
+            f"{name}={quote(str(value), safe='')}"
+            for (name, value) in zip(PARTITIONS, partition)
+        ],
+    )
+
+
+def _to_arrow_value(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def write_dataset(dataset, directory, since=None, row_group_size=None, exported=None):
+    """Write the rows modified after `since` to new files, one per partition.
+
+    Rows are streamed in partition order, so a single writer is open at a
+    time and at most `row_group_size` rows are held in memory. Every row
+    gets the `exported` time of the run. Returns the number of rows, the
+    newest modified time of the rows or their events and the written
+    files.
+    """
+    pa = get_pyarrow()
+    row_group_size = row_group_size or settings.SNAPSHOT_ROW_GROUP_SIZE
+    exported = exported or timezone.now()
+    run_id = exported.strftime("%Y%m%dT%H%M%S%f")
+    schema = dataset.get_schema(pa)
+    file_name = f"part-{run_id}.parquet"
+
+    files = []
+    writer = None
+    current = None
+    buffer = []
+    count = 0
+    latest = since
+
+    def flush():
+        if buffer:
+            writer.write_table(pa.Table.from_pylist(buffer, schema=schema))
+            buffer.clear()
+
+    try:
+        for (partition, changed, row) in dataset.iter_rows(since, row_group_size):
+            if partition != current:
+                flush()
+                if writer is not None:
+                    writer.close()
+                path = get_partition_path(directory, dataset, partition)
+                os.makedirs(path, exist_ok=True)
+                files.append(os.path.join(path, file_name))
+                writer = pa.parquet.ParquetWriter(f"{files[-1]}.tmp", schema)
+                current = partition
+            latest = changed if latest is None else max(latest, changed)
+            for name in PARTITIONS:
+                del row[name]
+            row["exported"] = exported
+            buffer.append({
+                name: _to_arrow_value(value)
+                for name, value in row.items()
+            })
+            count += 1
+            if len(buffer) >= row_group_size:
+                flush()
+        flush()
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        for path in files:
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+        raise
+    if writer is not None:
+        writer.close()
+    for path in files:
+        os.replace(f"{path}.tmp", path)
+    return (count, latest, files)
+
+
+def export_snapshots(names=None, directory=None, full=False, row_group_size=None, report=print):
+    """Append the changes since the last export to the snapshots.
+
+    The state file keeps a modified time per dataset, rows modified after
+    it are exported by the next run. `modified` is set when a row is saved,
+    not when it is committed, so the time is held `SNAPSHOT_SETTLE_SECONDS`
+    back: rows of transactions that ran for less than that are exported
+    even if they commit after a run. Rows of the last settle seconds are
+    exported again by the next run, readers take the row with the newest
+    `exported` time per id. `full` rewrites the datasets from scratch.
+    """
+    directory = str(directory or settings.SNAPSHOT_DIR)
+    os.makedirs(directory, exist_ok=True)
+    datasets = get_datasets()
+    state = read_state(directory)
+    exported = timezone.now()
+    settled = exported - datetime.timedelta(seconds=settings.SNAPSHOT_SETTLE_SECONDS)
+    for name in names or datasets:
+        dataset = datasets[name]
+        since = (
+            None
+            if full or name not in state
+            else datetime.datetime.fromisoformat(state[name]["modified"])
+        )
+        (count, latest, files) = write_dataset(
+            dataset,
+            directory,
+            since,
+            row_group_size,
+            exported,
+        )
+        if full:
+            _remove_other_files(os.path.join(directory, name), set(files))
+        if latest is not None:
+            state[name] = {
+                "modified": min(latest, settled).isoformat(),
+                "exported": exported.isoformat(),
+            }
+        elif full:
+            state.pop(name, None)
+        write_state(directory, state)
+        report(f"{name}: {count} rows in {len(files)} files")
+    return state
+
+
+def _remove_other_files(path, keep):
+    for (root, _dirs, file_names) in os.walk(path, topdown=False):
+        for file_name in file_names:
+            if os.path.join(root, file_name) not in keep:
+                os.remove(os.path.join(root, file_name))
+        if root != path and not os.listdir(root):
+            os.rmdir(root)
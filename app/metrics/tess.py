@@ -0,0 +1,245 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from metrics.http import JsonFileCache, create_session
+from metrics.models import Event, country_mapping
+import datetime
+import functools
+import math
+import re
+import requests
+
+
+TESS_ID_PATTERN = re.compile("^[a-zA-Z0-9_-]+$")
+
+
+def convert_tess_metadata(tess_metadata):
+    """Map a TeSS JSON:API event document to Event fields."""
+    # Take just the date part from the full date/time string
+    def convert_date(date):
+        if date:
+            return date[:10]
+
+    attributes = tess_metadata["data"]["attributes"]
+    return {
+        "title": attributes["title"],
+        "url": attributes["url"],
+        "date_start": convert_date(attributes["start"]),
+        "date_end": convert_date(attributes["end"]),
+        "location_city": attributes["city"],
+        "location_country": attributes["country"],
+        "duration": attributes["duration"]
+    }
+
+
+class TessClient:
+    """Fetch event documents from TeSS.
+
+    Requests share a pooled session with timeouts and retries. Documents
+    are cached on disk for `cache_ttl` seconds and revalidated with the
+    ETag and Last-Modified headers once they are stale.
+    """
+    def __init__(
+        self,
+        base_url=None,
+        cache_dir=None,
+        cache_ttl=None,
+        timeout=None,
+        max_workers=None,
+        retries=None,
+    ):
+        self.base_url = (base_url or settings.TESS_URL).rstrip("/")
+        self.cache_dir = cache_dir if cache_dir is not None else settings.TESS_CACHE_DIR
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.TESS_CACHE_TTL
+        self.timeout = timeout or settings.TESS_TIMEOUT
+        self.max_workers = max_workers or settings.TESS_MAX_WORKERS
+        retries = retries if retries is not None else settings.TESS_RETRIES
+        self.page_size = settings.TESS_PAGE_SIZE
+
+        self.session = create_session(self.max_workers, retries)
+        self.cache = JsonFileCache(self.cache_dir, self.cache_ttl)
+
+    def get_event(self, tess_id):
+        """Get the document of a TeSS event, None if it can not be fetched."""
+        tess_id = str(tess_id)
+        if not TESS_ID_PATTERN.match(tess_id):
+            return None
+        key = f"event-{tess_id}"
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry["document"]
+
+        entry = self.cache.get(key, allow_stale=True)
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = self.session.get(
+                f"{self.base_url}/events/{tess_id}.json_api",
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=True,
+            )
+        except requests.RequestException:
+            return entry["document"] if entry is not None else None
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(key)
+            return entry["document"]
+        if response.status_code != 200:
+            return None
+        document = response.json()
+        self.cache.set(key, {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "document": document,
+        })
+        return document
+
+    def get_events(self, tess_ids):
+        """Fetch several events concurrently.
+
+        Returns a dict with the document, or None, for every id.
+        """
+        tess_ids = list(dict.fromkeys(tess_ids))
+        if len(tess_ids) <= 1:
+            return {tess_id: self.get_event(tess_id) for tess_id in tess_ids}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tess_ids))) as executor:
+            return dict(zip(tess_ids, executor.map(self.get_event, tess_ids)))
+
+    def get_converted_events(self, tess_ids):
+        """Fetch several events concurrently and convert them to Event fields."""
+        return {
+            tess_id: convert_tess_metadata(document) if document is not None else None
+            for (tess_id, document) in self.get_events(tess_ids).items()
+        }
+
+    def get_search_page(self, params, page_number):
+        url = f"{self.base_url}/events.json_api"
+        try:
+            response = self.session.get(
+                url,
+                params={
+                    **params,
+                    "page_number": page_number,
+                    "page_size": self.page_size,
+                },
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise ValidationError(f"Could not search TeSS: {url}, {e}")
+        if response.status_code != 200:
+            raise ValidationError(f"Could not search TeSS: {url}, {response.status_code}")
+        return response.json()
+
+    def search_events(self, query="", filters=None):
+        """Get the documents of all events that match a TeSS search.
+
+        The first page gives the number of results, the remaining pages are
+        fetched concurrently. Expired events are included.
+        """
+        params = {"q": query, "include_expired": "true", **(filters or {})}
+        first_page = self.get_search_page(params, 1)
+        pages = [first_page]
+        count = first_page.get("meta", {}).get("results-count")
+        if count is not None:
+            page_numbers = range(2, math.ceil(count / self.page_size) + 1)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pages.extend(executor.map(
+                    lambda page_number: self.get_search_page(params, page_number),
+                    page_numbers,
+                ))
+        else:
+            page_number = 1
+            while pages[-1].get("links", {}).get("next") and pages[-1]["data"]:
+                page_number += 1
+                pages.append(self.get_search_page(params, page_number))
+        return [
+            {"data": resource}
+            for page in pages
+            for resource in page["data"]
+        ]
+
+    def get_event_url(self, tess_metadata):
+        return self.base_url + tess_metadata["data"]["links"]["self"]
+
+
+def get_tess_event_type(tess_metadata):
+    presence = tess_metadata["data"]["attributes"].get("presence")
+    return {
+        "online": "Training - e-learning",
+        "hybrid": "Training - blended",
+    }.get(presence, "Training - face to face")
+
+
+def get_tess_duration(converted):
+    try:
+        return Decimal(str(converted["duration"]))
+    except (InvalidOperation, KeyError):
+        date_start = datetime.date.fromisoformat(converted["date_start"])
+        date_end = datetime.date.fromisoformat(converted["date_end"] or converted["date_start"])
+        return Decimal((date_end - date_start).days + 1)
+
+
+def create_tess_events(documents, user, node_main, batch_size=None):
+    """Create an incomplete event for every TeSS document.
+
+    Documents without a url or start date, and events whose url is already
+    in the database, are skipped. Returns the created events and a list of
+    `(document, reason)` for the skipped documents.
+    """
+    events = {}
+    skipped = []
+    for document in documents:
+        converted = convert_tess_metadata(document)
+        if not converted["url"] or not converted["date_start"]:
+            skipped.append((document, "No url or start date"))
+        elif converted["url"] in events:
+            skipped.append((document, "Duplicate url"))
+        else:
+            events[converted["url"]] = (document, converted)
+
+    existing = set(
+        Event.objects
+        .filter(url__in=events.keys())
+        .values_list("url", flat=True)
+    )
+    entries = []
+    for (url, (document, converted)) in events.items():
+        if url in existing:
+            skipped.append((document, "Already imported"))
+            continue
+        event = Event(
+            user=user,
+            node_main=node_main,
+            title=converted["title"][:1024],
+            date_start=converted["date_start"],
+            date_end=converted["date_end"] or converted["date_start"],
+            duration=get_tess_duration(converted),
+            type=get_tess_event_type(document),
+            location_city=(converted["location_city"] or "")[:128],
+            location_country=(
+                converted["location_country"]
+                if converted["location_country"] in country_mapping
+                else ""
+            ),
+            funding=[],
+            target_audience=[],
+            additional_platforms=[],
+            communities=[],
+            number_participants=0,
+            number_trainers=0,
+            url=url,
+            status="Incomplete",
+        )
+        entries.append((event, [node_main], []))
+    return (Event.bulk_create_with_relations(entries, batch_size), skipped)
+
+
+@functools.cache
+def get_tess_client():
+    return TessClient()
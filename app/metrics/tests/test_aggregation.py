@@ -0,0 +1,231 @@
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth.models import User
+from metrics.aggregation import count_field_values
+from metrics.models import Event, Node, Quality, Impact, Demographic
+from metrics.views.common import get_event_filter_query
+from metrics.views.metrics import (
+    _calculate_metrics,
+    get_event_info,
+    get_legacy_metrics_info,
+)
+from .utils import create_event
+import contextlib
+import datetime
+import io
+import itertools
+
+
+LEGACY_IGNORED_FIELDS = {
+    "id",
+    "event",
+    "user",
+    "event_id",
+    "user_id",
+    "created",
+    "modified"
+}
+
+
+EVENT_COLUMNS = [
+    "type",
+    "funding",
+    "target_audience",
+    "additional_platforms",
+    "communities",
+]
+
+
+class TestEventAggregation(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user")
+        cls.node = Node.objects.create(name="ELIXIR-A", country="A")
+        cls.other_node = Node.objects.create(name="ELIXIR-B", country="B")
+        variants = itertools.product(
+            [
+                "Training - face to face",
+                "Hackathon",
+            ],
+            [
+                ["ELIXIR Node"],
+                ["ELIXIR Hub", "ELIXIR Node"],
+            ],
+            [
+                ["Industry"],
+                ["Industry", "Healthcare"],
+            ],
+            [
+                ["NA"],
+                ["Compute", "Data", "Tools"],
+            ],
+        )
+        for index, (event_type, funding, audience, platforms) in enumerate(variants):
+            event = create_event(
+                cls.user,
+                cls.node,
+                title=f"Event {index}",
+                date_start=datetime.date(2024, 1, 1) + datetime.timedelta(days=index * 10),
+                date_end=datetime.date(2024, 1, 2) + datetime.timedelta(days=index * 10),
+                type=event_type,
+                funding=funding,
+                target_audience=audience,
+                additional_platforms=platforms,
+                communities=["NA"] if index % 3 else ["Galaxy", "Proteomics"],
+            )
+            event.node.set([cls.node] if index % 2 else [cls.other_node])
+
+    def _assert_parity(self, query):
+        entries = list(query.values())
+        expected = {
+            column: _calculate_metrics(entries, column)
+            for column in EVENT_COLUMNS
+        }
+        self.assertEqual(count_field_values(query, EVENT_COLUMNS), expected)
+
+    def test_parity_unfiltered(self):
+        self._assert_parity(Event.objects.all())
+
+    def test_parity_filtered(self):
+        filters = [
+            {"event_type": "Hackathon"},
+            {"event_funding": ["ELIXIR Hub"]},
+            {"event_target_audience": ["Healthcare"], "event_funding": ["ELIXIR Node"]},
+            {"event_additional_platforms": ["Compute", "Data"]},
+            {"event_node": self.node},
+            {"date_from": "2024-02-01", "date_to": "2024-04-01"},
+            {"event_type": "Training - blended"},
+        ]
+        for kwargs in filters:
+            with self.subTest(**{key: str(value) for key, value in kwargs.items()}):
+                self._assert_parity(Event.objects.filter(get_event_filter_query(**kwargs)))
+
+    def test_event_info_single_query(self):
+        with self.assertNumQueries(1):
+            result = get_event_info(event_funding=["ELIXIR Hub"])
+
+        funding = next(entry for entry in result if entry["id"] == "funding")
+        counts = {option["id"]: option["count"] for option in funding["options"]}
+        self.assertEqual(counts["ELIXIR Hub"], 8)
+        self.assertEqual(counts["ELIXIR Node"], 8)
+        self.assertEqual(counts["EOSC Life"], 0)
+        self.assertEqual(funding["options"][-1]["count"], 0)
+
+    def test_filters_use_indexes(self):
+        events = Event.objects.count()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            call_command("benchmark_event_filters", events=200, no_seqscan=True)
+        lines = output.getvalue().splitlines()
+        for (label, index) in [
+            ("event metrics, type", "metrics_event_type_idx"),
+            ("event metrics, funding", "metrics_event_funding_gin_idx"),
+            ("event metrics, target audience", "metrics_event_audience_gin_idx"),
+            ("event metrics, platforms", "metrics_event_platform_gin_idx"),
+        ]:
+            with self.subTest(label):
+                line = next(line for line in lines if line.startswith(f"{label}:"))
+                self.assertIn(index, line)
+        self.assertIn("metrics_event_date", next(
+            line for line in lines if line.startswith("event metrics, date period:")
+        ))
+        self.assertEqual(Event.objects.count(), events)
+
+
+class TestLegacyAggregation(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user")
+        cls.node = Node.objects.create(name="ELIXIR-A", country="A")
+        cls.events = [
+            create_event(
+                cls.user,
+                cls.node,
+                title=f"Event {index}",
+                type=event_type,
+            )
+            for index, event_type in enumerate(["Hackathon", "Training - blended"])
+        ]
+        for index in range(12):
+            event = cls.events[index % 2]
+            Quality.objects.create(
+                user=cls.user,
+                event=event,
+                used_resources_before="" if index % 4 else "Never - unaware of them",
+                used_resources_future=["Yes", "No", "Maybe"][index % 3],
+                recommend_course=["Yes", "Maybe"][index % 2],
+                course_rating="Good (3)",
+                balance=["About right", "Too practical", "Too theoretical"][index % 3],
+                email_contact="No",
+            )
+            Demographic.objects.create(
+                user=cls.user,
+                event=event,
+                employment_country=["Sweden", "Norway", ""][index % 3],
+                heard_from=[["TeSS"], ["Email", "Colleague"], ["Email"]][index % 3],
+                employment_sector="Industry",
+                gender=["Female", "Male", "Other"][index % 3],
+                career_stage="PhD candidate",
+            )
+            Impact.objects.create(
+                user=cls.user,
+                event=event,
+                when_attend_training="Over a year",
+                main_attend_reason="Other",
+                how_often_use_before="",
+                how_often_use_after="Frequently (weekly to daily)",
+                able_to_explain=["Yes", "No"][index % 2],
+                able_use_now="Independently",
+                help_work=[["Other"], ["Other", "It improved my ability to handle data"]][index % 2],
+                attending_led_to=[[], ["Change in career"]][index % 2],
+                people_share_knowledge="1-5",
+                recommend_others="Maybe",
+            )
+
+    def _python_counts(self, query):
+        result = {}
+        for value in query.values():
+            for key, value in value.items():
+                if key not in LEGACY_IGNORED_FIELDS:
+                    result[key] = result.get(key, {})
+                    values = value if isinstance(value, list) else [value]
+                    for v in values:
+                        if v is not None:
+                            result[key][v] = result[key].get(v, 0) + 1
+        return result
+
+    def test_parity(self):
+        for model in [Quality, Impact, Demographic]:
+            for query in [
+                model.objects.all(),
+                model.objects.filter(get_event_filter_query(event_type="Hackathon", prefix="event__")),
+                model.objects.filter(get_event_filter_query(event_type="Training - e-learning", prefix="event__")),
+            ]:
+                with self.subTest(model=model.__name__, query=str(query.query)):
+                    expected = self._python_counts(query)
+                    columns = [
+                        field.name
+                        for field in model._meta.get_fields()
+                        if field.name not in LEGACY_IGNORED_FIELDS
+                    ]
+                    actual = count_field_values(query, columns)
+                    self.assertEqual(
+                        {key: value for key, value in actual.items() if value},
+                        {key: value for key, value in expected.items() if value},
+                    )
+
+    def test_legacy_metrics_info(self):
+        with self.assertNumQueries(1):
+            result = get_legacy_metrics_info(Demographic, event_type="Hackathon")
+
+        heard_from = next(entry for entry in result if entry["id"] == "heard_from")
+        counts = {option["id"]: option["count"] for option in heard_from["options"]}
+        self.assertEqual(counts, {
+            "TeSS": 2,
+            "Host Institute Website": 0,
+            "Email": 4,
+            "Newsletter": 0,
+            "Colleague": 2,
+            "Internet search": 0,
+            "Other": 0,
+        })
@@ -0,0 +1,188 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from metrics.models import (
+    AnswerCount,
+    Node,
+    QuestionSuperSet,
+    Response,
+    ResponseSet,
+)
+from metrics.views.metrics import get_metrics_info
+from metrics.views.upload import get_question_import_context, import_entries
+from .utils import create_event, create_questionset, create_question
+
+
+class TestAnswerCounts(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.node = Node.objects.create(name="ELIXIR-USER", country="A")
+        cls.user = User.objects.create(username="user")
+        cls.events = [
+            create_event(
+                cls.user,
+                cls.node,
+                title=f"Event {index}",
+                type=event_type,
+            )
+            for index, event_type in enumerate(["Hackathon", "Training - blended"])
+        ]
+        cls.questionset = create_questionset(
+            user=cls.user,
+            name="Test set",
+            slug="test-set",
+            questions=[
+                create_question(
+                    text="Choice question",
+                    slug="choice",
+                    user=cls.user,
+                    choices=["A", "B", "C"],
+                ),
+                create_question(
+                    text="Multichoice question",
+                    slug="multichoice",
+                    user=cls.user,
+                    is_multichoice=True,
+                    choices=["MA", "MB", "MC"],
+                ),
+            ]
+        )
+        cls.superset = QuestionSuperSet.objects.create(
+            name="Test superset",
+            slug="test-superset",
+            user=cls.user,
+            use_for_metrics=True,
+            use_for_upload=True,
+        )
+        cls.superset.question_sets.add(cls.questionset)
+
+    def _import(self, rows):
+        (parser, importer, _view_transforms) = get_question_import_context(
+            self.superset,
+            self.user,
+            self.node,
+            None
+        )
+        return import_entries(importer, [parser(row) for row in rows])
+
+    def _assert_counts_match_responses(self):
+        expected = {
+            (value["response_set__event"], value["answer"]): value["count"]
+            for value in (
+                Response.objects
+                .values("response_set__event", "answer")
+                .annotate(count=Count("id"))
+            )
+        }
+        actual = {
+            (value.event_id, value.answer_id): value.count
+            for value in AnswerCount.objects.all()
+        }
+        self.assertEqual(actual, expected)
+
+    def test_import_and_delete(self):
+        self._import([
+            {"event_id": self.events[0].id, "choice": "a", "multichoice": "ma,mb"},
+            {"event_id": self.events[0].id, "choice": "a", "multichoice": "mb"},
+            {"event_id": self.events[1].id, "choice": "c", "multichoice": "mc,ma"},
+        ])
+        self._assert_counts_match_responses()
+
+        result = get_metrics_info(self.superset, event_type="Hackathon")
+        counts = {
+            (question["id"], option["id"]): option["count"]
+            for question in result
+            for option in question["options"]
+        }
+        self.assertEqual(counts[("choice", "a")], 2)
+        self.assertEqual(counts[("choice", "c")], 0)
+        self.assertEqual(counts[("multichoice", "mb")], 2)
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse(
+            "superset-delete-responses",
+            kwargs={"pk": self.events[0].id, "superset_slug": self.superset.slug}
+        ))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ResponseSet.objects.filter(event=self.events[0]).exists())
+        self._assert_counts_match_responses()
+
+    # Count the import queries only, not the ones invalidating the metrics cache
+    @override_settings(CACHES={
+        **settings.CACHES,
+        settings.METRICS_CACHE_ALIAS: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    })
+    def test_import_is_batched(self):
+        (parser, importer, _view_transforms) = get_question_import_context(
+            self.superset,
+            self.user,
+            self.node,
+            None
+        )
+        entries = [
+            parser({"event_id": event.id, "choice": "b", "multichoice": "ma,mc"})
+            for event in self.events * 10
+        ]
+        # Savepoint, response sets, responses, answer counts and release
+        with self.assertNumQueries(5):
+            import_entries(importer, entries)
+        self.assertEqual(ResponseSet.objects.count(), 20)
+        self.assertEqual(Response.objects.count(), 60)
+        self._assert_counts_match_responses()
+
+    def test_refresh(self):
+        self._import([
+            {"event_id": self.events[1].id, "choice": "b", "multichoice": "ma"},
+        ])
+        AnswerCount.objects.all().delete()
+        AnswerCount.refresh()
+        self._assert_counts_match_responses()
+
+    def test_event_columns(self):
+        other_node = Node.objects.create(name="ELIXIR-OTHER", country="B")
+        self.events[0].node.set([self.node])
+        self._import([
+            {"event_id": self.events[0].id, "choice": "a", "multichoice": "ma"},
+            {"event_id": self.events[1].id, "choice": "b", "multichoice": "mb"},
+        ])
+
+        def counts(**filters):
+            result = get_metrics_info(self.superset, **filters)
+            return {
+                option["id"]: option["count"]
+                for question in result
+                for option in question["options"]
+                if option["count"]
+            }
+
+        self.assertEqual(counts(event_node=self.node), {"a": 1, "ma": 1})
+        self.assertEqual(counts(event_funding=["ELIXIR Node"], date_from="2024-01-02"), {
+            "a": 1, "ma": 1, "b": 1, "mb": 1
+        })
+
+        event = self.events[1]
+        event.type = "Hackathon"
+        event.funding = ["ELIXIR Hub"]
+        event.save()
+        event.node.add(other_node)
+        self.assertEqual(counts(event_type="Hackathon", event_funding=["ELIXIR Hub"]), {
+            "b": 1, "mb": 1
+        })
+        self.assertEqual(counts(event_node=other_node), {"b": 1, "mb": 1})
+
+        copied = list(
+            AnswerCount.objects
+            .order_by("event", "answer")
+            .values_list("event_id", "event_type", "event_node")
+        )
+        AnswerCount.refresh()
+        self.assertEqual(
+            list(
+                AnswerCount.objects
+                .order_by("event", "answer")
+                .values_list("event_id", "event_type", "event_node")
+            ),
+            copied
+        )
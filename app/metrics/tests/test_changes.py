@@ -0,0 +1,149 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.urls import reverse
+from metrics.change_feed import get_changes
+from metrics.models import DeletedObject, Node, ResponseSet
+from .utils import create_event, create_questionset, create_question
+import io
+import json
+import os
+import tempfile
+
+
+# Rows of a running transaction are left out of the feed, so the test
+# data has to be committed
+class TestChanges(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+        self.node = Node.objects.create(name="ELIXIR-A", country="A")
+        self.events = [
+            create_event(self.user, self.node, title=f"Event {index}")
+            for index in range(3)
+        ]
+        self.questionset = create_questionset(
+            user=self.user,
+            name="Test set",
+            slug="test-set",
+            questions=[
+                create_question(
+                    text="Choice question",
+                    slug="choice",
+                    user=self.user,
+                    choices=["A", "B"],
+                ),
+            ]
+        )
+        answer = self.questionset.questions.get().answers.order_by("slug").first()
+        [self.response_set] = ResponseSet.bulk_create_with_responses([
+            (
+                ResponseSet(user=self.user, event=self.events[0], question_set=self.questionset),
+                [answer],
+            )
+        ])
+        self.answer = answer
+
+    def get_all(self, cursor=None, limit=None):
+        objects = {}
+        more = True
+        while more:
+            (changes, cursor, more) = get_changes(cursor, limit)
+            for stream, rows in changes.items():
+                objects.setdefault(stream, []).extend(rows)
+        return (objects, cursor)
+
+    def test_paging(self):
+        (changes, cursor) = self.get_all(limit=1)
+        self.assertEqual(
+            [event["id"] for event in changes["events"]],
+            [event.id for event in self.events],
+        )
+        self.assertEqual(
+            [(row["id"], row["answers"]) for row in changes["response_sets"]],
+            [(self.response_set.id, [self.answer.id])],
+        )
+        self.assertEqual(changes["deleted"], [])
+
+        (changes, cursor) = self.get_all(cursor)
+        self.assertEqual(sum(len(rows) for rows in changes.values()), 0)
+
+        event = self.events[1]
+        event.title = "Renamed"
+        event.save()
+        response_set_id = self.response_set.id
+        self.response_set.delete()
+        (changes, cursor) = self.get_all(cursor)
+        self.assertEqual(
+            [(row["id"], row["title"]) for row in changes["events"]],
+            [(event.id, "Renamed")],
+        )
+        self.assertEqual(
+            [(row["model"], row["object_id"]) for row in changes["deleted"]],
+            [("metrics.responseset", response_set_id)],
+        )
+        self.assertEqual(DeletedObject.objects.count(), 1)
+
+    def test_relation_change(self):
+        (changes, cursor) = self.get_all()
+        other = Node.objects.create(name="ELIXIR-B", country="B")
+
+        self.events[1].node.set([other])
+        (changes, cursor) = self.get_all(cursor)
+        self.assertEqual(
+            [(row["id"], row["nodes"]) for row in changes["events"]],
+            [(self.events[1].id, [other.id])],
+        )
+
+        other.event_set.add(self.events[2])
+        (changes, cursor) = self.get_all(cursor)
+        self.assertEqual([row["id"] for row in changes["events"]], [self.events[2].id])
+
+        other.event_set.clear()
+        (changes, cursor) = self.get_all(cursor)
+        self.assertEqual(
+            [(row["id"], row["nodes"]) for row in changes["events"]],
+            [(self.events[1].id, []), (self.events[2].id, [])],
+        )
+
+    def test_api(self):
+        response = self.client.get(reverse("changes-api"))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("changes-api"), {"limit": 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["changes"]["events"]), 2)
+        self.assertTrue(data["more"])
+
+        response = self.client.get(reverse("changes-api"), {"since": data["cursor"]})
+        self.assertEqual(
+            [event["id"] for event in response.json()["changes"]["events"]],
+            [self.events[2].id],
+        )
+
+        response = self.client.get(reverse("changes-api"), {"since": "not a cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sync_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cursor_file = os.path.join(directory, "cursor")
+            output = os.path.join(directory, "changes.jsonl")
+            call_command(
+                "sync_changes",
+                cursor_file=cursor_file,
+                output=output,
+                limit=1,
+                stderr=io.StringIO(),
+            )
+            with open(output) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(
+                sorted((line["stream"], line["object"]["id"]) for line in lines),
+                sorted([
+                    *[("events", event.id) for event in self.events],
+                    ("response_sets", self.response_set.id),
+                ]),
+            )
+            with open(cursor_file) as f:
+                self.assertEqual(get_changes(f.read())[0]["events"], [])
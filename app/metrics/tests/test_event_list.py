@@ -0,0 +1,183 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from metrics.models import (
+    Event,
+    Node,
+    OrganisingInstitution,
+    Quality,
+    QuestionSuperSet,
+    ResponseSet,
+)
+from metrics.views.model_views import get_metrics_counts
+from .utils import create_event, create_questionset, create_question
+
+
+@override_settings(STORAGES={
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+})
+class TestEventList(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.node = Node.objects.create(name="ELIXIR-A", country="A")
+        cls.user = User.objects.create(username="user")
+        cls.user.profile.node = cls.node
+        cls.user.profile.save()
+        cls.institution = OrganisingInstitution.objects.create(
+            name="Institution",
+            country="Sweden",
+        )
+        cls.questionset = create_questionset(
+            user=cls.user,
+            name="Test set",
+            slug="test-set",
+            questions=[
+                create_question(
+                    text="Choice question",
+                    slug="choice",
+                    user=cls.user,
+                    choices=["A", "B"],
+                ),
+            ]
+        )
+        cls.superset = QuestionSuperSet.objects.create(
+            name="Test superset",
+            slug="test-superset",
+            user=cls.user,
+            use_for_metrics=True,
+            use_for_upload=True,
+        )
+        cls.superset.question_sets.add(cls.questionset)
+
+    def _create_events(self, count):
+        for index in range(count):
+            event = create_event(self.user, self.node, title=f"Event {index}")
+            event.node.set([self.node])
+            event.organising_institution.set([self.institution])
+            ResponseSet.objects.create(
+                event=event,
+                question_set=self.questionset,
+                user=self.user,
+            )
+            Quality.objects.create(
+                user=self.user,
+                event=event,
+                used_resources_future="Yes",
+                recommend_course="Yes",
+                course_rating="Good (3)",
+                balance="About right",
+                email_contact="No",
+            )
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("event-list"))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def _assert_constant_queries(self):
+        self.client.force_login(self.user)
+        self._create_events(2)
+        small = self._count_list_queries()
+        self._create_events(10)
+        self.assertEqual(self._count_list_queries(), small)
+
+    def test_list_queries_legacy(self):
+        self._assert_constant_queries()
+
+    @override_settings(FEATURE_FLAGS=["use_new_model_upload"])
+    def test_list_queries_new_model(self):
+        self._assert_constant_queries()
+
+    @override_settings(FEATURE_FLAGS=["use_new_model_upload"])
+    def test_counts(self):
+        self._create_events(1)
+        event = Event.objects.get()
+        self.assertEqual(
+            get_metrics_counts(event, self.user),
+            [("Test superset", 1)],
+        )
+        with self.settings(FEATURE_FLAGS=[]):
+            self.assertEqual(
+                get_metrics_counts(event, self.user),
+                [
+                    ("Quality metrics", 1),
+                    ("Impact metrics", 0),
+                    ("Demographic metrics", 0),
+                ],
+            )
+
+    def test_keyset_pages(self):
+        self.client.force_login(self.user)
+        self._create_events(12)
+        ids = list(Event.objects.order_by("-id").values_list("id", flat=True))
+
+        response = self.client.get(reverse("event-list"), {"page_size": 10})
+        page = response.context["page_obj"]
+        self.assertEqual([event.id for event in page], ids[:10])
+        self.assertFalse(page.has_previous())
+        self.assertEqual(response.context["count_label"], "12 events")
+
+        response = self.client.get(reverse("event-list"), {"page_size": 10, "after": page.next_cursor})
+        page = response.context["page_obj"]
+        self.assertEqual([event.id for event in page], ids[10:])
+        self.assertFalse(page.has_next())
+
+        response = self.client.get(reverse("event-list"), {"page_size": 10, "before": page.previous_cursor})
+        self.assertEqual([event.id for event in response.context["page_obj"]], ids[:10])
+
+        response = self.client.get(reverse("event-list"), {"after": "not a cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_institution_pages(self):
+        self.client.force_login(self.user)
+        for name in ["B", "A", "B", "C", "A"] * 3:
+            OrganisingInstitution.objects.create(name=name, country="Sweden")
+        expected = list(
+            OrganisingInstitution.objects.order_by("name", "id").values_list("id", flat=True)
+        )
+        ids = []
+        params = {"page_size": 10}
+        while True:
+            page = self.client.get(reverse("institution-list"), params).context["page_obj"]
+            ids.extend(institution.id for institution in page)
+            if not page.has_next():
+                break
+            params["after"] = page.next_cursor
+        self.assertEqual(ids, expected)
+
+        # The test table is too small for the planner to pick the index
+        # on its own
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = OrganisingInstitution.objects.order_by("name", "id")[:11].explain()
+        self.assertIn("metrics_institution_name_idx", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_event_list_api(self):
+        response = self.client.get(reverse("event-list-api"))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.user)
+        self._create_events(3)
+        ids = list(Event.objects.order_by("-id").values_list("id", flat=True))
+        response = self.client.get(reverse("event-list-api"), {"limit": 2})
+        data = response.json()
+        self.assertEqual([event["id"] for event in data["events"]], ids[:2])
+        self.assertEqual(data["events"][0]["nodes"], [self.node.id])
+
+        data = self.client.get(reverse("event-list-api"), {"limit": 2, "after": data["next"]}).json()
+        self.assertEqual([event["id"] for event in data["events"]], ids[2:])
+        self.assertIsNone(data["next"])
+
+        data = self.client.get(reverse("event-list-api"), {"type": "Training - e-learning"}).json()
+        self.assertEqual(data["events"], [])
+        response = self.client.get(reverse("event-list-api"), {"after": "not a cursor"})
+        self.assertEqual(response.status_code, 400)
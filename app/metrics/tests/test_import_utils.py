@@ -1,11 +1,16 @@
 from django.test import TestCase
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from metrics.models import (
     Node,
     User,
     Event,
+    OrganisingInstitution,
 )
 from metrics.import_utils import ImportContext
+from .utils import create_event
 import csv
 import functools
 
@@ -72,28 +77,82 @@ class TestImportValues(TestCase):
                         field_name: value
                     })
 
+    def test_import_events_in_batch(self):
+        nodes = [
+            Node.objects.create(name=f"ELIXIR-{name}", country=name)
+            for name in ["A", "B", "C"]
+        ]
+        User.objects.create(username="test")
+        institutions = [
+            OrganisingInstitution.objects.create(
+                name=f"Institution {index}",
+                country="Sweden",
+                ror_id=f"https://ror.org/0000000{index}",
+            )
+            for index in range(2)
+        ]
+
+        def rows(count, offset=0):
+            return [
+                {
+                    "user": "test",
+                    "code": f"event-{offset + index}",
+                    "title": f"Event {index}",
+                    "node_main": "ELIXIR-A",
+                    "node": "ELIXIR-B, ELIXIR-C, ELIXIR-B",
+                    "date_start": "2024-01-01",
+                    "date_end": "2024-01-02",
+                    "duration": "",
+                    "type": "Hackathon",
+                    "funding": "ELIXIR Node",
+                    "organising_institution": ",".join(
+                        institution.ror_id for institution in institutions
+                    ),
+                    "location_city": "Anytown",
+                    "location_country": "Sweden",
+                    "target_audience": "",
+                    "additional_platforms": "",
+                    "communities": "",
+                    "number_participants": "10",
+                    "number_trainers": "2",
+                    "url": "https://local.local",
+                    "status": "complete",
+                }
+                for index in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            ImportContext().events_from_dicts(rows(2))
+        with CaptureQueriesContext(connection) as large:
+            events = ImportContext().events_from_dicts(rows(10, offset=2))
+        self.assertEqual(len(large), len(small))
+
+        self.assertEqual(Event.objects.count(), 12)
+        event = Event.objects.get(id=events[-1].id)
+        self.assertEqual(event.code, "event-11")
+        self.assertEqual(event.duration, 2)
+        self.assertEqual(event.node_main, nodes[0])
+        self.assertEqual(set(event.node.all()), set(nodes[1:]))
+        self.assertEqual(set(event.organising_institution.all()), set(institutions))
+
+        with self.assertRaises(ValidationError):
+            ImportContext().events_from_dicts(rows(3, offset=11))
+        self.assertEqual(Event.objects.count(), 12)
+
     def _create_event(self, user, node, title="A test event", code="test"):
-        event = Event.objects.create(
-            user=user,
+        event = create_event(
+            user,
+            node,
             title=title,
-            node_main=node,
             date_start="2024-01-01",
             date_end="2024-01-02",
-            duration=2,
             location_city="Anytown",
             location_country="Anywhere",
-            number_participants=10,
             number_trainers=10,
-            funding=["ELIXIR Node"],
-            url="https://local.local",
             code=code,
-            type="Hackathon",
             target_audience=["Academia/ Research Institution"],
-            additional_platforms=["NA"],
-            communities=["NA"],
-            status="Complete",
         )
-        event.node.set([event.id])
+        event.node.set([node])
         event.save()
         return event
 
@@ -0,0 +1,150 @@
+from django.contrib.auth.hashers import check_password
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from metrics.models import (
+    Answer,
+    Demographic,
+    Event,
+    Impact,
+    Node,
+    OrganisingInstitution,
+    Quality,
+    Question,
+    QuestionSet,
+    QuestionSuperSet,
+    User,
+)
+import os
+import tempfile
+
+
+DATA = {
+    "nodes.csv": [
+        "name,country",
+        "ELIXIR-SE,Sweden",
+        "ELIXIR-SI,Slovenia",
+    ],
+    "users.csv": [
+        "NodeAccount,Password",
+        "se,secret",
+        "si,secret",
+    ],
+    "institutions.csv": [
+        "name,country,ror_id",
+        "Institution,Sweden,",
+    ],
+    "tango_events.csv": [
+        "user,created,modified,code,title,node,node_main,date_start,date_end,duration,type,funding,"
+        "organising_institution,location_city,location_country,target_audience,additional_platforms,"
+        "communities,number_participants,number_trainers,url,status",
+        'se,,,1,Event 1,"ELIXIR-SE, ELIXIR-SI",ELIXIR-SE,2023-01-01,2023-01-02,2,Hackathon,ELIXIR Node,,'
+        "Uppsala,Sweden,Industry,NA,NA,10,2,https://example.org/1,complete",
+        "si,,,2,Event 2,ELIXIR-SI,ELIXIR-SI,2023-02-01,2023-02-01,,Hackathon,,,,Slovenia,,,,5,1,"
+        "https://example.org/2,complete",
+    ],
+    "tango_demographics.csv": [
+        "user,created,modified,event,heard_from,employment_sector,employment_country,gender,career_stage",
+        "si,,,1,TeSS,Industry,Nepal,Female,Undergraduate student",
+        "si,,,2,,,,,",
+    ],
+    "tango_qualities.csv": [
+        "user,created,modified,event,used_resources_before,used_resources_future,recommend_course,"
+        "course_rating,balance,email_contact",
+        "si,,,1,Never - used other service,Maybe,Maybe,Poor (1),About right,Yes",
+        "si,,,2,Never - used other service,Maybe,Maybe,Poor (1),About right,Yes",
+    ],
+    "tango_impacts.csv": [
+        "user,created,modified,event,when_attend_training,main_attend_reason,how_often_use_before,"
+        "how_often_use_after,able_to_explain,able_use_now,help_work,attending_led_to,"
+        "people_share_knowledge,recommend_others",
+        "si,,,2,Over a year,Other,Occasionally (once in a while to monthly),"
+        "Occasionally (once in a while to monthly),Maybe,Independently,"
+        "It has not helped yet but I anticipate a future impact,"
+        '"Submission of my dissertation/ thesis for degree purposes, Submission of a grant application",'
+        '16-24,"Yes, I already have"',
+    ],
+    "base_questions.csv": [
+        "slug,text,is_multichoice,is_optional,user,description,created,modified,is_active,node",
+        "Demographic.heard_from,Where did you see the course advertised?,1,1,se,,,,,-",
+        "Quality.balance,How was the balance?,0,0,se,,,,,-",
+    ],
+    "base_answers.csv": [
+        "question,text,user,created,modified,slug,is_active",
+        "Demographic.heard_from,TeSS,se,,,,",
+        "Quality.balance,About right,si,,,about-right,",
+    ],
+}
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class TestLoadData(TestCase):
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        for (name, lines) in DATA.items():
+            with open(os.path.join(data_dir.name, name), "w") as f:
+                f.write("\n".join(lines))
+        self.data_dir = data_dir.name
+
+    def test_load_data(self):
+        call_command("load_data", targetdir=self.data_dir, workers=1, batch_size=1)
+        self._assert_loaded()
+
+    def test_load_data_copy(self):
+        call_command("load_data", targetdir=self.data_dir, copy=True, batch_size=1)
+        self._assert_loaded()
+
+    def test_load_data_copy_is_atomic(self):
+        with open(os.path.join(self.data_dir, "tango_qualities.csv"), "a") as f:
+            f.write("\nsi,,,3,Never - used other service,Maybe,Maybe,Poor (1),About right,Yes")
+        with self.assertRaisesMessage(ValidationError, "Events do not exist: row 3 (3)"):
+            call_command("load_data", targetdir=self.data_dir, copy=True)
+        self.assertFalse(Node.objects.exists())
+        self.assertFalse(Event.objects.exists())
+
+    def _assert_loaded(self):
+        self.assertEqual(Node.objects.count(), 2)
+        self.assertEqual(OrganisingInstitution.objects.count(), 1)
+        user = User.objects.get(username="se")
+        self.assertTrue(check_password("secret", user.password))
+        self.assertEqual(user.profile.node.name, "ELIXIR-SE")
+
+        event = Event.objects.get(code="1")
+        self.assertEqual(event.user, user)
+        self.assertEqual(
+            sorted(node.name for node in event.node.all()),
+            ["ELIXIR-SE", "ELIXIR-SI"]
+        )
+        self.assertEqual(Event.objects.get(code="2").duration, 1)
+
+        self.assertEqual(Demographic.objects.count(), 1)
+        self.assertEqual(Quality.objects.count(), 2)
+        self.assertEqual(Impact.objects.get().help_work, [
+            "It has not helped yet but I anticipate a future impact"
+        ])
+
+        self.assertEqual(
+            sorted(QuestionSuperSet.objects.values_list("slug", flat=True)),
+            ["demographic", "quality", "tmd-core-questions"]
+        )
+        question_set = QuestionSet.objects.get(slug="demographic")
+        self.assertEqual(
+            [question.slug for question in question_set.questions.all()],
+            ["demographic-heard_from"]
+        )
+        self.assertEqual(
+            sorted(Answer.objects.values_list("question__slug", "slug")),
+            [
+                ("demographic-heard_from", "no-response"),
+                ("demographic-heard_from", "tess"),
+                ("quality-balance", "about-right"),
+            ]
+        )
+        self.assertEqual(Question.objects.count(), 2)
+
+    def test_load_selected_stages(self):
+        call_command("load_data", targetdir=self.data_dir, workers=1, loaders=["nodes", "user"])
+        self.assertEqual(Node.objects.count(), 2)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertFalse(Event.objects.exists())
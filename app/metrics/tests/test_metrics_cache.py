@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from metrics.cache import (
+    cached_metrics,
+    get_metrics_cache,
+    get_metrics_cache_key,
+    invalidate_metrics_cache,
+)
+from metrics.models import Node
+from .utils import create_event
+from unittest import mock
+import datetime
+
+
+class TestMetricsCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user")
+        cls.node = Node.objects.create(name="ELIXIR-A", country="A")
+
+    def setUp(self):
+        get_metrics_cache().clear()
+
+    def _create_event(self, funding):
+        return create_event(self.user, self.node, funding=funding)
+
+    def _funding_counts(self, response):
+        funding = next(
+            entry
+            for entry in response.json()["values"]
+            if entry["id"] == "funding"
+        )
+        return {option["id"]: option["count"] for option in funding["options"]}
+
+    def test_key_is_normalised(self):
+        self.assertEqual(
+            get_metrics_cache_key(
+                "event",
+                "generation",
+                event_funding=["ELIXIR Hub", "ELIXIR Node"],
+                event_node=self.node,
+                date_from="2024-01-01",
+            ),
+            get_metrics_cache_key(
+                "event",
+                "generation",
+                event_type="",
+                event_funding=["ELIXIR Node", "ELIXIR Hub"],
+                event_target_audience=[],
+                event_node=self.node.id,
+                date_from=datetime.date(2024, 1, 1),
+            ),
+        )
+        self.assertNotEqual(
+            get_metrics_cache_key("event", "generation"),
+            get_metrics_cache_key("legacy", "generation", slug="quality"),
+        )
+
+    def test_event_api_is_cached_and_invalidated(self):
+        self._create_event(["ELIXIR Hub"])
+        url = reverse("event-api")
+        response = self.client.get(url, {"funding": ["ELIXIR Hub"]})
+        self.assertEqual(self._funding_counts(response)["ELIXIR Hub"], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"funding": ["ELIXIR Hub"]})
+        self.assertEqual(self._funding_counts(response)["ELIXIR Hub"], 1)
+        # Only the cache table is read
+        self.assertEqual(
+            [query["sql"] for query in queries.captured_queries if "tmd_metrics_cache" not in query["sql"]],
+            [],
+        )
+
+        self._create_event(["ELIXIR Hub", "ELIXIR Node"])
+        response = self.client.get(url, {"funding": ["ELIXIR Hub"]})
+        counts = self._funding_counts(response)
+        self.assertEqual(counts["ELIXIR Hub"], 2)
+        self.assertEqual(counts["ELIXIR Node"], 1)
+
+    def test_invalidation_is_shared_between_processes(self):
+        # Separate instances of the cache, as in two worker processes
+        (worker, other_worker) = [
+            caches.create_connection(settings.METRICS_CACHE_ALIAS)
+            for _index in range(2)
+        ]
+        results = iter(["stale", "fresh"])
+        with mock.patch("metrics.cache.get_metrics_cache", return_value=worker):
+            self.assertEqual(cached_metrics("event", lambda: next(results)), "stale")
+            self.assertEqual(cached_metrics("event", lambda: next(results)), "stale")
+        with mock.patch("metrics.cache.get_metrics_cache", return_value=other_worker):
+            invalidate_metrics_cache()
+        with mock.patch("metrics.cache.get_metrics_cache", return_value=worker):
+            self.assertEqual(cached_metrics("event", lambda: next(results)), "fresh")
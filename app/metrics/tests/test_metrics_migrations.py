@@ -1,5 +1,7 @@
 from metrics.management.commands.migrate_metrics import (
+    link_converted,
     migrate_entries,
+    migrate_model,
     validate_compatibility,
 )
 from metrics.models.common import (
@@ -11,6 +13,9 @@ from metrics.models.common import (
     country_list,
 )
 from metrics.models import (
+    Answer,
+    AnswerCount,
+    LegacyResponseSet,
     Question,
     QuestionSet,
     Response,
@@ -496,3 +501,146 @@ class TestImportValues(TestCase):
             ).count(),
             3
         )
+
+    def test_migrate_entries_in_batches(self):
+        for choice in ["A", "B", "C"]:
+            self.model_a.objects.create(
+                choice_field=choice,
+                multichoice_field=["MA"],
+                user=self.user,
+                event=self.event_a,
+            )
+        progress = []
+        count = migrate_entries(
+            self.model_a.objects.order_by("id"),
+            self.model_a,
+            self.questionset,
+            batch_size=2,
+            progress=lambda batch, response_sets, count: progress.append(
+                ([entry.choice_field for entry in batch], count)
+            ),
+        )
+        self.assertEqual(count, 3)
+        self.assertEqual(progress, [(["A", "B"], 2), (["C"], 3)])
+        self.assertEqual(ResponseSet.objects.count(), 3)
+        self.assertEqual(Response.objects.count(), 6)
+
+    def test_migrate_entries_invalid_entry(self):
+        entries = [
+            self.model_a(
+                id=index,
+                choice_field=choice,
+                multichoice_field=["MA"],
+                user=self.user,
+                event=self.event_a,
+            )
+            for (index, choice) in enumerate(["A", "D"])
+        ]
+        with self.assertRaisesMessage(ValidationError, "TestMetricsA 1"):
+            migrate_entries(entries, self.model_a, self.questionset, batch_size=1)
+        self.assertEqual(ResponseSet.objects.count(), 1)
+
+    def test_migrate_model_incremental(self):
+        def migrate():
+            return migrate_model(
+                self.model_a,
+                self.questionset,
+                batch_size=2,
+                report=lambda message: None,
+            )
+
+        entries = [
+            self.model_a.objects.create(
+                choice_field=choice,
+                multichoice_field=["MA"],
+                user=self.user,
+                event=self.event_a,
+            )
+            for choice in ["A", "B", "C"]
+        ]
+        self.assertEqual(migrate(), 3)
+        self.assertEqual(migrate(), 0)
+        self.assertEqual(ResponseSet.objects.count(), 3)
+
+        entries[0].choice_field = "C"
+        entries[0].save()
+        entries[1].delete()
+        self.model_a.objects.create(
+            choice_field="A",
+            multichoice_field=["MB"],
+            user=self.user,
+            event=self.event_a,
+        )
+        self.assertEqual(migrate(), 2)
+        self.assertEqual(ResponseSet.objects.count(), 3)
+        self.assertEqual(
+            sorted(
+                LegacyResponseSet.objects.values_list("source_id", flat=True)
+            ),
+            sorted(self.model_a.objects.values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            dict(
+                AnswerCount.objects
+                .filter(answer__question__slug="test-metrics-a-choice_field")
+                .values_list("answer__slug", "count")
+            ),
+            {"a": 1, "c": 2},
+        )
+
+    def test_link_converted(self):
+        for (event, choices) in [(self.event_a, ["A", "B"]), (self.event_b, ["C"])]:
+            for choice in choices:
+                self.model_a.objects.create(
+                    choice_field=choice,
+                    multichoice_field=["MA"],
+                    user=self.user,
+                    event=event,
+                )
+        # Uploaded for the same user and event, before and after the
+        # conversion
+        answers = {
+            answer.slug: answer
+            for answer in Answer.objects.filter(question__in=self.questionset.questions.all())
+        }
+        ResponseSet.bulk_create_with_responses([
+            (
+                ResponseSet(user=self.user, event=self.event_a, question_set=self.questionset),
+                [answers["b"], answers["mb"]],
+            )
+        ])
+        # Converted before the conversions were recorded
+        migrate_entries(self.model_a.objects.order_by("id"), self.model_a, self.questionset)
+        ResponseSet.bulk_create_with_responses([
+            (
+                ResponseSet(user=self.user, event=self.event_b, question_set=self.questionset),
+                [answers["a"], answers["mb"]],
+            )
+        ])
+        self.model_a.objects.create(
+            choice_field="A",
+            multichoice_field=["MB"],
+            user=self.user,
+            event=self.event_a,
+        )
+
+        self.assertEqual(
+            link_converted(self.model_a, self.questionset, report=lambda message: None),
+            3,
+        )
+        for legacy in LegacyResponseSet.objects.select_related("response_set"):
+            entry = self.model_a.objects.get(id=legacy.source_id)
+            self.assertEqual(legacy.response_set.event, entry.event)
+            self.assertEqual(
+                sorted(legacy.response_set.entries.values_list("answer__slug", flat=True)),
+                sorted([entry.choice_field.lower(), *[c.lower() for c in entry.multichoice_field]]),
+            )
+        self.assertEqual(
+            ResponseSet.objects.filter(legacy_source__isnull=True).count(),
+            2,
+        )
+        self.assertEqual(
+            migrate_model(self.model_a, self.questionset, report=lambda message: None),
+            1,
+        )
+        self.assertEqual(ResponseSet.objects.count(), 6)
@@ -104,6 +104,21 @@ class TestFormValidation(TestCase):
                 text = data[key]
                 self.assertEquals(text, value.text)
 
+    def test_validation_without_queries(self):
+        form_class = QuestionSetForm.from_question_set(self.questionset)
+        all_values = [
+            [(slugify(question), choice) for choice in choices]
+            for question, choices in self.question_content.items()
+        ]
+
+        combinations = list(itertools.product(*all_values))
+        with self.assertNumQueries(0):
+            self._assert_combination_validity_status(
+                form_class,
+                combinations,
+                True
+            )
+
     def test_validate_incorrect_responses(self):
         form_class = QuestionSetForm.from_question_set(self.questionset)
         all_values = [
@@ -0,0 +1,206 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics.import_utils import ImportContext
+from metrics.models import OrganisingInstitution, RorOrganisation
+from metrics.ror import RorClient, get_ror_client
+from collections import Counter
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+
+ORGANISATIONS = {
+    "0576by029": {
+        "name": "Institution A",
+        "country": {"country_name": "Sweden"},
+    },
+    "05g3p2p60": {
+        "names": [
+            {"value": "B", "types": ["acronym"]},
+            {"value": "Institution B", "types": ["ror_display", "label"]},
+        ],
+        "locations": [{"geonames_details": {"country_name": "Slovenia"}}],
+    },
+}
+
+
+class RorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        suffix = self.path.rstrip("/").split("/")[-1]
+        self.server.requests[suffix] += 1
+        if suffix == "flaky" and self.server.requests[suffix] == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        data = ORGANISATIONS.get(suffix, ORGANISATIONS["0576by029"] if suffix == "flaky" else None)
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRor(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), RorHandler)
+        cls.server.requests = Counter()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = f"http://127.0.0.1:{cls.server.server_address[1]}/organizations"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = self.settings(
+            ROR_API_URL=self.api_url,
+            ROR_CACHE_DIR=cache_dir.name,
+            ROR_CACHE_TTL=60,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_ror_client.cache_clear()
+        self.addCleanup(get_ror_client.cache_clear)
+
+    def test_get_organisations(self):
+        client = RorClient()
+        result = client.get_organisations([
+            "https://ror.org/0576by029",
+            "https://ror.org/05g3p2p60",
+            "https://ror.org/flaky",
+            "https://ror.org/missing",
+            "Not an id",
+        ])
+        self.assertEqual(result["https://ror.org/0576by029"]["name"], "Institution A")
+        self.assertEqual(result["https://ror.org/flaky"]["name"], "Institution A")
+        self.assertIsInstance(result["https://ror.org/missing"], ValidationError)
+        self.assertIsInstance(result["Not an id"], ValidationError)
+        self.assertEqual(self.server.requests["flaky"], 2)
+
+        # Served from the disk cache, by a new client as well
+        RorClient().get_organisations([
+            "https://ror.org/0576by029",
+            "https://ror.org/05g3p2p60",
+        ])
+        self.assertEqual(self.server.requests["0576by029"], 1)
+        self.assertEqual(self.server.requests["05g3p2p60"], 1)
+
+        RorClient(cache_ttl=-1).get_organisation("https://ror.org/0576by029")
+        self.assertEqual(self.server.requests["0576by029"], 2)
+
+    def test_resolve_institutions(self):
+        existing = OrganisingInstitution.objects.create(
+            name="Existing",
+            country="Norway",
+            ror_id="https://ror.org/existing",
+        )
+        context = ImportContext()
+        institutions = context.get_institutions([
+            "https://ror.org/existing",
+            "https://ror.org/0576by029",
+            "https://ror.org/05g3p2p60",
+            "https://ror.org/missing",
+        ])
+        self.assertEqual(
+            [(institution.name, institution.country) for institution in institutions],
+            [
+                ("Existing", "Norway"),
+                ("Institution A", "Sweden"),
+                ("Institution B", "Slovenia"),
+            ]
+        )
+        self.assertEqual(institutions[0], existing)
+        self.assertEqual(OrganisingInstitution.objects.count(), 3)
+        self.assertNotIn("existing", self.server.requests)
+
+        with self.assertRaises(ValidationError):
+            context.get_institution("https://ror.org/missing")
+        self.assertEqual(self.server.requests["missing"], 1)
+
+    def test_update_ror_data(self):
+        institution = OrganisingInstitution(ror_id="https://ror.org/05g3p2p60")
+        institution.update_ror_data()
+        self.assertEqual(institution.name, "Institution B")
+        self.assertEqual(institution.country, "Slovenia")
+
+    def test_load_ror_dump(self):
+        records = [
+            {
+                "id": "https://ror.org/0576by029",
+                "name": "Institution A",
+                "aliases": ["Inst A"],
+                "acronyms": ["IA"],
+                "labels": [{"label": "Institutionen A", "iso639": "sv"}],
+                "country": {"country_name": "Sweden"},
+            },
+            {
+                "id": "https://ror.org/05g3p2p60",
+                **ORGANISATIONS["05g3p2p60"],
+            },
+        ]
+        dump_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(dump_dir.cleanup)
+        path = os.path.join(dump_dir.name, "ror-data.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("v1.0-ror-data.json", "[]")
+            archive.writestr("v1.0-ror-data_schema_v2.json", json.dumps(records))
+
+        call_command("load_ror_dump", path, batch_size=1)
+        call_command("load_ror_dump", path)
+        self.assertEqual(RorOrganisation.objects.count(), 2)
+        organisation = RorOrganisation.objects.get(ror_id="https://ror.org/0576by029")
+        self.assertEqual(organisation.country, "Sweden")
+        self.assertEqual(organisation.aliases, ["Inst A", "IA", "Institutionen A"])
+        self.assertEqual(organisation.names.count(), 4)
+
+        self.assertEqual(
+            [str(organisation) for organisation in RorOrganisation.search("inst")],
+            ["Institution A (Sweden)", "Institution B (Slovenia)"]
+        )
+        self.assertEqual(
+            [organisation.name for organisation in RorOrganisation.search(" b")],
+            ["Institution B"]
+        )
+
+        # Resolved from the index without requests
+        with self.settings(ROR_OFFLINE=True):
+            institutions = ImportContext().get_institutions([
+                "https://ror.org/0576by029",
+                "https://ror.org/05g3p2p60",
+            ])
+            self.assertEqual(len(institutions), 2)
+            with self.assertRaises(ValidationError):
+                ImportContext().get_institution("https://ror.org/missing")
+        self.assertEqual(sum(self.server.requests.values()), 0)
+
+        user = User.objects.create(username="user")
+        self.client.force_login(user)
+        response = self.client.get(reverse("institution-search"), {"q": "IA"})
+        self.assertEqual(response.json()["results"], [{
+            "ror_id": "https://ror.org/0576by029",
+            "name": "Institution A",
+            "country": "Sweden",
+            "aliases": ["Inst A", "IA", "Institutionen A"],
+            "url": institutions[0].get_absolute_url(),
+        }])
@@ -0,0 +1,171 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from metrics.models import Demographic, Node, ResponseSet
+from metrics.snapshots import export_snapshots
+from .utils import create_event, create_questionset, create_question
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+@override_settings(SNAPSHOT_SETTLE_SECONDS=0)
+class TestSnapshots(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user")
+        cls.nodes = [
+            Node.objects.create(name="ELIXIR-A", country="A"),
+            Node.objects.create(name="ELIXIR B", country="B"),
+        ]
+        cls.events = [
+            create_event(
+                cls.user,
+                node,
+                title=f"Event {index}",
+                date_start=datetime.date(year, 1, 1),
+                date_end=datetime.date(year, 1, 2),
+            )
+            for index, (year, node) in enumerate([(2023, cls.nodes[0]), (2024, cls.nodes[1])])
+        ]
+        cls.events[0].node.set(cls.nodes)
+        questionset = create_questionset(
+            user=cls.user,
+            name="Test set",
+            slug="test-set",
+            questions=[
+                create_question(
+                    text="Choice question",
+                    slug="choice",
+                    user=cls.user,
+                    choices=["A", "B"],
+                ),
+            ]
+        )
+        answers = list(questionset.questions.get().answers.order_by("slug"))
+        ResponseSet.bulk_create_with_responses([
+            (ResponseSet(user=cls.user, event=event, question_set=questionset), [answer])
+            for event, answer in zip(cls.events, answers)
+        ])
+        Demographic.objects.create(
+            user=cls.user,
+            event=cls.events[1],
+            heard_from=["TeSS"],
+            employment_sector="Industry",
+            gender="Other",
+            career_stage="Other",
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _export(self, **kwargs):
+        return export_snapshots(directory=self.directory, report=lambda message: None, **kwargs)
+
+    def _read(self, name):
+        import pyarrow.dataset
+        return (
+            pyarrow.dataset.dataset(
+                os.path.join(self.directory, name),
+                format="parquet",
+                partitioning="hive",
+            )
+            .to_table()
+            .sort_by("id")
+            .to_pylist()
+        )
+
+    def _files(self, name):
+        return sorted(
+            os.path.relpath(os.path.join(root, file_name), self.directory)
+            for (root, _dirs, file_names) in os.walk(os.path.join(self.directory, name))
+            for file_name in file_names
+        )
+
+    def test_export(self):
+        self._export(row_group_size=1)
+        events = self._read("events")
+        self.assertEqual([event["id"] for event in events], [event.id for event in self.events])
+        self.assertEqual(events[0]["year"], 2023)
+        self.assertEqual(events[0]["nodes"], ["ELIXIR B", "ELIXIR-A"])
+        self.assertEqual(events[1]["nodes"], [])
+        self.assertEqual(events[0]["funding"], ["ELIXIR Node"])
+        self.assertEqual(events[0]["duration"], 2.0)
+        self.assertEqual(events[1]["node"], "ELIXIR B")
+        self.assertTrue(self._files("events")[1].startswith("events/year=2024/node=ELIXIR%20B/part-"))
+
+        responses = self._read("responses")
+        self.assertEqual(
+            [(response["event"], response["question"], response["answer"]) for response in responses],
+            [(self.events[0].id, "choice", "a"), (self.events[1].id, "choice", "b")]
+        )
+        demographics = self._read("demographic")
+        self.assertEqual(demographics[0]["heard_from"], ["TeSS"])
+        self.assertEqual(demographics[0]["year"], 2024)
+
+    def test_incremental(self):
+        self._export()
+        files = self._files("events")
+        self._export()
+        self.assertEqual(self._files("events"), files)
+
+        event = self.events[0]
+        event.title = "Changed"
+        event.save()
+        self._export(names=["events"])
+        self.assertEqual(len(self._files("events")), 3)
+        self.assertEqual(
+            [row["title"] for row in self._read("events") if row["id"] == event.id],
+            ["Event 0", "Changed"]
+        )
+
+        self._export(names=["events"], full=True)
+        self.assertEqual(len(self._files("events")), 2)
+        self.assertEqual(
+            [row["title"] for row in self._read("events")],
+            ["Changed", "Event 1"]
+        )
+
+    def test_event_change_moves_dependent_rows(self):
+        self._export()
+        event = self.events[1]
+        event.date_start = datetime.date(2025, 1, 1)
+        event.date_end = datetime.date(2025, 1, 2)
+        event.save()
+        self._export(names=["responses", "demographic"])
+
+        for name in ["responses", "demographic"]:
+            rows = [row for row in self._read(name) if row["event"] == event.id]
+            self.assertEqual(len(rows), 2)
+            newest = max(rows, key=lambda row: row["exported"])
+            self.assertEqual(newest["year"], 2025)
+
+        files = {name: self._files(name) for name in ["responses", "demographic"]}
+        self._export(names=["responses", "demographic"])
+        self.assertEqual(
+            {name: self._files(name) for name in ["responses", "demographic"]},
+            files,
+        )
+
+    @override_settings(SNAPSHOT_SETTLE_SECONDS=3600)
+    def test_settle_window(self):
+        self._export(names=["demographic"])
+        # Saved ten minutes ago by a transaction that commits after the export
+        demographic = Demographic.objects.create(
+            user=self.user,
+            event=self.events[0],
+            heard_from=["TeSS"],
+            employment_sector="Industry",
+            gender="Other",
+            career_stage="Other",
+        )
+        Demographic.objects.filter(id=demographic.id).update(
+            modified=timezone.now() - datetime.timedelta(minutes=10)
+        )
+        self._export(names=["demographic"])
+        self.assertIn(demographic.id, [row["id"] for row in self._read("demographic")])
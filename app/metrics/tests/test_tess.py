@@ -0,0 +1,193 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics.models import Event, Node
+from metrics.tess import TessClient, get_tess_client
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+import json
+import tempfile
+import threading
+
+
+SEARCH_RESULTS = [f"s{index}" for index in range(5)]
+
+
+def tess_document(tess_id):
+    return {
+        "data": {
+            "id": tess_id,
+            "attributes": {
+                "title": f"Event {tess_id}",
+                "url": f"https://example.org/{tess_id}",
+                "start": "2024-01-01T09:00:00.000Z",
+                "end": "2024-01-02T17:00:00.000Z",
+                "city": "City",
+                "country": "Sweden",
+                "duration": None,
+            },
+            "links": {"self": f"/events/{tess_id}"},
+        }
+    }
+
+
+class TessHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/events.json_api":
+            return self.search(parse_qs(url.query))
+        tess_id = self.path.split("/")[-1].removesuffix(".json_api")
+        self.server.requests[tess_id] += 1
+        if tess_id in ("missing", "404"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{tess_id}-1"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.not_modified[tess_id] += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(tess_document(tess_id)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.api+json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def search(self, params):
+        self.server.requests["search"] += 1
+        page_size = int(params["page_size"][0])
+        start = (int(params["page_number"][0]) - 1) * page_size
+        results = SEARCH_RESULTS if params["q"] == ["all"] else []
+        body = json.dumps({
+            "data": [
+                tess_document(tess_id)["data"]
+                for tess_id in results[start:start + page_size]
+            ],
+            "meta": {"results-count": len(results)},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.api+json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    STORAGES={
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    },
+)
+class TestTess(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), TessHandler)
+        cls.server.requests = Counter()
+        cls.server.not_modified = Counter()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.not_modified.clear()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = self.settings(
+            TESS_URL=self.base_url,
+            TESS_CACHE_DIR=cache_dir.name,
+            TESS_CACHE_TTL=60,
+            TESS_PAGE_SIZE=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_tess_client.cache_clear()
+        self.addCleanup(get_tess_client.cache_clear)
+
+    def test_get_events(self):
+        client = TessClient()
+        events = client.get_converted_events(["1", "2", "missing", "../1"])
+        self.assertEqual(events["1"]["title"], "Event 1")
+        self.assertEqual(events["2"]["date_start"], "2024-01-01")
+        self.assertIsNone(events["missing"])
+        self.assertIsNone(events["../1"])
+
+        client.get_event("1")
+        self.assertEqual(self.server.requests["1"], 1)
+
+        # Stale documents are revalidated
+        stale_client = TessClient(cache_ttl=-1)
+        self.assertEqual(stale_client.get_event("1"), tess_document("1"))
+        self.assertEqual(self.server.requests["1"], 2)
+        self.assertEqual(self.server.not_modified["1"], 1)
+
+    def _create_user(self):
+        node = Node.objects.create(name="ELIXIR-A", country="A")
+        user = User.objects.create(username="user")
+        user.profile.node = node
+        user.profile.save()
+        return user
+
+    def test_import_view(self):
+        user = self._create_user()
+        self.client.force_login(user)
+
+        for _ in range(2):
+            response = self.client.get(reverse("tess-import", kwargs={"tess_id": 7}))
+            self.assertContains(response, "Event 7")
+            self.assertContains(response, f"{self.base_url}/events/7")
+        self.assertEqual(self.server.requests["7"], 1)
+
+        response = self.client.get(reverse("tess-import", kwargs={"tess_id": 404}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_import_command(self):
+        user = self._create_user()
+        call_command("import_tess_events", "1", "missing", "--query", "all", user="user")
+        self.assertEqual(self.server.requests["search"], 3)
+        events = Event.objects.order_by("id")
+        self.assertEqual(
+            [event.title for event in events],
+            ["Event 1", "Event s0", "Event s1", "Event s2", "Event s3", "Event s4"]
+        )
+        event = events[0]
+        self.assertEqual(event.node_main, user.profile.node)
+        self.assertEqual(list(event.node.all()), [user.profile.node])
+        self.assertEqual(event.status, "Incomplete")
+        self.assertEqual(event.location_country, "Sweden")
+        self.assertEqual(event.duration, 2)
+
+        # Imported urls are skipped
+        call_command("import_tess_events", "1", "2", user="user")
+        self.assertEqual(Event.objects.count(), 7)
+
+    @override_settings(FEATURE_FLAGS=["use_new_model_upload"])
+    def test_upload_page_import(self):
+        user = self._create_user()
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse("upload-data"),
+            {"tess-tess_ids": "1, 2", "tess-query": "all"},
+        )
+        self.assertContains(response, "Successfully imported 7 events from TeSS, skipped 0.")
+        response = self.client.post(reverse("upload-data"), {"tess-tess_ids": "1"})
+        self.assertContains(response, "Already imported")
+        self.assertEqual(Event.objects.count(), 7)
@@ -0,0 +1,183 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from metrics.models import (
+    AnswerCount,
+    Event,
+    Node,
+    QuestionSuperSet,
+    Response,
+    ResponseSet,
+)
+from metrics.views.upload import (
+    ResponseImporter,
+    import_entries,
+    iter_lines,
+    parse_csv_to_dict,
+)
+from .utils import create_event, create_questionset, create_question
+from unittest import mock
+
+
+@override_settings(
+    FEATURE_FLAGS=["use_new_model_upload"],
+    STORAGES={
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    },
+)
+class TestUpload(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.node = Node.objects.create(name="ELIXIR-A", country="A")
+        cls.user = User.objects.create(username="user")
+        cls.user.profile.node = cls.node
+        cls.user.profile.save()
+        cls.event = create_event(cls.user, cls.node)
+        cls.questionset = create_questionset(
+            user=cls.user,
+            name="Test set",
+            slug="test-set",
+            questions=[
+                create_question(
+                    text="Choice question",
+                    slug="choice",
+                    user=cls.user,
+                    choices=["A", "B"],
+                ),
+                create_question(
+                    text="Multichoice question",
+                    slug="multichoice",
+                    user=cls.user,
+                    is_multichoice=True,
+                    choices=["MA", "MB"],
+                ),
+            ]
+        )
+        cls.superset = QuestionSuperSet.objects.create(
+            name="Test superset",
+            slug="test-superset",
+            user=cls.user,
+            use_for_metrics=True,
+            use_for_upload=True,
+        )
+        cls.superset.question_sets.add(cls.questionset)
+
+    def _upload(self, lines, prefix=None):
+        self.client.force_login(self.user)
+        content = "\ufeff" + "\r\n".join(lines) + "\r\n"
+        return self.client.post(
+            reverse("upload-data"),
+            {
+                f"{prefix or self.superset.slug}-file": SimpleUploadedFile(
+                    "responses.csv",
+                    content.encode("utf-8"),
+                ),
+            },
+        )
+
+    def test_iter_lines(self):
+        chunks = ["a,b\r", "\nc,\"x\ny\"\r", "\r\n", "d"]
+        self.assertEqual(
+            list(iter_lines(chunks)),
+            ["a,b\r\n", "c,\"x\n", "y\"\r", "\r\n", "d"],
+        )
+        self.assertEqual("".join(iter_lines(chunks)), "".join(chunks))
+
+    def test_parse_csv_to_dict(self):
+        content = (
+            "\ufeffevent_id;choice;comment\r\n"
+            "1;a;\"multi\r\nline\"\r\n"
+            "2;b;single\r\n"
+        ).encode("utf-8")
+        rows = list(parse_csv_to_dict(
+            SimpleUploadedFile("responses.csv", content),
+            None
+        ))
+        self.assertEqual(rows, [
+            {"event_id": "1", "choice": "a", "comment": "multi\r\nline"},
+            {"event_id": "2", "choice": "b", "comment": "single"},
+        ])
+
+    def test_upload(self):
+        for two_pass in [True, False]:
+            with self.subTest(two_pass=two_pass), self.settings(UPLOAD_TWO_PASS=two_pass):
+                ResponseSet.objects.all().delete()
+                AnswerCount.objects.all().delete()
+                response = self._upload([
+                    "event_id,choice,multichoice",
+                    f"{self.event.id},a,\"ma,mb\"",
+                    f"{self.event.id},b,mb",
+                ])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(ResponseSet.objects.count(), 2)
+                self.assertEqual(Response.objects.count(), 5)
+                self.assertEqual(
+                    AnswerCount.objects.get(answer__slug="mb").count,
+                    2
+                )
+
+    def test_upload_events(self):
+        response = self._upload(
+            [
+                "Title,ELIXIR Node,Start Date,End Date,Event type,Funding,"
+                "Organising Institution/s,\"Location (city, country)\",EXCELERATE WP,"
+                "Target audience,Additional ELIXIR Platforms involved,"
+                "ELIXIR Communities involved,No. of participants,"
+                "No. of trainers/ facilitators,Url to event page/ agenda",
+                *[
+                    f"Uploaded {index},ELIXIR-A,2024-02-01,2024-02-03,Hackathon,"
+                    "ELIXIR Node,,\"City, Sweden\",,Industry,NA,NA,10,2,"
+                    "https://local.local"
+                    for index in range(3)
+                ]
+            ],
+            prefix="events",
+        )
+        self.assertEqual(response.status_code, 200)
+        events = Event.objects.filter(title__startswith="Uploaded").order_by("id")
+        self.assertEqual(len(events), 3)
+        self.assertEqual(list(events[0].node.all()), [self.node])
+        for event in events:
+            self.assertContains(response, f"<td>{event.id}</td>", html=True)
+
+    def test_upload_with_invalid_row(self):
+        for two_pass in [True, False]:
+            with self.subTest(two_pass=two_pass), self.settings(UPLOAD_TWO_PASS=two_pass):
+                response = self._upload([
+                    "event_id,choice,multichoice",
+                    f"{self.event.id},a,ma",
+                    f"{self.event.id},c,ma",
+                    f"{self.event.id},b,mb",
+                ])
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "row 1")
+                self.assertFalse(ResponseSet.objects.exists())
+                self.assertFalse(AnswerCount.objects.exists())
+
+    def test_failed_batch_rows(self):
+        answer = self.questionset.questions.get(slug="choice").answers.first()
+        entries = [(self.event, [(self.questionset, {"choice": answer})])] * 5
+        for (failed_batch, message) in [(1, "entries[2-3]"), (2, "entries[4-4]")]:
+            with self.subTest(failed_batch=failed_batch):
+                calls = []
+
+                def bulk_create(pending, batch_size=None):
+                    calls.append(pending)
+                    if len(calls) == failed_batch + 1:
+                        raise ValidationError("Failed")
+
+                with mock.patch.object(
+                    ResponseSet,
+                    "bulk_create_with_responses",
+                    side_effect=bulk_create,
+                ):
+                    with self.assertRaises(ValidationError) as context:
+                        import_entries(ResponseImporter(self.user, batch_size=2), entries)
+                self.assertIn(f"Error for {message}: ['Failed']", context.exception.messages)
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from metrics.models import (
+    Node,
+    QuestionSuperSet,
+    ResponseSet,
+    UploadJob,
+)
+from metrics.upload_jobs import run_upload_job
+from .utils import create_event, create_questionset, create_question
+import datetime
+import tempfile
+
+
+@override_settings(
+    FEATURE_FLAGS=["use_new_model_upload", "use_upload_jobs"],
+    STORAGES={
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    },
+)
+class TestUploadJobs(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.node = Node.objects.create(name="ELIXIR-A", country="A")
+        cls.user = User.objects.create(username="user")
+        cls.user.profile.node = cls.node
+        cls.user.profile.save()
+        cls.other_user = User.objects.create(username="other")
+        cls.event = create_event(cls.user, cls.node)
+        cls.questionset = create_questionset(
+            user=cls.user,
+            name="Test set",
+            slug="test-set",
+            questions=[
+                create_question(
+                    text="Choice question",
+                    slug="choice",
+                    user=cls.user,
+                    choices=["A", "B"],
+                ),
+            ]
+        )
+        cls.superset = QuestionSuperSet.objects.create(
+            name="Test superset",
+            slug="test-superset",
+            user=cls.user,
+            use_for_metrics=True,
+            use_for_upload=True,
+        )
+        cls.superset.question_sets.add(cls.questionset)
+
+    def setUp(self):
+        job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(job_dir.cleanup)
+        settings_override = self.settings(UPLOAD_JOB_DIR=job_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _queue(self, lines):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("upload-data"),
+            {
+                f"{self.superset.slug}-file": SimpleUploadedFile(
+                    "responses.csv",
+                    "\n".join(lines).encode("utf-8"),
+                ),
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        job = UploadJob.objects.get()
+        self.assertContains(response, job.get_absolute_url())
+        return job
+
+    def test_job_is_queued_and_run(self):
+        job = self._queue([
+            "event_id,choice",
+            f"{self.event.id},a",
+            f"{self.event.id},b",
+        ])
+        self.assertEqual(job.status, UploadJob.QUEUED)
+        self.assertEqual(job.super_set, self.superset)
+        self.assertFalse(ResponseSet.objects.exists())
+
+        call_command("run_upload_jobs", workers=0, once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.SUCCEEDED)
+        self.assertEqual(job.errors, [])
+        self.assertEqual(job.rows_validated, 2)
+        self.assertEqual(job.rows_imported, 2)
+        self.assertEqual(job.rows_total, 2)
+        self.assertEqual(job.outputs["summary"], "Successfully uploaded 2 objects.")
+        self.assertFalse(job.file)
+        self.assertEqual(ResponseSet.objects.count(), 2)
+
+        response = self.client.get(reverse("upload-job-api", kwargs={"pk": job.id}))
+        self.assertEqual(response.json()["status"], UploadJob.SUCCEEDED)
+        response = self.client.get(job.get_absolute_url())
+        self.assertContains(response, "Successfully uploaded 2 objects.")
+
+    def test_job_reports_row_errors(self):
+        job = self._queue([
+            "event_id,choice",
+            f"{self.event.id},a",
+            f"{self.event.id},c",
+        ])
+        self.assertEqual(UploadJob.claim(), job)
+        self.assertIsNone(UploadJob.claim())
+        self.assertEqual(run_upload_job(job.id), UploadJob.FAILED)
+
+        job.refresh_from_db()
+        self.assertIn("row 1", job.errors[0])
+        self.assertFalse(ResponseSet.objects.exists())
+
+    def test_job_status_is_private(self):
+        job = self._queue(["event_id,choice", f"{self.event.id},a"])
+        self.client.force_login(self.other_user)
+        response = self.client.get(reverse("upload-job-api", kwargs={"pk": job.id}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_stale_job_is_failed(self):
+        job = self._queue(["event_id,choice", f"{self.event.id},a"])
+        self.assertEqual(UploadJob.claim(), job)
+        # The worker died
+        UploadJob.objects.filter(id=job.id).update(
+            heartbeat=timezone.now() - datetime.timedelta(seconds=settings.UPLOAD_JOB_STALE_TIMEOUT + 1)
+        )
+        self.assertIsNone(UploadJob.claim())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.FAILED)
+        self.assertIn("stopped unexpectedly", job.errors[-1])
+        self.assertIsNotNone(job.finished)
+        self.assertFalse(job.file)
@@ -1,9 +1,11 @@
 from metrics.models import (
+    Event,
     Question,
     QuestionSet,
     Answer,
 )
 from django.template.defaultfilters import slugify
+import datetime
 
 
 def create_question(user, text, slug, choices, is_multichoice=False, choice_slugify=slugify):
@@ -32,3 +34,26 @@ def create_questionset(user, name, slug, questions):
     questionset.questions.add(*questions)
     questionset.save()
     return questionset
+
+
+def create_event(user, node, **overrides):
+    return Event.objects.create(**{
+        "user": user,
+        "title": "Event",
+        "node_main": node,
+        "date_start": datetime.date(2024, 1, 1),
+        "date_end": datetime.date(2024, 1, 2),
+        "duration": 2,
+        "type": "Hackathon",
+        "location_city": "City",
+        "location_country": "Sweden",
+        "funding": ["ELIXIR Node"],
+        "target_audience": ["Industry"],
+        "additional_platforms": ["NA"],
+        "communities": ["NA"],
+        "number_participants": 10,
+        "number_trainers": 2,
+        "url": "https://local.local",
+        "status": "Complete",
+        **overrides,
+    })
@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+from metrics.models import UploadJob
+from metrics.views.upload import (
+    ENCODING_ERROR_MESSAGE,
+    check_csv_file_name,
+    get_dialect_message,
+    get_upload_context,
+    import_upload,
+    read_csv_to_dict,
+)
+import csv
+import threading
+import time
+import traceback
+
+
+class JobProgress:
+    """Write the row counters of a running job at most every `interval` seconds.
+
+    The import runs inside a transaction, so the counters are written through
+    a separate connection to be visible to the status views while it runs.
+    A thread refreshes the heartbeat of the job until it is closed, also
+    while no rows are processed.
+    """
+    def __init__(self, job, interval=1.0):
+        self.job = job
+        self.interval = interval
+        self.last_update = 0
+        self.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.stopped = threading.Event()
+        self.heartbeat = threading.Thread(target=self.beat, daemon=True)
+        self.heartbeat.start()
+
+    def close(self):
+        self.stopped.set()
+        self.heartbeat.join()
+        self.connection.close()
+
+    def beat(self):
+        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        table = UploadJob._meta.db_table
+        try:
+            while True:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"UPDATE {table} SET heartbeat = %s WHERE id = %s",
+                        [timezone.now(), self.job.id]
+                    )
+                if self.stopped.wait(settings.UPLOAD_JOB_HEARTBEAT_INTERVAL):
+                    return
+        finally:
+            connection.close()
+
+    def update(self, force=False, **counters):
+        for key, value in counters.items():
+            setattr(self.job, key, value)
+        now = time.monotonic()
+        if not force and now - self.last_update < self.interval:
+            return
+        self.last_update = now
+        table = UploadJob._meta.db_table
+        quote_name = self.connection.ops.quote_name
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET "
+                f"{quote_name('rows_validated')} = %s, "
+                f"{quote_name('rows_imported')} = %s, "
+                f"{quote_name('rows_total')} = %s "
+                "WHERE id = %s",
+                [
+                    self.job.rows_validated,
+                    self.job.rows_imported,
+                    self.job.rows_total,
+                    self.job.id,
+                ]
+            )
+
+    def track_parser(self, parser):
+        def _parser(row):
+            try:
+                return parser(row)
+            finally:
+                self.update(rows_validated=self.job.rows_validated + 1)
+        return _parser
+
+    def track_importer(self, importer):
+        progress = self
+
+        class _Importer:
+            def __call__(self, entry):
+                # With two passes every row is validated before the first
+                # one is imported, so the total is known from here on.
+                if settings.UPLOAD_TWO_PASS and progress.job.rows_total is None:
+                    progress.update(
+                        force=True,
+                        rows_total=progress.job.rows_validated
+                    )
+                item = importer(entry)
+                progress.update(rows_imported=progress.job.rows_imported + 1)
+                return item
+
+            def prepare(self, entries):
+                prepare = getattr(importer, "prepare", None)
+                if prepare is not None:
+                    prepare(entries)
+
+            def flush(self):
+                flush = getattr(importer, "flush", None)
+                if flush is not None:
+                    flush()
+
+        return _Importer()
+
+
+def run_upload_job(job_id):
+    job = UploadJob.objects.select_related(
+        "user", "node_main", "event", "super_set"
+    ).get(id=job_id)
+    upload_type = job.upload_type
+    progress = JobProgress(job)
+    try:
+        check_csv_file_name(job.file_name, job.event)
+        with job.file.open("rb") as file:
+            reader = read_csv_to_dict(file)
+            (parser, importer, view_transforms, compatiblity_model) = (
+                get_upload_context(
+                    upload_type,
+                    job.user,
+                    job.node_main,
+                    job.event,
+                    reader.fieldnames,
+                )
+            )
+            (items, errors) = import_upload(
+                upload_type,
+                reader,
+                progress.track_parser(parser),
+                progress.track_importer(importer),
+            )
+        job.errors = errors
+        if items is None:
+            job.errors.append(get_dialect_message(reader.dialect))
+        else:
+            job.rows_total = job.rows_validated
+            job.outputs = {
+                key: view_transform(items)
+                for key, view_transform
+                in view_transforms.items()
+            }
+            if compatiblity_model is not None:
+                job.outputs["summary"] = (
+                    f"Using compatiblity model {compatiblity_model._meta.verbose_name}: "
+                    f"{job.outputs.get('summary', '')}"
+                )
+    except (ValidationError, UnicodeDecodeError, csv.Error, Exception) as e:
+        traceback.print_exc()
+        job.errors = [*job.errors, f"Failed to import '{upload_type}': {e}"]
+        if isinstance(e, UnicodeDecodeError):
+            job.errors.append(ENCODING_ERROR_MESSAGE)
+    finally:
+        progress.close()
+
+    job.status = UploadJob.FAILED if job.errors else UploadJob.SUCCEEDED
+    job.finished = timezone.now()
+    job.file.delete(save=False)
+    job.save()
+    return job.status
@@ -5,13 +5,16 @@ from django.shortcuts import redirect
 
 from metrics.forms import UserLoginForm
 from metrics.views.tess_import import tess_import
-from metrics.views.upload import upload_data, download_template
+from metrics.views.upload import upload_data, download_template, upload_job, upload_job_api
 from metrics.views import metrics
+from metrics.views.changes import changes_api
 from metrics.views.model_views import (
     EventView,
     InstitutionView,
     EventListView,
     InstitutionListView,
+    event_list_api,
+    institution_search,
     QualityMetricsDeleteView,
     DemographicMetricsDeleteView,
     ImpactMetricsDeleteView,
@@ -30,6 +33,8 @@ urlpatterns = [
     ),
     path('logout/', LogoutView.as_view(next_page='/'), name='logout'),
     path('upload-data', upload_data, name='upload-data'),
+    path('upload-job/<int:pk>', upload_job, name='upload-job'),
+    path('upload-job/<int:pk>/status', upload_job_api, name='upload-job-api'),
     path('tess-import', tess_import, name='tess-import'),
     path('tess-import/<int:tess_id>', tess_import, name='tess-import'),
     path('download-template/<str:data_type>/<str:slug>', download_template, name='download_template'),
@@ -37,7 +42,9 @@ urlpatterns = [
     path('event/<int:event_id>/upload-data', upload_data, name='upload-data-event'),
     path('institution/<int:pk>', InstitutionView.as_view(), name='institution-edit'),
     path('event/list', EventListView.as_view(), name='event-list'),
+    path('api/events', event_list_api, name='event-list-api'),
     path('institution/list', InstitutionListView.as_view(), name='institution-list'),
+    path('institution/search', institution_search, name='institution-search'),
     path(
         'event/delete-metrics/demographic/<int:pk>',
         DemographicMetricsDeleteView.as_view(),
@@ -64,6 +71,7 @@ urlpatterns = [
     path('metrics/set/<str:question_set_id>', metrics.get_metrics_api, name="metrics-api"),
     path('properties/set/<str:question_set_id>', metrics.question_api, name="properties-set-api"),
     path('properties/event', metrics.event_properties_api, name="properties-event-api"),
+    path('api/changes', changes_api, name="changes-api"),
 
     path('world-map', metrics.world_map_event_count, name='world-map'),
 
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from metrics.change_feed import get_changes
+
+
+@login_required
+def changes_api(request):
+    """Page through the events, response sets and institutions changed
+    after the `since` cursor, and the deletions."""
+    try:
+        limit = min(
+            int(request.GET.get("limit", 0)) or settings.CHANGES_PAGE_SIZE,
+            settings.CHANGES_PAGE_SIZE
+        )
+        (changes, cursor, more) = get_changes(request.GET.get("since"), limit)
+    except (ValueError, ValidationError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "changes": changes,
+        "cursor": cursor,
+        "more": more,
+    })
@@ -64,9 +64,21 @@ def get_event_filter_query(
     event_node=None,
     date_to=None,
     date_from=None,
-    prefix=None
+    prefix=None,
+    copied=False
 ):
+    """Build the event filter for a query on events or a related model.
+
+    `prefix` is the path to the event, e.g. "event__". With `copied` it is
+    the prefix of the event columns copied onto the model instead, as the
+    "event_" columns of `AnswerCount`, which saves the joins.
+    """
     prefix = "" if prefix is None else prefix
+    node_filter = (
+        {f"{prefix}node__contains": [getattr(event_node, "pk", event_node)]}
+        if copied
+        else {f"{prefix}node__in": [event_node]}
+    )
     filter_variants = [
         {f"{prefix}type": event_type} if event_type else None,
         {f"{prefix}funding__contains": event_funding} if event_funding else None,
@@ -74,7 +86,7 @@ def get_event_filter_query(
         {f"{prefix}additional_platforms__contains": event_additional_platforms} if event_additional_platforms else None,
         {f"{prefix}date_end__gte": date_from} if date_from else None,
         {f"{prefix}date_start__lte": date_to} if date_to else None,
-        {f"{prefix}node__in": [event_node]} if event_node else None,
+        node_filter if event_node else None,
     ]
 
     query = Q()
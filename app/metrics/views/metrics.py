@@ -2,7 +2,7 @@ from django.http import JsonResponse, Http404
 from metrics.models import (
     Event,
     QuestionSuperSet,
-    Response,
+    AnswerCount,
     Quality,
     Impact,
     Demographic,
@@ -10,8 +10,10 @@ from metrics.models import (
     SystemSettings,
 )
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count
+from django.db.models import Count, Sum
 from metrics.views.common import get_tabs, get_event_filter_query, dict_to_querydict
+from metrics.aggregation import count_field_values
+from metrics.cache import cached_metrics
 from metrics.forms import MetricsFilterForm
 from django.urls import reverse
 from django.shortcuts import render
@@ -128,7 +130,9 @@ class EventMetricsView(MetricsView):
         self,
         **kwargs
     ):
-        return get_event_info(
+        return cached_metrics(
+            "event",
+            lambda: get_event_info(**kwargs),
             **kwargs
         )
 
@@ -155,8 +159,10 @@ class SuperSetMetricsView(MetricsView):
         if (superset.node is not None and superset.node != current_node):
             raise PermissionDenied("This set is not publicly available")
 
-        return get_metrics_info(
-            superset,
+        return cached_metrics(
+            "superset",
+            lambda: get_metrics_info(superset, **kwargs),
+            slug=superset.slug,
             **kwargs
         )
 
@@ -178,8 +184,10 @@ class LegacyMetricsView(MetricsView):
     ):
         question_set_id = self.kwargs["question_set_id"]
         self.model = get_metrics_model_or_404(question_set_id)
-        return get_legacy_metrics_info(
-            self.model,
+        return cached_metrics(
+            "legacy",
+            lambda: get_legacy_metrics_info(self.model, **kwargs),
+            slug=question_set_id,
             **kwargs
         )
 
@@ -244,14 +252,19 @@ def event_api(request):
         current_node
     ) = _get_filter_params(request)
 
-    result = get_event_info(
-        event_type=event_type,
-        event_funding=funding,
-        event_target_audience=target_audience,
-        event_additional_platforms=additional_platforms,
-        event_node=node_only and current_node,
-        date_to=date_to,
-        date_from=date_from,
+    filters = {
+        "event_type": event_type,
+        "event_funding": funding,
+        "event_target_audience": target_audience,
+        "event_additional_platforms": additional_platforms,
+        "event_node": node_only and current_node,
+        "date_to": date_to,
+        "date_from": date_from,
+    }
+    result = cached_metrics(
+        "event",
+        lambda: get_event_info(**filters),
+        **filters
     )
 
     return JsonResponse({
@@ -316,15 +329,20 @@ def metrics_api(request, question_set_id: str):
     if (superset.node is not None and superset.node != current_node):
         raise PermissionDenied("This set is not publicly available")
 
-    result = get_metrics_info(
-        superset,
-        event_type=event_type,
-        event_funding=funding,
-        event_target_audience=target_audience,
-        event_additional_platforms=additional_platforms,
-        event_node=node_only and current_node,
-        date_to=date_to,
-        date_from=date_from,
+    filters = {
+        "event_type": event_type,
+        "event_funding": funding,
+        "event_target_audience": target_audience,
+        "event_additional_platforms": additional_platforms,
+        "event_node": node_only and current_node,
+        "date_to": date_to,
+        "date_from": date_from,
+    }
+    result = cached_metrics(
+        "superset",
+        lambda: get_metrics_info(superset, **filters),
+        slug=superset.slug,
+        **filters
     )
 
     return JsonResponse({
@@ -346,15 +364,20 @@ def legacy_metrics_api(request, question_set_id: str):
 
     metrics_type = get_metrics_model_or_404(question_set_id)
 
-    result = get_legacy_metrics_info(
-        metrics_type,
-        event_type=event_type,
-        event_funding=funding,
-        event_target_audience=target_audience,
-        event_additional_platforms=additional_platforms,
-        event_node=node_only and current_node,
-        date_to=date_to,
-        date_from=date_from,
+    filters = {
+        "event_type": event_type,
+        "event_funding": funding,
+        "event_target_audience": target_audience,
+        "event_additional_platforms": additional_platforms,
+        "event_node": node_only and current_node,
+        "date_to": date_to,
+        "date_from": date_from,
+    }
+    result = cached_metrics(
+        "legacy",
+        lambda: get_legacy_metrics_info(metrics_type, **filters),
+        slug=question_set_id,
+        **filters
     )
 
     return JsonResponse({
@@ -386,7 +409,6 @@ def get_event_info(
         date_from
     ))
 
-    entries = list(query.values())
     params = {
         "type": "Type",
         "funding": "Event funding",
@@ -395,10 +417,7 @@ def get_event_info(
         "communities": "Communities",
     }
 
-    summary = {
-        key: _calculate_metrics(entries, key)
-        for key in params.keys()
-    }
+    summary = count_field_values(query, params.keys())
     return [
         {
             "label": params.get(key),
@@ -505,7 +524,7 @@ def get_metrics_info(
         for q in qs.questions.all()
     }
 
-    query = Response.objects.filter(answer__question__in=questions.values())
+    query = AnswerCount.objects.filter(answer__question__in=questions.values())
     query = query.filter(get_event_filter_query(
         event_type,
         event_funding,
@@ -514,14 +533,14 @@ def get_metrics_info(
         event_node,
         date_to,
         date_from,
-        prefix="response_set__event__"
+        prefix="event_",
+        copied=True
     ))
 
-    query = query.prefetch_related("answer", "answer__question", "response_set")
     query = (
         query
-        .order_by('answer__question__slug', 'answer__slug')
-        .values('answer').annotate(count=Count('answer'))
+        .order_by()
+        .values('answer').annotate(count=Sum('count'))
     )
 
     summary = {
@@ -583,14 +602,14 @@ def get_legacy_metrics_info(
         "modified"
     }
 
-    result = {}
-    for value in query.values():
-        for key, value in value.items():
-            if key not in ignored_fields:
-                result[key] = result.get(key, {})
-                values = value if isinstance(value, list) else [value]
-                for v in values:
-                    result[key][v] = result[key].get(v, 0) + 1
+    result = count_field_values(
+        query,
+        [
+            key
+            for key in mapped_options.keys()
+            if key not in ignored_fields
+        ]
+    )
 
     return [
         {
@@ -1,17 +1,23 @@
 from django.views.generic.edit import UpdateView, DeleteView, CreateView
 from django.views.generic.list import ListView
-from django.core.exceptions import FieldDoesNotExist
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
-from django.http import HttpResponseRedirect, HttpResponseNotFound
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseRedirect, HttpResponseNotFound, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils.http import urlencode
 from metrics.views.common import get_event_filter_query, dict_to_querydict
 from metrics import models
+from metrics.change_feed import get_event_values
 from metrics.models import UserProfile, SystemSettings
+from metrics.pagination import KeysetPaginator, estimate_count
 from .common import get_tabs
 from metrics.forms import EventFilterForm
+from metrics.tess import convert_tess_metadata, get_tess_client
 from django.urls import reverse
-import requests
+from django.db import transaction
+from django.db.models import Count, Q
 
 
 class GenericUpdateView(UpdateView):
@@ -233,34 +239,14 @@ class TessImportEventView(LoginRequiredMixin, CreateView):
                 return HttpResponseNotFound(f"Could not fetch event {self.tess_id} from TeSS")
             self.tess_metadata = tess_metadata["data"]["attributes"]
             self.converted_metadata = self.convert_tess_metadata(tess_metadata)
-            self.tess_url = "https://tess.elixir-europe.org" + tess_metadata["data"]["links"]["self"]
+            self.tess_url = get_tess_client().get_event_url(tess_metadata)
         return super().get(form_class)
 
     def import_from_tess(self, tess_id):
-        tess_url = f"https://tess.elixir-europe.org/events/{tess_id}.json_api"
-        response = requests.get(tess_url, allow_redirects=True)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return None
+        return get_tess_client().get_event(tess_id)
 
     def convert_tess_metadata(self, tess_metadata):
-        # Take just the date part from the full date/time string
-        def convert_date(date):
-            if date:
-                return date[:10]
-
-        converted = {
-            "title": tess_metadata["data"]["attributes"]["title"],
-            "url": tess_metadata["data"]["attributes"]["url"],
-            "date_start": convert_date(tess_metadata["data"]["attributes"]["start"]),
-            "date_end": convert_date(tess_metadata["data"]["attributes"]["end"]),
-            "location_city": tess_metadata["data"]["attributes"]["city"],
-            "location_country": tess_metadata["data"]["attributes"]["country"],
-            "duration": tess_metadata["data"]["attributes"]["duration"]
-        }
-
-        return converted
+        return convert_tess_metadata(tess_metadata)
 
 
 class InstitutionView(LoginRequiredMixin, GenericUpdateView):
@@ -312,6 +298,8 @@ class GenericListView(ListView):
     paginate_by = 10
     max_paginate_by = 50
     min_paginate_by = 10
+    # Pages are keyed on these columns, the last one must be unique
+    keyset_ordering = ["-id"]
 
     @property
     def title(self):
@@ -327,6 +315,7 @@ class GenericListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["title"] = self.title
+        self.prepare_entries(context["object_list"])
         extras_list = [
             self.get_entry_extras(entry)
             for entry in context["object_list"]
@@ -349,9 +338,39 @@ class GenericListView(ListView):
         filter_params = dict_to_querydict(self.get_filter_params(filter_form))
         context["filter_params"] = filter_params
         context["page_size"] = self.get_paginate_by(None)
+        context["count_label"] = self.get_count_label(self.object_list)
         context.update(get_tabs(self.request))
         return context
 
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        try:
+            page = paginator.get_page(
+                after=self.request.GET.get("after"),
+                before=self.request.GET.get("before"),
+            )
+        except ValidationError as e:
+            raise Http404(e.messages[0])
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_count_label(self, queryset):
+        """Count the entries without counting all of the rows of large tables.
+
+        Unfiltered lists use the planner estimate of the table size once it
+        is larger than `LIST_COUNT_LIMIT`, filtered lists stop counting at
+        that limit.
+        """
+        limit = settings.LIST_COUNT_LIMIT
+        name = self.model._meta.verbose_name_plural
+        if not queryset.query.where:
+            estimate = estimate_count(self.model)
+            if estimate is not None and estimate > limit:
+                return f"About {estimate} {name}"
+        count = queryset.order_by()[:limit + 1].count()
+        if count > limit:
+            return f"More than {limit} {name}"
+        return f"{count} {name}"
+
     def get_filter_form(self):
         FilterForm = getattr(self, "filter_form", None)
         return None if FilterForm is None else FilterForm(self.request.GET or None)
@@ -361,6 +380,9 @@ class GenericListView(ListView):
             return filter_form.cleaned_data
         return {}
 
+    def prepare_entries(self, entries):
+        pass
+
     def get_entry_extras(self, entry):
         return []
 
@@ -409,6 +431,35 @@ class GenericListView(ListView):
         return ", ".join([str(v) for v in value_list])
 
 
+def get_event_list_filter_params(request, filter_form):
+    return {
+        **(filter_form.cleaned_data if filter_form and filter_form.is_valid() else {}),
+        "id": request.GET.getlist("id", None),
+    }
+
+
+def get_event_list_query(filter_form, filter_params, user):
+    query = Q()
+    if filter_form and filter_form.is_valid():
+        query &= get_event_filter_query(
+            filter_params.get("type"),
+            filter_params.get("funding"),
+            filter_params.get("target_audience"),
+            filter_params.get("additional_platforms"),
+            (
+                UserProfile.get_node(user)
+                if filter_params.get("node_only")
+                else None
+            ),
+            filter_params.get("date_to"),
+            filter_params.get("date_from"),
+        )
+    id_list = filter_params.get("id", None)
+    if id_list:
+        query &= Q(id__in=id_list)
+    return query
+
+
 class EventListView(GenericListView):
     model = models.Event
     paginate_by = 30
@@ -432,40 +483,17 @@ class EventListView(GenericListView):
             return super().get_field_label(field)
 
     def get_queryset(self):
-        queryset = super().get_queryset().order_by("-id")
         filter_form = self.get_filter_form()
         filter_params = self.get_filter_params(filter_form)
-        if filter_form and filter_form.is_valid():
-            queryset = queryset.filter(get_event_filter_query(
-                filter_params.get("type"),
-                filter_params.get("funding"),
-                filter_params.get("target_audience"),
-                filter_params.get("additional_platforms"),
-                (
-                    UserProfile.get_node(self.request.user)
-                    if filter_params.get("node_only")
-                    else None
-                ),
-                filter_params.get("date_to"),
-                filter_params.get("date_from"),
-            ))
-        id_list = filter_params.get("id", None)
-        queryset = (
-            queryset.filter(id__in=id_list)
-            if id_list
-            else queryset
+        return (
+            super().get_queryset()
+            .filter(get_event_list_query(filter_form, filter_params, self.request.user))
+            .select_related("node_main")
+            .prefetch_related("node", "organising_institution")
         )
-        return queryset
 
     def get_filter_params(self, filter_form):
-        base_params = super().get_filter_params(filter_form)
-        extra_params = {
-            "id": self.request.GET.getlist("id", None)
-        }
-        return {
-            **base_params,
-            **extra_params,
-        }
+        return get_event_list_filter_params(self.request, filter_form)
 
     def get_headers(self, max_extras):
         headers = super().get_headers(max_extras)
@@ -474,16 +502,19 @@ class EventListView(GenericListView):
             "Metrics Status"
         ]
 
+    def prepare_entries(self, entries):
+        self.user_node = UserProfile.get_node(self.request.user)
+        self.metrics_counts = get_metrics_counts_by_event(entries, self.request.user)
+
     def get_values(self, entry):
         values = super().get_values(entry)
         return [
             *values,
-            (get_metrics_status(entry, self.request.user), None)
+            (get_metrics_status_from_counts(self.metrics_counts[entry.id]), None)
         ]
 
     def get_entry_extras(self, entry):
-        user_node = UserProfile.get_node(self.request.user)
-        can_edit = user_node == entry.node_main and not entry.is_locked
+        can_edit = self.user_node == entry.node_main and not entry.is_locked
         return (
             []
             if self.request.user.is_anonymous
@@ -497,10 +528,67 @@ class EventListView(GenericListView):
         )
 
 
+@login_required
+def event_list_api(request):
+    """Page through the events matching the event list filters, newest first.
+
+    Pass the returned `next` cursor as `after` to get the following page.
+    """
+    filter_form = EventFilterForm(request.GET or None)
+    filter_params = get_event_list_filter_params(request, filter_form)
+    try:
+        page_size = min(
+            int(request.GET.get("limit", 0)) or settings.LIST_API_PAGE_SIZE,
+            settings.LIST_API_PAGE_SIZE
+        )
+        paginator = KeysetPaginator(
+            get_event_values().filter(
+                get_event_list_query(filter_form, filter_params, request.user)
+            ),
+            page_size,
+            EventListView.keyset_ordering,
+        )
+        page = paginator.get_page(after=request.GET.get("after"))
+    except (ValueError, ValidationError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "events": page.object_list,
+        "next": page.next_cursor,
+    })
+
+
+@login_required
+def institution_search(request):
+    """Search the local ROR index by name or alias prefix."""
+    organisations = list(models.RorOrganisation.search(request.GET.get("q", "")))
+    institutions = {
+        institution.ror_id: institution
+        for institution in models.OrganisingInstitution.objects.filter(
+            ror_id__in=[organisation.ror_id for organisation in organisations]
+        )
+    }
+    return JsonResponse({
+        "results": [
+            {
+                "ror_id": organisation.ror_id,
+                "name": organisation.name,
+                "country": organisation.country,
+                "aliases": organisation.aliases,
+                "url": (
+                    institutions[organisation.ror_id].get_absolute_url()
+                    if organisation.ror_id in institutions
+                    else None
+                ),
+            }
+            for organisation in organisations
+        ]
+    })
+
+
 class InstitutionListView(LoginRequiredMixin, GenericListView):
     model = models.OrganisingInstitution
     paginate_by = 30
-    ordering = ['name']
+    keyset_ordering = ["name", "id"]
     fields = [
         "name",
         "country",
@@ -570,10 +658,12 @@ class SuperSetMetricsDeleteView(
         success_url = self.get_success_url()
         superset = self.get_superset()
         question_sets = list(superset.question_sets.all())
-        self.metrics_model.objects.filter(
-            event=self.object,
-            question_set__in=question_sets
-        ).delete()
+        with transaction.atomic():
+            self.metrics_model.objects.filter(
+                event=self.object,
+                question_set__in=question_sets
+            ).delete()
+            models.AnswerCount.refresh([self.object])
         return HttpResponseRedirect(success_url)
 
 
@@ -595,36 +685,76 @@ class DemographicMetricsDeleteView(
     metrics_model = models.Demographic
 
 
-def get_metrics_counts(event, user):
+def get_metrics_counts_by_event(events, user):
     settings = SystemSettings.get_settings(user)
-    return (
-        [
+    event_ids = [event.id for event in events]
+    if settings.has_flag("use_new_model_upload"):
+        supersets = list(settings.get_upload_sets().prefetch_related("question_sets"))
+        question_sets = {
+            question_set.id
+            for superset in supersets
+            for question_set in superset.question_sets.all()
+        }
+        counts = {
+            (value["event"], value["question_set"]): value["count"]
+            for value in (
+                models.ResponseSet.objects
+                .filter(event__in=event_ids, question_set__in=question_sets)
+                .values("event", "question_set")
+                .annotate(count=Count("id"))
+            )
+        }
+        return {
+            event_id: [
+                (
+                    superset.name,
+                    max(
+                        (
+                            counts.get((event_id, question_set.id), 0)
+                            for question_set in superset.question_sets.all()
+                        ),
+                        default=0
+                    )
+                )
+                for superset in supersets
+            ]
+            for event_id in event_ids
+        }
+    else:
+        counts = [
             (
-                superset.name,
-                max((
-                    models.ResponseSet.objects.filter(
-                        event=event,
-                        question_set=question_set
-                    ).count()
-                    for question_set in superset.question_sets.all()
-                ))
+                name,
+                dict(
+                    metrics_model.objects
+                    .filter(event__in=event_ids)
+                    .values_list("event")
+                    .annotate(count=Count("id"))
+                )
             )
-            for superset in settings.get_upload_sets()
-        ]
-        if settings.has_flag("use_new_model_upload")
-        else [
-            (name, related.count())
-            for name, related in [
-                ("Quality metrics", event.quality),
-                ("Impact metrics", event.impact),
-                ("Demographic metrics", event.demographic)
+            for name, metrics_model in [
+                ("Quality metrics", models.Quality),
+                ("Impact metrics", models.Impact),
+                ("Demographic metrics", models.Demographic)
             ]
         ]
-    )
+        return {
+            event_id: [
+                (name, model_counts.get(event_id, 0))
+                for name, model_counts in counts
+            ]
+            for event_id in event_ids
+        }
+
+
+def get_metrics_counts(event, user):
+    return get_metrics_counts_by_event([event], user)[event.id]
 
 
 def get_metrics_status(event, user):
-    counts = get_metrics_counts(event, user)
+    return get_metrics_status_from_counts(get_metrics_counts(event, user))
+
+
+def get_metrics_status_from_counts(counts):
     count = sum([1 if v > 0 else 0 for _n, v in counts])
     if count == 0:
         return "None"
@@ -1,10 +1,14 @@
 from django.shortcuts import render, get_object_or_404
 from metrics.views.common import get_tabs
 from django import forms
-from django.forms.widgets import FileInput
+from django.forms.widgets import FileInput, TextInput
 import re
 import csv
 import io
+import codecs
+import itertools
+import pickle
+import tempfile
 from metrics import import_utils, models
 import traceback
 from django.core.exceptions import ValidationError, PermissionDenied
@@ -14,11 +18,20 @@ from django.utils.text import slugify
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse, reverse_lazy
 from django.utils.http import urlencode
-from django.http import HttpResponse
-from metrics.models.questions import QuestionSuperSet, ResponseSet, Response
+from django.http import HttpResponse, JsonResponse, Http404
+from metrics.models.questions import QuestionSuperSet, ResponseSet
 from django.http import HttpResponseNotFound
+from django.conf import settings
 from metrics.forms import QuestionSetForm
-from metrics.models import UserProfile, SystemSettings
+from metrics.models import UserProfile, SystemSettings, UploadJob
+from metrics.tess import create_tess_events, get_tess_client
+
+
+ENCODING_ERROR_MESSAGE = (
+    "Make sure that the file is of the right format. "
+    "The file needs to be a CSV (comma separated values) "
+    "and use the character encoding UTF-8."
+)
 
 
 UPLOAD_TYPES = {
@@ -80,6 +93,81 @@ class DataUploadForm(forms.Form):
         self.title = title
 
 
+class TessImportForm(DataUploadForm):
+    file = None
+    tess_ids = forms.CharField(
+        label="TeSS event ids",
+        required=False,
+        widget=TextInput(attrs={"class": "form-control"}),
+    )
+    query = forms.CharField(
+        label="TeSS search",
+        required=False,
+        widget=TextInput(attrs={"class": "form-control"}),
+    )
+
+    def clean_tess_ids(self):
+        return [
+            tess_id
+            for tess_id in re.split(r"[\s,]+", self.cleaned_data["tess_ids"])
+            if tess_id
+        ]
+
+    def clean(self):
+        data = super().clean()
+        if not data.get("tess_ids") and not data.get("query"):
+            raise ValidationError("Give TeSS event ids or a search.")
+        return data
+
+
+def get_tess_import_form(request):
+    return TessImportForm(
+        request.POST if request.method == "POST" else None,
+        data_type="tess",
+        title="Import events from TeSS",
+        description=(
+            "Import events by TeSS id, or all events of your node that "
+            "match a TeSS search. The events are created as incomplete, "
+            "events that have already been imported are skipped."
+        ),
+        prefix="tess",
+    )
+
+
+def import_tess_form(form, user, node_main):
+    query = form.cleaned_data["query"]
+    client = get_tess_client()
+    documents = []
+    for (tess_id, document) in client.get_events(form.cleaned_data["tess_ids"]).items():
+        if document is None:
+            form.add_error(None, f"Could not fetch TeSS event {tess_id}")
+        else:
+            documents.append(document)
+    if query:
+        documents.extend(client.search_events(query, {"node": [node_main.country]}))
+
+    with transaction.atomic():
+        (events, skipped) = create_tess_events(documents, user, node_main)
+    form.outputs = {
+        "summary": (
+            f"Successfully imported {len(events)} events from TeSS, "
+            f"skipped {len(skipped)}."
+        ),
+        "actions": events_actions_output(events) if events else [],
+        "table": {
+            "headers": ["TeSS id", "Title", "Skipped"],
+            "content": [
+                [
+                    document["data"].get("id"),
+                    document["data"]["attributes"]["title"],
+                    reason,
+                ]
+                for (document, reason) in skipped
+            ],
+        } if skipped else None,
+    }
+
+
 def summary_output(items: list):
     return f"Successfully uploaded {len(items)} objects."
 
@@ -120,7 +208,7 @@ def get_import_context(data_type, user, node_main, event):
     if data_type == "events":
         return (
             import_utils.legacy_to_current_event_dict,
-            import_context.event_from_dict,
+            import_utils.EventImporter(import_context),
             {
                 "summary": summary_output,
                 "table": table_output({
@@ -215,6 +303,47 @@ def get_model_transform(model):
     return _model_transform
 
 
+class ResponseImporter:
+    """Buffer parsed response rows and write them with batched INSERTs.
+
+    The buffer is written every `IMPORT_CHUNK_SIZE` response sets, call
+    `flush` once all entries are imported to write the remainder.
+    """
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or settings.IMPORT_CHUNK_SIZE
+        self.pending = []
+        # Rows in the buffer, a row can have several response sets
+        self.pending_rows = 0
+
+    def __call__(self, entry):
+        (event, response_sets) = entry
+        self.pending_rows += 1
+        for qs, data in response_sets:
+            self.pending.append((
+                ResponseSet(user=self.user, event=event, question_set=qs),
+                [
+                    a
+                    for answer in data.values()
+                    for a in (answer if isinstance(answer, list) else [answer])
+                ]
+            ))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            try:
+                ResponseSet.bulk_create_with_responses(
+                    self.pending,
+                    batch_size=self.batch_size
+                )
+            except ValidationError as e:
+                raise import_utils.BatchFailed(e, self.pending_rows)
+        self.pending = []
+        self.pending_rows = 0
+
+
 def get_question_import_context(super_set, user, node_main, event):
     forms = [
         QuestionSetForm.from_question_set(qs)
@@ -265,40 +394,245 @@ def get_question_import_context(super_set, user, node_main, event):
             ]
         )
 
-    def _importer(entry):
-        (event, response_sets) = entry
-
-        for qs, data in response_sets:
-            rs = ResponseSet(user=user, event=event, question_set=qs)
-            rs.save()
-            for answer in data.values():
-                all_answers = answer if isinstance(answer, list) else [answer]
-                for a in all_answers:
-                    r = Response(response_set=rs, answer=a)
-                    r.save()
-
     return (
         _form_parser,
-        _importer,
+        ResponseImporter(user),
         {"summary": summary_output}
     )
 
 
+def batch_error(failed, last_index):
+    first_index = last_index - failed.rows + 1
+    return ValidationError([
+        ValidationError(
+            f"Error for entries[{first_index}-{last_index}]: {failed}"
+        ),
+        failed
+    ])
+
+
+def import_entries(importer, entries):
+    items = []
+    with transaction.atomic():
+        for index, entry in enumerate(entries):
+            try:
+                items.append(importer(entry))
+            except import_utils.BatchFailed as e:
+                # The batch was written when this row was added to it
+                traceback.print_exc()
+                raise batch_error(e, index)
+            except ValidationError as e:
+                traceback.print_exc()
+                raise ValidationError([
+                    ValidationError(f"Error for entry[{index}]: {e}"),
+                    e
+                ])
+        flush = getattr(importer, "flush", None)
+        if flush is not None:
+            try:
+                flush()
+            except import_utils.BatchFailed as e:
+                traceback.print_exc()
+                raise batch_error(e, len(items) - 1)
+    return items
+
+
 def parse_csv_to_dict(file, event):
+    check_csv_file_name(file.name, event)
+    return read_csv_to_dict(file)
+
+
+def check_csv_file_name(name, event):
     file_match = rf"^.+-{event.id}\.csv$" if event else r"^.+\.csv$"
-    if not re.match(file_match, file.name):
+    if not re.match(file_match, name):
         raise ValidationError(
             None,
             "Incorrect file name. The file name needs "
             f"to match the following regex: '{file_match}'"
         )
-    csv_stream = io.StringIO(file.read().decode("utf-8-sig"))
-    dialect = csv.Sniffer().sniff(csv_stream.readline(), delimiters=[",", ";"])
-    csv_stream.seek(0)
-    return csv.DictReader(csv_stream, dialect=dialect)
+
+
+def read_csv_to_dict(file):
+    lines = iter_lines(codecs.iterdecode(file.chunks(), "utf-8-sig"))
+    first_line = next(lines, "")
+    dialect = csv.Sniffer().sniff(first_line, delimiters=[",", ";"])
+    return csv.DictReader(itertools.chain([first_line], lines), dialect=dialect)
+
+
+def iter_lines(chunks):
+    """Split decoded text chunks into lines, keeping the line endings.
+
+    A trailing carriage return is held back until the next chunk, it might
+    be the first half of a CRLF split across the chunk boundary.
+    """
+    pending = ""
+    for chunk in chunks:
+        lines = io.StringIO(pending + chunk, newline="").readlines()
+        pending = (
+            lines.pop()
+            if lines and not lines[-1].endswith("\n")
+            else ""
+        )
+        yield from lines
+    if pending:
+        yield pending
+
+
+class EntrySpool:
+    """Pickle parsed entries to a temporary file for a second pass.
+
+    The file is kept in memory up to `UPLOAD_SPOOL_MAX_MEMORY` bytes and
+    rolled over to disk after that.
+    """
+    def __init__(self, max_size=None):
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=max_size or settings.UPLOAD_SPOOL_MAX_MEMORY
+        )
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.file.seek(0)
+        for _index in range(self.count):
+            yield pickle.load(self.file)
+
+    def extend(self, entries):
+        self.file.seek(0, io.SEEK_END)
+        for entry in entries:
+            pickle.dump(entry, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.count += 1
+
+
+def parse_entries(errors, upload_type, rows, parser):
+    # Rows after the first error are still validated to report every
+    # error, but they are not passed on to be imported.
+    for (index, row) in enumerate(rows):
+        try:
+            entry = parser(row)
+        except ValidationError as e:
+            traceback.print_exc()
+            errors.append(
+                f"Failed to parse '{upload_type}' "
+                f"row {index} : {e}"
+            )
+            continue
+        if not errors:
+            yield entry
+
+
+class UploadFailed(Exception):
+    pass
+
+
+def import_upload(upload_type, rows, parser, importer):
+    """Parse, validate and import rows.
+
+    With `UPLOAD_TWO_PASS` all rows are validated and spooled before
+    anything is imported. Otherwise rows are imported as they are
+    validated, and the import is rolled back if any row fails. Returns
+    the imported items and the row errors, nothing is imported if there
+    are any errors.
+    """
+    errors = []
+    entries = parse_entries(errors, upload_type, rows, parser)
+    if settings.UPLOAD_TWO_PASS:
+        with EntrySpool() as spool:
+            spool.extend(entries)
+            if errors:
+                return (None, errors)
+            # Let the importer look up what the entries refer to in bulk,
+            # before the import transaction is started.
+            prepare = getattr(importer, "prepare", None)
+            if prepare is not None:
+                prepare(spool)
+            return (import_entries(importer, spool), errors)
+
+    try:
+        with transaction.atomic():
+            items = import_entries(importer, entries)
+            if errors:
+                raise UploadFailed()
+            return (items, errors)
+    except UploadFailed:
+        return (None, errors)
+
+
+def get_upload_context(upload_type, user, node_main, event, fieldnames):
+    """Get the parser, importer and output transforms for an upload.
+
+    Superset uploads with the columns of a legacy model are parsed with
+    the matching compatibility model, which is returned as the fourth
+    value.
+    """
+    if not isinstance(upload_type, QuestionSuperSet):
+        return (
+            *get_import_context(upload_type, user, node_main, event),
+            None
+        )
+
+    (parser, importer, view_transforms) = get_question_import_context(
+        upload_type,
+        user,
+        node_main,
+        event,
+    )
+    compatiblity_model = get_matching_legacy_model(
+        fieldnames,
+        {upload_type.slug}
+    )
+    if compatiblity_model is not None:
+        compatibility_transform = get_model_transform(compatiblity_model)
+        question_parser = parser
+
+        def parser(row):
+            return question_parser(compatibility_transform(row))
+
+    return (parser, importer, view_transforms, compatiblity_model)
+
+
+def get_dialect_message(dialect):
+    return (
+        "Using dialect: "
+        f"delimiter [{dialect.delimiter}], "
+        f"quotechar [{dialect.quotechar}], "
+        f"doublequote [{dialect.doublequote}]"
+    )
+
+
+def queue_upload_job(form, user, node_main, event):
+    file = form.cleaned_data["file"]
+    check_csv_file_name(file.name, event)
+    upload_type = form.data_type
+    is_super_set = isinstance(upload_type, QuestionSuperSet)
+    job = UploadJob.objects.create(
+        user=user,
+        node_main=node_main,
+        event=event,
+        data_type="" if is_super_set else upload_type,
+        super_set=upload_type if is_super_set else None,
+        file=file,
+        file_name=file.name,
+    )
+    form.outputs = {
+        "summary": f"The upload has been queued as job {job.id}.",
+        "actions": [
+            ("View upload status", job.get_absolute_url())
+        ]
+    }
+    return job
 
 
 def legacy_upload(request, event):
+    settings = SystemSettings.get_settings(request.user)
+    use_upload_jobs = settings.has_flag("use_upload_jobs")
     upload_types = {
         key: value
         for key, value in UPLOAD_TYPES.items()
@@ -319,6 +653,8 @@ def legacy_upload(request, event):
         )
         for upload_type in upload_types.values()
     ]
+    if event is None:
+        forms.append(get_tess_import_form(request))
 
     if request.method == "POST":
         for form in forms:
@@ -328,6 +664,13 @@ def legacy_upload(request, event):
 
                 try:
                     node_main = UserProfile.get_node(request.user)
+                    if isinstance(form, TessImportForm):
+                        import_tess_form(form, request.user, node_main)
+                        continue
+                    if use_upload_jobs:
+                        queue_upload_job(form, request.user, node_main, event)
+                        continue
+
                     reader = parse_csv_to_dict(data["file"], event)
                     (parser, importer, view_transforms) = get_import_context(
                         upload_type,
@@ -336,55 +679,27 @@ def legacy_upload(request, event):
                         event
                     )
 
-                    entries = []
-                    for (index, row) in enumerate(reader):
-                        try:
-                            entries.append(parser(row))
-                        except ValidationError as e:
-                            traceback.print_exc()
-                            form.add_error(
-                                None,
-                                f"Failed to parse '{upload_type}' "
-                                f"row {index} : {e}"
-                            )
-
-                    if len(form.errors) == 0:
-                        items = []
-                        with transaction.atomic():
-                            for index, entry in enumerate(entries):
-                                try:
-                                    items.append(importer(entry))
-                                except ValidationError as e:
-                                    traceback.print_exc()
-                                    raise ValidationError([
-                                        ValidationError(f"Error for entry[{index}]: {e}"),
-                                        e
-                                    ])
-
+                    (items, errors) = import_upload(
+                        upload_type,
+                        reader,
+                        parser,
+                        importer
+                    )
+                    for error in errors:
+                        form.add_error(None, error)
+                    if items is not None:
                         form.outputs = {
                             key: view_transform(items)
                             for key, view_transform
                             in view_transforms.items()
                         }
                     else:
-                        dialect = reader.dialect
-                        form.add_error(
-                            None,
-                            "Using dialect: "
-                            f"delimiter [{dialect.delimiter}], "
-                            f"quotechar [{dialect.quotechar}], "
-                            f"doublequote [{dialect.doublequote}]"
-                        )
+                        form.add_error(None, get_dialect_message(reader.dialect))
                 except (ValidationError, UnicodeDecodeError, csv.Error, Exception) as e:
                     traceback.print_exc()
                     form.add_error(None, f"Failed to import '{upload_type}': {e}")
                     if isinstance(e, UnicodeDecodeError):
-                        form.add_error(
-                            None,
-                            "Make sure that the file is of the right format. "
-                            "The file needs to be a CSV (comma separated values) "
-                            "and use the character encoding UTF-8."
-                        )
+                        form.add_error(None, ENCODING_ERROR_MESSAGE)
 
     title = (
         f"Upload data for event: {event.title}"
@@ -404,6 +719,7 @@ def legacy_upload(request, event):
 
 def response_upload(request, event):
     settings = SystemSettings.get_settings(request.user)
+    use_upload_jobs = settings.has_flag("use_upload_jobs")
     question_supersets = settings.get_upload_sets()
     event_upload_form = None
     if event is None:
@@ -421,7 +737,7 @@ def response_upload(request, event):
             )]
         )
     forms = [
-        *([event_upload_form] if event_upload_form else []),
+        *([event_upload_form, get_tess_import_form(request)] if event_upload_form else []),
         *[
             DataUploadForm(
                 request.POST if request.method == "POST" else None,
@@ -451,67 +767,33 @@ def response_upload(request, event):
 
                 try:
                     node_main = UserProfile.get_node(request.user)
+                    if isinstance(form, TessImportForm):
+                        import_tess_form(form, request.user, node_main)
+                        continue
+                    if use_upload_jobs:
+                        queue_upload_job(form, request.user, node_main, event)
+                        continue
+
                     reader = parse_csv_to_dict(data["file"], event)
-                    (parser, importer, view_transforms) = (
-                        get_import_context(
-                            upload_type,
-                            request.user,
-                            node_main,
-                            event
-                        )
-                        if upload_type == "events"
-                        else get_question_import_context(
+                    (parser, importer, view_transforms, compatiblity_model) = (
+                        get_upload_context(
                             upload_type,
                             request.user,
                             node_main,
                             event,
-                        )
-                    )
-
-                    compatiblity_model = (
-                        get_matching_legacy_model(
                             reader.fieldnames,
-                            {upload_type.slug}
                         )
-                        if isinstance(upload_type, QuestionSuperSet)
-                        else None
-                    )
-                    compatibility_transform = (
-                        None
-                        if compatiblity_model is None
-                        else get_model_transform(compatiblity_model)
                     )
 
-                    entries = []
-                    for (index, row) in enumerate(reader):
-                        try:
-                            entry = (
-                                row
-                                if compatibility_transform is None
-                                else compatibility_transform(row)
-                            )
-                            entries.append(parser(entry))
-                        except (ValidationError, ) as e:
-                            traceback.print_exc()
-                            form.add_error(
-                                None,
-                                f"Failed to parse '{upload_type}' "
-                                f"row {index} : {e}"
-                            )
-
-                    if len(form.errors) == 0:
-                        items = []
-                        with transaction.atomic():
-                            for index, entry in enumerate(entries):
-                                try:
-                                    items.append(importer(entry))
-                                except ValidationError as e:
-                                    traceback.print_exc()
-                                    raise ValidationError([
-                                        ValidationError(f"Error for entry[{index}]: {e}"),
-                                        e
-                                    ])
-
+                    (items, errors) = import_upload(
+                        upload_type,
+                        reader,
+                        parser,
+                        importer
+                    )
+                    for error in errors:
+                        form.add_error(None, error)
+                    if items is not None:
                         form.outputs = {
                             key: view_transform(items)
                             for key, view_transform
@@ -523,14 +805,7 @@ def response_upload(request, event):
                                 f"{form.outputs.get('summary', '')}"
                             )
                     else:
-                        dialect = reader.dialect
-                        form.add_error(
-                            None,
-                            "Using dialect: "
-                            f"delimiter [{dialect.delimiter}], "
-                            f"quotechar [{dialect.quotechar}], "
-                            f"doublequote [{dialect.doublequote}]"
-                        )
+                        form.add_error(None, get_dialect_message(reader.dialect))
                         if compatiblity_model:
                             form.add_error(None, f"Using compatiblity model {compatiblity_model._meta.verbose_name}")
 
@@ -538,12 +813,7 @@ def response_upload(request, event):
                     form.add_error(None, f"Failed to import '{upload_type}': {e}")
                     traceback.print_exc()
                     if isinstance(e, UnicodeDecodeError):
-                        form.add_error(
-                            None,
-                            "Make sure that the file is of the right format. "
-                            "The file needs to be a CSV (comma separated values) "
-                            "and use the character encoding UTF-8."
-                        )
+                        form.add_error(None, ENCODING_ERROR_MESSAGE)
 
     title = (
         f"Upload data for event: {event.title}"
@@ -579,6 +849,32 @@ def upload_data(request, event_id=None):
         return legacy_upload(request, event)
 
 
+def get_upload_job(request, pk):
+    job = get_object_or_404(UploadJob, pk=pk)
+    if job.user != request.user and not request.user.is_superuser:
+        raise Http404("Upload job not found")
+    return job
+
+
+@login_required
+def upload_job_api(request, pk):
+    return JsonResponse(get_upload_job(request, pk).to_dict())
+
+
+@login_required
+def upload_job(request, pk):
+    job = get_upload_job(request, pk)
+    return render(
+        request,
+        'metrics/upload-job.html',
+        context={
+            "title": f"Upload job {job.id}: {job.file_name}",
+            **get_tabs(request, view_name="event-list" if job.event else None),
+            "job": job,
+        }
+    )
+
+
 def download_csv(lines, filename="template"):
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
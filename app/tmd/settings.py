@@ -13,6 +13,7 @@ from pathlib import Path
 import json
 import os
 import logging
+import tempfile
 
 logger = logging.getLogger(__name__)
 
@@ -180,6 +181,93 @@ STORAGES = {
 
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
 
+# Cache for computed metrics, keyed by the normalised filter parameters.
+# Writes invalidate it from any process (web workers, upload job workers),
+# so it has to be shared: the database cache by default, or the file based
+# cache on a volume mounted in every container. The local memory cache is
+# private to each process and only fit for a single process.
+METRICS_CACHE_BACKENDS = {
+    "database": ("django.core.cache.backends.db.DatabaseCache", "tmd_metrics_cache"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", "/opt/tmd/metrics-cache"),
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "tmd-metrics"),
+    "dummy": ("django.core.cache.backends.dummy.DummyCache", ""),
+}
+METRICS_CACHE_ALIAS = "metrics"
+METRICS_CACHE_TIMEOUT = int(os.environ.get("TMD_METRICS_CACHE_TIMEOUT", 300))
+(METRICS_CACHE_BACKEND, METRICS_CACHE_LOCATION) = METRICS_CACHE_BACKENDS[
+    os.environ.get("TMD_METRICS_CACHE_BACKEND", "database")
+]
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    METRICS_CACHE_ALIAS: {
+        "BACKEND": METRICS_CACHE_BACKEND,
+        "LOCATION": os.environ.get("TMD_METRICS_CACHE_LOCATION", METRICS_CACHE_LOCATION),
+    },
+}
+
+# Number of rows written per INSERT when importing uploaded data
+IMPORT_CHUNK_SIZE = int(os.environ.get("TMD_IMPORT_CHUNK_SIZE", 1000))
+
+# Validate every uploaded row before importing any of them. Parsed rows are
+# spooled to a temporary file once they exceed UPLOAD_SPOOL_MAX_MEMORY bytes.
+UPLOAD_TWO_PASS = bool(int(os.environ.get("TMD_UPLOAD_TWO_PASS", 1)))
+UPLOAD_SPOOL_MAX_MEMORY = int(os.environ.get("TMD_UPLOAD_SPOOL_MAX_MEMORY", 8 * 1024 * 1024))
+
+# Background upload jobs (feature flag "use_upload_jobs"). The job directory
+# has to be shared between the web application and the upload job workers.
+UPLOAD_JOB_DIR = os.environ.get("TMD_UPLOAD_JOB_DIR", BASE_DIR / "upload-jobs")
+UPLOAD_JOB_WORKERS = int(os.environ.get("TMD_UPLOAD_JOB_WORKERS", 2))
+UPLOAD_JOB_POLL_INTERVAL = float(os.environ.get("TMD_UPLOAD_JOB_POLL_INTERVAL", 5))
+# Running jobs without a heartbeat for the stale timeout are failed
+UPLOAD_JOB_HEARTBEAT_INTERVAL = float(os.environ.get("TMD_UPLOAD_JOB_HEARTBEAT_INTERVAL", 10))
+UPLOAD_JOB_STALE_TIMEOUT = float(os.environ.get("TMD_UPLOAD_JOB_STALE_TIMEOUT", 120))
+
+# ROR (Research Organization Registry) lookups for organising institutions.
+# Responses are cached on disk for ROR_CACHE_TTL seconds.
+ROR_API_URL = os.environ.get("TMD_ROR_API_URL", "https://api.ror.org/organizations")
+ROR_CACHE_DIR = os.environ.get(
+    "TMD_ROR_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "tmd-ror-cache")
+)
+ROR_CACHE_TTL = int(os.environ.get("TMD_ROR_CACHE_TTL", 30 * 24 * 60 * 60))
+ROR_TIMEOUT = float(os.environ.get("TMD_ROR_TIMEOUT", 10))
+ROR_RETRIES = int(os.environ.get("TMD_ROR_RETRIES", 3))
+ROR_MAX_WORKERS = int(os.environ.get("TMD_ROR_MAX_WORKERS", 8))
+# Only use the local index loaded with the load_ror_dump command
+ROR_OFFLINE = bool(int(os.environ.get("TMD_ROR_OFFLINE", 0)))
+
+# TeSS (Training eSupport System) event imports. Documents are cached on
+# disk and revalidated after TESS_CACHE_TTL seconds.
+TESS_URL = os.environ.get("TMD_TESS_URL", "https://tess.elixir-europe.org")
+TESS_CACHE_DIR = os.environ.get(
+    "TMD_TESS_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "tmd-tess-cache")
+)
+TESS_CACHE_TTL = int(os.environ.get("TMD_TESS_CACHE_TTL", 60 * 60))
+TESS_TIMEOUT = float(os.environ.get("TMD_TESS_TIMEOUT", 10))
+TESS_RETRIES = int(os.environ.get("TMD_TESS_RETRIES", 3))
+TESS_MAX_WORKERS = int(os.environ.get("TMD_TESS_MAX_WORKERS", 8))
+TESS_PAGE_SIZE = int(os.environ.get("TMD_TESS_PAGE_SIZE", 100))
+
+# Lists stop counting at this many rows, unfiltered lists of larger tables
+# show the planner estimate instead
+LIST_COUNT_LIMIT = int(os.environ.get("TMD_LIST_COUNT_LIMIT", 10000))
+LIST_API_PAGE_SIZE = int(os.environ.get("TMD_LIST_API_PAGE_SIZE", 500))
+
+# Objects per stream and page of the change feed (/api/changes)
+CHANGES_PAGE_SIZE = int(os.environ.get("TMD_CHANGES_PAGE_SIZE", 500))
+
+# Parquet snapshots written by the export_snapshots command, needs pyarrow
+SNAPSHOT_DIR = os.environ.get("TMD_SNAPSHOT_DIR", BASE_DIR / "snapshots")
+SNAPSHOT_ROW_GROUP_SIZE = int(os.environ.get("TMD_SNAPSHOT_ROW_GROUP_SIZE", 100000))
+SNAPSHOT_INTERVAL = float(os.environ.get("TMD_SNAPSHOT_INTERVAL", 0))
+# Rows are exported once more by the next run for this long after they were
+# saved, has to be longer than the longest transaction writing them
+SNAPSHOT_SETTLE_SECONDS = float(os.environ.get("TMD_SNAPSHOT_SETTLE_SECONDS", 3600))
+
 # Load static messages to display on the site
 try:
     STATIC_MESSAGES_DATA = os.environ.get("TMD_STATIC_MESSAGES", None)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Compare row by row and batched validation of the query models.
+
+Synthetic rows shaped like the query results are validated with
+`Model.from_query(row).model_dump(mode="json")` and with `validate_rows`
+in chunks, no database is needed.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from extract_from_db import (
+    ModelDemographic,
+    ModelEvent,
+    ModelImpact,
+    ModelQuality,
+    QueryModel,
+    validate_rows,
+)
+
+
+def json_array(*values: Any) -> str:
+    return json.dumps(list(values))
+
+
+def base_row(rng: random.Random, entity_id: int) -> dict[str, Any]:
+    return {
+        "entity_id": entity_id,
+        "f_created_by": rng.randint(1, 500),
+        "f_created": datetime(2020, 1, 1, 10, 0),
+        "f_changed": datetime(2021, 6, 1, 12, 30),
+        "f_event": rng.randint(1, 5000),
+    }
+
+
+def event_row(rng: random.Random, entity_id: int) -> dict[str, Any]:
+    return {
+        **base_row(rng, entity_id),
+        "f_title": f"Event {entity_id}",
+        "f_elixir_node": json_array("ELIXIR-SE"),
+        "f_elixir_node_user": json_array("ELIXIR-SE", "ELIXIR-NO"),
+        "f_date_start": datetime(2020, 3, 1, 9, 0),
+        "f_date_end": datetime(2020, 3, 2, 17, 0),
+        "f_duration": Decimal("1.50"),
+        "f_event_type": rng.choice(["Hackathon", "Knowledge exchange workshop"]),
+        "f_funding": json_array("CONVERGE", "ELIXIR Node", "NA"),
+        "f_organizing_institution": "https://ror.org/0576by029",
+        "f_city": "Uppsala",
+        "f_country": "Sweden",
+        "f_target_audience": json_array("Academia/ Research Institution", "Industry"),
+        "f_elixir_service_platforms_r": json_array("Compute", "Data"),
+        "f_communities_use_cases_rela": json_array(None),
+        "f_delegates": rng.randint(0, 100),
+        "f_number_of_trainers_facilit": rng.randint(1, 10),
+        "f_url_to_event_page_agenda": "https://example.org",
+        "f_upload_status": "Complete",
+    }
+
+
+def demographic_row(rng: random.Random, entity_id: int) -> dict[str, Any]:
+    return {
+        **base_row(rng, entity_id),
+        "f_where_you_hear_about_cours": rng.choice(["TeSS", "Email", None]),
+        "f_employment_sector": "Industry",
+        "f_country": "Sweden",
+        "f_gender": rng.choice(["Female", "Male", "Other"]),
+        "f_career_stage": "PhD candidate",
+    }
+
+
+def quality_row(rng: random.Random, entity_id: int) -> dict[str, Any]:
+    return {
+        **base_row(rng, entity_id),
+        "f_have_you_used_the_tools": "Never - unaware of them",
+        "f_will_you_use_the_resources": rng.choice(["Yes", "No", "Maybe"]),
+        "f_would_you_recommend": "Yes",
+        "f_overall_rating": "Excellent (5)",
+        "f_balance_of_the_material": "About right",
+        "f_may_we_contact_you_email": rng.choice(["Yes", None]),
+    }
+
+
+def impact_row(rng: random.Random, entity_id: int) -> dict[str, Any]:
+    return {
+        **base_row(rng, entity_id),
+        "f_how_long_ago": "Over a year",
+        "f_what_was_your_main_reason": "Other",
+        "f_how_often_did_you_use_tool": "Never - unaware of them",
+        "f_how_often_do_you_use_after": "Frequently (weekly to daily)",
+        "f_do_you_feel_explain": "Yes",
+        "f_are_you_now_able": "Independently",
+        "f_how_did_it_help": json_array(
+            "It improved my ability to handle data",
+            "Other",
+        ),
+        "f_facilitated": json_array("Change in career"),
+        "f_how_many_people_you_shared": "1-5",
+        "f_would_you_recommend": "Yes, I would",
+    }
+
+
+MODELS: dict[str, tuple[type[QueryModel], Callable[[random.Random, int], dict[str, Any]]]] = {
+    "event": (ModelEvent, event_row),
+    "demographic": (ModelDemographic, demographic_row),
+    "quality": (ModelQuality, quality_row),
+    "impact": (ModelImpact, impact_row),
+}
+
+
+def measure(name: str, rows: int, run: Callable[[], list[Any]]) -> list[Any]:
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<10} {elapsed:8.3f}s {rows / elapsed:12.0f} rows/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for name, (model, make_row) in MODELS.items():
+        rows = [SimpleNamespace(**make_row(rng, i)) for i in range(args.rows)]
+        print(f"{name}: {args.rows} rows")
+        per_row = measure(
+            "per row",
+            args.rows,
+            lambda: [model.from_query(row).model_dump(mode="json") for row in rows],
+        )
+        batched = measure(
+            "batched",
+            args.rows,
+            lambda: [
+                item
+                for index in range(0, len(rows), args.chunk_size)
+                for item in validate_rows(model, rows[index:index + args.chunk_size])
+            ],
+        )
+        assert per_row == batched
+
+
+if __name__ == "__main__":
+    main()